@@ -1,14 +1,48 @@
-import pandas as pd
+import csv
+import gzip
+import hashlib
 import html
+import inspect
 import json
+import math
 import os
+import re
+import sys
+import zlib
 from datetime import datetime
 import pytz  # <--- Essential for NZ Time
+from snapshot import SNAPSHOT_FILE, read_snapshot, to_price, to_text, available as snapshot_available
+from price_history import HISTORY_DB, PriceHistory
+from run_report import REPORT, run, timed
+from snapshot_diff import DELTA_FILE, load_delta
+
+try:
+    import brotli
+except ImportError:  # --precompress skips the .br variant without it
+    brotli = None
+
+# pandas/numpy are imported by _load_pandas() when the DataFrame path runs;
+# --no-pandas never loads them
+pd = np = None
+
+def _load_pandas():
+    global pd, np
+    if pd is None:
+        import pandas as pd
+        import numpy as np
 
 # ---- Configuration ----
 IN_CSV = "briscoes_products_clean.csv"
-OUT_HTML = "briscoes_deals.html"
+# The workflow publishes the page as index.html (SITEGEN_OUT_HTML)
+OUT_HTML = os.environ.get("SITEGEN_OUT_HTML", "briscoes_deals.html")
 WHATS_NEW_FILE = "whatsnew.txt"
+# --split-data writes the payload here as deals.<hash>.json (+ .gz/.br
+# twins with --precompress);
+# --shard-categories as deals-<category>.<hash>.json files
+DATA_DIR = os.environ.get("SITEGEN_DATA_DIR", "data")
+DATA_PREFIX = "deals"
+# Optional override for CATEGORY_MAPPINGS below (same JSON shape)
+CATEGORY_MAPPINGS_FILE = os.environ.get("SITEGEN_CATEGORY_MAPPINGS", "category_mappings.json")
 
 # ---- SUPER CATEGORY MAPPING ----
 CATEGORY_MAPPINGS = {
@@ -46,30 +80,101 @@ CATEGORY_MAPPINGS = {
     ]
 }
 
+DEFAULT_SUPER_CATEGORY = "Other / Brands"
+
+class CategoryClassifier:
+    """
+    Maps a specific category to its super category with the same
+    first-match-wins rule as scanning CATEGORY_MAPPINGS in order: the winner
+    is the earliest (super category, keyword) pair whose keyword occurs
+    anywhere in the lower-cased text.
+
+    All keywords are compiled into one regex of lookahead alternatives listed
+    in priority order, so at each position the regex reports the
+    highest-priority keyword starting there; the best over all positions is
+    the answer. Each distinct category is classified once and memoized.
+
+    Mappings come from `mappings_file` (a JSON object in the same shape as
+    CATEGORY_MAPPINGS) when it exists, else from CATEGORY_MAPPINGS. Loading
+    and compiling happen on first use, not at import.
+    """
+    def __init__(self, mappings=None, mappings_file=None):
+        self._mappings = mappings
+        self.mappings_file = mappings_file
+        self._source = None
+        self._pattern = None
+        self._owners = None
+        self._memo = {}
+
+    def load(self):
+        mappings = self._mappings
+        if mappings is None and self.mappings_file and os.path.exists(self.mappings_file):
+            with open(self.mappings_file, "r", encoding="utf-8") as f:
+                mappings = json.load(f)
+            print(f"Loaded category mappings from {self.mappings_file}")
+        if mappings is None:
+            mappings = CATEGORY_MAPPINGS
+        self._source = mappings
+
+        keywords, owners, seen = [], [], set()
+        for super_cat, words in mappings.items():
+            for word in words:
+                word = str(word).lower()
+                if word in seen: continue  # An earlier super category already owns it
+                seen.add(word)
+                keywords.append(word)
+                owners.append(super_cat)
+        alternation = "|".join(f"({re.escape(w)})" for w in keywords)
+        self._pattern = re.compile(f"(?=(?:{alternation}))") if keywords else None
+        self._owners = owners
+
+    def classify(self, text):
+        result = self._memo.get(text)
+        if result is not None: return result
+        if self._owners is None: self.load()
+
+        best = None
+        if self._pattern is not None:
+            for m in self._pattern.finditer(text.lower()):
+                rank = m.lastindex - 1
+                if best is None or rank < best:
+                    best = rank
+                    if best == 0: break
+        result = self._owners[best] if best is not None else DEFAULT_SUPER_CATEGORY
+        self._memo[text] = result
+        return result
+
+    def fingerprint(self):
+        """sha256 of the mappings in effect, in order (first match wins)."""
+        if self._owners is None: self.load()
+        return hashlib.sha256(json.dumps(self._source).encode("utf-8")).hexdigest()
+
+CATEGORY_CLASSIFIER = CategoryClassifier(mappings_file=CATEGORY_MAPPINGS_FILE)
+
+@timed("get_super_category")
 def get_super_category(raw_cat):
-    if pd.isna(raw_cat): return "Other"
-    cat_lower = str(raw_cat).lower()
-    for super_cat, keywords in CATEGORY_MAPPINGS.items():
-        for keyword in keywords:
-            if keyword in cat_lower:
-                return super_cat
-    return "Other / Brands"
+    if _missing(raw_cat): return "Other"
+    return CATEGORY_CLASSIFIER.classify(str(raw_cat))
 
 # ---- Utility Functions ----
+def _missing(x):
+    """pd.isna() for the scalars rows hold: None or a NaN float."""
+    return x is None or (isinstance(x, float) and x != x)
+
 def esc(x):
-    if pd.isna(x): return ""
+    if _missing(x): return ""
     return html.escape(str(x)).replace("\n", " ").replace("\r", " ").replace(",", "&#44;")
 
 def to_numeric_price(val):
     try:
-        if pd.isna(val) or val == "": return None
+        if _missing(val) or val == "": return None
         s = str(val).strip().replace("$", "").replace(",", "")
         return float(s)
     except Exception: return None
 
 def fmt_price(val):
     try:
-        if pd.isna(val) or val == "": return ""
+        if _missing(val) or val == "": return ""
         v = float(str(val).replace("$", "").replace(",", ""))
         return f"${v:,.2f}"
     except Exception:
@@ -91,96 +196,806 @@ def generate_category_filters_html(cat_list):
 
 # ---- Main Processing ----
 
-# Load Data
-try:
-    df = pd.read_csv(IN_CSV)
-    print(f"Loaded {len(df)} rows from {IN_CSV}")
-except FileNotFoundError:
-    print(f"Warning: {IN_CSV} not found. Using placeholder data.")
-    df = pd.DataFrame(columns=["Title","Original Price","Sale Price","Link","Category","Product ID"])
-
-deals_payload = []
-unique_categories = set()
-
-for idx, row in df.iterrows():
-    pid = str(row.get("Product ID", "") or "")
-    display_title = str(row.get("Title", "Unknown Product"))
-    link_url = str(row.get("Link", "#"))
-    
-    orig_raw = row.get("Original Price")
-    sale_raw = row.get("Sale Price")
-    
-    orig_val = to_numeric_price(orig_raw)
-    disc_val = to_numeric_price(sale_raw)
-    
-    pct_val = 0
-    if orig_val and disc_val and orig_val > 0:
-        pct_val = ((orig_val - disc_val) / orig_val) * 100
-    
-    if not orig_val and disc_val:
-        orig_val = disc_val
+# Everything the page payload reads; the snapshot load skips the rest
+PAYLOAD_COLUMNS = ["Title", "Original Price", "Sale Price", "Category", "Product ID", "Link"]
+
+def load_products(path=IN_CSV, snapshot_path=SNAPSHOT_FILE):
+    _load_pandas()
+    # Prefer the typed snapshot: prices are already floats, no string re-parsing
+    if snapshot_available() and os.path.exists(snapshot_path):
+        if not os.path.exists(path) or os.path.getmtime(snapshot_path) >= os.path.getmtime(path):
+            try:
+                df = read_snapshot(snapshot_path, columns=PAYLOAD_COLUMNS)
+                print(f"Loaded {len(df)} rows from {snapshot_path}")
+                return df
+            except Exception as e:
+                print(f"Warning: could not read {snapshot_path} ({e}). Falling back to {path}.")
+        else:
+            print(f"Notice: {snapshot_path} is older than {path}, using the CSV.")
+    try:
+        # Only the columns the payload uses; a "full" scrape's descriptions are never parsed
+        df = pd.read_csv(path, usecols=lambda name: name in PAYLOAD_COLUMNS)
+        print(f"Loaded {len(df)} rows from {path}")
+    except FileNotFoundError:
+        print(f"Warning: {path} not found. Using placeholder data.")
+        df = pd.DataFrame(columns=["Title","Original Price","Sale Price","Link","Category","Product ID"])
+    return df
+
+def frame_from_records(records):
+    """
+    The frame load_products() would read back from the scraper's CSV, built
+    from its rows in memory: float prices, and NaN wherever the CSV cell
+    would be empty.
+    """
+    _load_pandas()
+    columns = {}
+    for name in PAYLOAD_COLUMNS:
+        values = [row.get(name) for row in records]
+        if name in ("Original Price", "Sale Price"):
+            columns[name] = pd.Series([to_price(v) for v in values], dtype="float64")
+        else:
+            columns[name] = pd.Series([to_text(v) or np.nan for v in values], dtype=object)
+    df = pd.DataFrame(columns)
+    print(f"Using {len(df)} scraped rows from memory")
+    return df
+
+def build_deals_payload_rowwise(df):
+    """
+    Original row-at-a-time builder. Kept as the reference the columnar
+    build_deals_payload() must match byte for byte (see bench_sitegen.py).
+    """
+    _load_pandas()
+    deals_payload = []
+    unique_categories = set()
+
+    for idx, row in df.iterrows():
+        pid = str(row.get("Product ID", "") or "")
+        display_title = str(row.get("Title", "Unknown Product"))
+        link_url = str(row.get("Link", "#"))
+        
+        orig_raw = row.get("Original Price")
+        sale_raw = row.get("Sale Price")
+        
+        orig_val = to_numeric_price(orig_raw)
+        disc_val = to_numeric_price(sale_raw)
+        
+        pct_val = 0
+        if orig_val and disc_val and orig_val > 0:
+            pct_val = ((orig_val - disc_val) / orig_val) * 100
+        
+        if not orig_val and disc_val:
+            orig_val = disc_val
+            
+        raw_cat_str = str(row.get("Category", "Other"))
+        if pd.isna(raw_cat_str) or raw_cat_str.lower() == "nan":
+            raw_cat_str = "Other"
         
-    raw_cat_str = str(row.get("Category", "Other"))
-    if pd.isna(raw_cat_str) or raw_cat_str.lower() == "nan":
+        specific_category = raw_cat_str.split(';;')[0].strip()
+        super_category = get_super_category(specific_category)
+        unique_categories.add(super_category)
+
+        deals_payload.append({
+            "n": display_title,
+            "p": pid,
+            "l": link_url,
+            "o": fmt_price(orig_val),
+            "d": fmt_price(disc_val),
+            "v": pct_val if pct_val else 0,
+            "vp": disc_val if disc_val is not None else (orig_val if orig_val is not None else 0),
+            "c": super_category,
+            "sc": specific_category
+        })
+
+    return deals_payload, unique_categories
+
+# ---- Columnar Processing ----
+# Same rules as build_deals_payload_rowwise(), applied a column at a time.
+# Prices and categories repeat heavily, so string work runs once per
+# distinct value (pd.factorize) and is broadcast back with a take.
+
+def _column(df, name, default):
+    if name in df.columns: return df[name]
+    return pd.Series([default] * len(df), index=df.index, dtype=object)
+
+def _by_unique(col, fn):
+    """
+    Applies fn once per distinct value of a text column and broadcasts the
+    results back to every row. Missing values are passed through as-is.
+    """
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        # Dictionary-encoded snapshot column: the categories are the distinct values
+        mapped = np.empty(len(col.cat.categories) + 1, dtype=object)
+        mapped[:-1] = [fn(u) for u in col.cat.categories]
+        mapped[-1] = fn(np.nan)  # code -1
+        return mapped[col.cat.codes.to_numpy()]
+    values = col.to_numpy(dtype=object)
+    if not (pd.api.types.is_object_dtype(col.dtype) or pd.api.types.is_string_dtype(col.dtype)):
+        out = np.empty(len(values), dtype=object)
+        out[:] = [fn(x) for x in values]
+        return out
+    codes, uniques = pd.factorize(col, use_na_sentinel=True)
+    mapped = np.empty(len(uniques) + 1, dtype=object)
+    mapped[:len(uniques)] = [fn(u) for u in uniques]
+    out = mapped[codes]
+    missing = np.flatnonzero(codes == -1)
+    out[missing] = [fn(values[i]) for i in missing]
+    return out
+
+def _price_column(col):
+    """
+    Vectorised to_numeric_price(): returns (values, valid) where valid is
+    False wherever the scalar version would return None.
+    """
+    if pd.api.types.is_numeric_dtype(col.dtype) and not pd.api.types.is_bool_dtype(col.dtype):
+        values = col.to_numpy(dtype="float64", na_value=np.nan)
+        return values, ~col.isna().to_numpy()
+
+    codes, uniques = pd.factorize(col, use_na_sentinel=True)
+    cleaned = (pd.Series(uniques, dtype=object).astype(str)
+               .str.strip().str.replace("$", "", regex=False).str.replace(",", "", regex=False))
+    parsed = np.full(len(uniques) + 1, np.nan)
+    ok = np.zeros(len(uniques) + 1, dtype=bool)
+    for i, (raw, text) in enumerate(zip(uniques, cleaned)):
+        if isinstance(raw, str) and raw == "": continue
+        try:
+            parsed[i] = float(text)
+            ok[i] = True
+        except (TypeError, ValueError):
+            pass
+    return parsed[codes], ok[codes]
+
+def _fmt_price_column(values, valid):
+    """
+    Vectorised fmt_price() over already-numeric prices: "" for missing/NaN,
+    otherwise $1,234.56 formatted once per distinct price.
+    """
+    present = valid & ~np.isnan(values)
+    out = np.full(len(values), "", dtype=object)
+    if present.any():
+        # Unique on the bit pattern so -0.0 and 0.0 keep their own labels
+        bits, inverse = np.unique(values[present].view(np.int64), return_inverse=True)
+        labels = np.empty(len(bits), dtype=object)
+        labels[:] = [f"${v:,.2f}" for v in bits.view(np.float64).tolist()]
+        out[present] = labels[inverse.reshape(-1)]
+    return out
+
+def _pid(value):
+    return str(value or "")
+
+def _category_text(value):
+    raw_cat_str = str(value)
+    if raw_cat_str.lower() == "nan":
         raw_cat_str = "Other"
-    
-    specific_category = raw_cat_str.split(';;')[0].strip()
-    super_category = get_super_category(specific_category)
-    unique_categories.add(super_category)
-
-    deals_payload.append({
-        "n": display_title,
-        "p": pid,
-        "l": link_url,
-        "o": fmt_price(orig_val),
-        "d": fmt_price(disc_val),
-        "v": pct_val if pct_val else 0,
-        "vp": disc_val if disc_val is not None else (orig_val if orig_val is not None else 0),
-        "c": super_category,
-        "sc": specific_category
-    })
-
-json_data = json.dumps(deals_payload)
-category_filters_html = generate_category_filters_html(list(unique_categories))
+    return raw_cat_str.split(';;')[0].strip()
+
+def build_deals_payload(df):
+    """
+    Builds the client payload from the scraped rows, column by column.
+    Produces exactly the same list as build_deals_payload_rowwise().
+    """
+    _load_pandas()
+    titles = _by_unique(_column(df, "Title", "Unknown Product"), str)
+    pids = _by_unique(_column(df, "Product ID", ""), _pid)
+    links = _by_unique(_column(df, "Link", "#"), str)
+
+    orig, orig_ok = _price_column(_column(df, "Original Price", np.nan))
+    disc, disc_ok = _price_column(_column(df, "Sale Price", np.nan))
+
+    # Python truthiness of the scalar code: None and 0.0 are falsy, NaN is not
+    orig_truthy = orig_ok & (orig != 0)
+    disc_truthy = disc_ok & (disc != 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        has_pct = orig_truthy & disc_truthy & (orig > 0)
+        pct = np.where(has_pct, ((orig - disc) / np.where(has_pct, orig, 1)) * 100, 0.0)
+
+    # "if not orig_val and disc_val: orig_val = disc_val"
+    borrow = ~orig_truthy & disc_truthy
+    orig = np.where(borrow, disc, orig)
+    orig_ok = orig_ok | borrow
+
+    v = pct.astype(object)
+    v[~(has_pct & (pct != 0))] = 0
+    vp = np.where(disc_ok, disc, orig).astype(object)
+    vp[~disc_ok & ~orig_ok] = 0
+
+    specific = _by_unique(_column(df, "Category", "Other"), _category_text)
+    super_cats = _by_unique(pd.Series(specific, dtype=object), get_super_category)
+
+    deals_payload = [
+        {"n": t, "p": p, "l": l, "o": o, "d": d, "v": pv, "vp": vpv, "c": c, "sc": sc}
+        for t, p, l, o, d, pv, vpv, c, sc in zip(
+            titles, pids, links,
+            _fmt_price_column(orig, orig_ok), _fmt_price_column(disc, disc_ok),
+            v.tolist(), vp.tolist(), super_cats, specific)
+    ]
+    return deals_payload, set(super_cats)
+
+# ---- Stdlib Processing ----
+# --no-pandas: the same payload from the csv module and plain tuples, for
+# runs where importing pandas costs more than the build itself. Columns are
+# converted the way pd.read_csv infers them (ints, floats, else text, with
+# its default NA strings), since str() of a Product ID or Title depends on
+# that, and floats are parsed with pandas' own algorithm so every price
+# comes out bit-identical; build_deals_payload_stdlib() then mirrors
+# build_deals_payload().
+CSV_NA_VALUES = frozenset([
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+])
+CSV_INT_RE = re.compile(r"\s*[+-]?\d+\s*\Z")
+CSV_NUMBER_RE = re.compile(r"\s*([+-]?)(\d*)(?:\.(\d*))?(?:[eE]([+-]?\d+))?\s*\Z")
+POW10 = [float(f"1e{k}") for k in range(309)]
+COLUMN_DEFAULTS = {"Title": "Unknown Product", "Original Price": float("nan"), "Sale Price": float("nan"),
+                   "Category": "Other", "Product ID": "", "Link": "#"}
+
+def _csv_float(text):
+    """
+    The double pandas' C parser reads from text, or None if it isn't a
+    number. Its default ("high" precision) xstrtod keeps 17 significant
+    digits and scales by a power of ten, which is not always correctly
+    rounded, so float(text) can differ in the last bit.
+    """
+    m = CSV_NUMBER_RE.match(text)
+    if m is None or not (m.group(2) or m.group(3)):
+        return float(text) if text.strip().lstrip("+-").lower() in ("inf", "infinity") else None
+    sign, whole, frac, exp = m.groups()
+    # Up to 15 digits accumulate exactly and 10**k (k <= 22) is exact, so
+    # the one rounding step matches float()'s correctly rounded result
+    if not exp and len(whole) + len(frac or "") <= 15: return float(text)
+    number, exponent, used = 0.0, 0, 0
+    for ch in whole:
+        if used < 17:
+            number = number * 10.0 + (ord(ch) - 48)
+            used += 1
+        else:
+            exponent += 1
+    for ch in (frac or "")[:max(0, 17 - used)]:
+        number = number * 10.0 + (ord(ch) - 48)
+        exponent -= 1
+    if sign == "-": number = -number
+    if exp:
+        exponent += (-1 if exp[0] == "-" else 1) * int(exp.lstrip("+-")[:17])
+    if exponent > 308: return math.copysign(math.inf, number)
+    if exponent > 0: return number * POW10[exponent]
+    if exponent < -616: return 0.0 * number
+    if exponent < -308: return number / POW10[-308 - exponent] / POW10[308]
+    return number / POW10[-exponent]
+
+def _csv_column(values):
+    nan = float("nan")
+    present = [v for v in values if v not in CSV_NA_VALUES]
+    if present and all(CSV_INT_RE.match(v) for v in present):
+        if len(present) == len(values): return [int(v) for v in values]
+        return [nan if v in CSV_NA_VALUES else float(int(v)) for v in values]
+    parsed = {}
+    for v in set(present):
+        parsed[v] = _csv_float(v)
+        if parsed[v] is None: return [nan if v in CSV_NA_VALUES else v for v in values]
+    return [nan if v in CSV_NA_VALUES else parsed[v] for v in values]
+
+def load_rows_stdlib(path=IN_CSV):
+    """
+    load_products() without pandas (the snapshot needs it, so always the
+    CSV). Returns one (Title, Original Price, Sale Price, Category,
+    Product ID, Link) tuple per row.
+    """
+    try:
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            wanted = [(header.index(name) if name in header else None) for name in PAYLOAD_COLUMNS]
+            present = [i for i in wanted if i is not None]
+            width = max(present, default=0) + 1
+            cells = [[] for _ in present]
+            appends = [values.append for values in cells]
+            for row in reader:
+                if not row: continue  # read_csv skips blank lines
+                if len(row) < width: row += [""] * (width - len(row))
+                for append, i in zip(appends, present): append(row[i])
+            raw = iter(cells)
+            raw = [next(raw) if i is not None else [] for i in wanted]
+    except FileNotFoundError:
+        print(f"Warning: {path} not found. Using placeholder data.")
+        return []
+    count = max(map(len, raw))
+    columns = [_csv_column(values) if i is not None else [COLUMN_DEFAULTS[name]] * count
+               for name, i, values in zip(PAYLOAD_COLUMNS, wanted, raw)]
+    print(f"Loaded {count} rows from {path}")
+    return list(zip(*columns))
+
+def rows_from_records(records):
+    """frame_from_records() as tuples, for --no-pandas."""
+    nan = float("nan")
+    def cell(row, name):
+        if name in ("Original Price", "Sale Price"):
+            price = to_price(row.get(name))
+            return nan if price is None else price
+        return to_text(row.get(name)) or nan
+    rows = [tuple(cell(row, name) for name in PAYLOAD_COLUMNS) for row in records]
+    print(f"Using {len(rows)} scraped rows from memory")
+    return rows
+
+def _price_value(raw):
+    """(value, valid) as _price_column() gives them for one cell."""
+    if isinstance(raw, (int, float)):
+        return (float(raw), raw == raw)
+    if raw == "": return (float("nan"), False)
+    try:
+        return (float(str(raw).strip().replace("$", "").replace(",", "")), True)
+    except (TypeError, ValueError):
+        return (float("nan"), False)
+
+def _fmt_price_value(value, valid):
+    return f"${value:,.2f}" if valid and value == value else ""
+
+def build_deals_payload_stdlib(rows):
+    """
+    build_deals_payload() over row tuples; every text conversion runs once
+    per distinct value.
+    """
+    def cached(fn):
+        # Text cells only: numbers are cheap, and -0.0 == 0.0 would share a key
+        memo = {}
+        def lookup(value):
+            if type(value) is not str: return fn(value)
+            if value not in memo: memo[value] = fn(value)
+            return memo[value]
+        return lookup
+
+    title_of, pid_of, link_of, price_of = cached(str), cached(_pid), cached(str), cached(_price_value)
+    category_of = cached(lambda raw: (lambda sc: (get_super_category(sc), sc))(_category_text(raw)))
+
+    deals_payload, unique_categories = [], set()
+    for title, orig_raw, sale_raw, category, pid, link in rows:
+        orig, orig_ok = price_of(orig_raw)
+        disc, disc_ok = price_of(sale_raw)
+        # Same truthiness rules as build_deals_payload()
+        orig_truthy, disc_truthy = orig_ok and orig != 0, disc_ok and disc != 0
+        has_pct = orig_truthy and disc_truthy and orig > 0
+        pct = ((orig - disc) / orig) * 100 if has_pct else 0.0
+        if not orig_truthy and disc_truthy:
+            orig, orig_ok = disc, True
+        vp = disc if disc_ok else (orig if orig_ok else 0)
+        super_category, specific = category_of(category)
+        unique_categories.add(super_category)
+        deals_payload.append({
+            "n": title_of(title), "p": pid_of(pid), "l": link_of(link),
+            "o": _fmt_price_value(orig, orig_ok), "d": _fmt_price_value(disc, disc_ok),
+            "v": pct if has_pct and pct != 0 else 0, "vp": vp,
+            "c": super_category, "sc": specific,
+        })
+    return deals_payload, unique_categories
+
+# ---- Price History ----
+def add_price_history(deals_payload, path=HISTORY_DB):
+    """
+    Adds lo (all-time low), l30 (30-day low) and ds (days on sale) from the
+    scraper's price history to each deal it knows: one pass over the price
+    intervals, which only grow when a price changes (see PriceHistory.lows()).
+    """
+    if not os.path.exists(path):
+        print(f"Notice: {path} not found, skipping price history.")
+        return
+    history = PriceHistory(path)
+    try:
+        lows = history.lows()
+    finally:
+        history.close()
+    for deal in deals_payload:
+        stats = lows.get(deal["p"])
+        if stats is None: continue
+        deal["lo"], deal["l30"], deal["ds"] = stats
+
+# ---- Changes Since Last Scrape ----
+# ch: 1 new product, 2 new deal, 3 price drop (pp: the price before), read
+# from the scraper's delta file (see snapshot_diff.py), not from history.
+CHANGE_NEW, CHANGE_NEW_DEAL, CHANGE_DROP = 1, 2, 3
+
+def add_changes(deals_payload, path=DELTA_FILE):
+    delta = load_delta(path)
+    if delta is None:
+        print(f"Notice: {path} not found, skipping change highlights.")
+        return
+    changes = {pid: (CHANGE_NEW, None) for pid, _ in delta["new"]}
+    changes.update((pid, (CHANGE_NEW_DEAL, None)) for pid, _, _ in delta["new_deals"])
+    changes.update((pid, (CHANGE_DROP, old / 100)) for pid, old, _ in delta["drops"])
+    for deal in deals_payload:
+        change = changes.get(deal["p"])
+        if change is None: continue
+        deal["ch"], pp = change
+        if pp is not None: deal["pp"] = pp
+
+# ---- Columnar Client Payload ----
+# The page gets parallel arrays instead of one object per deal. Titles are
+# split into a base and a " - (Colour, Size)" variant suffix, each from a
+# string table; sub-category and link are table indexes too (exploded
+# variants share one link, the super category follows from the
+# sub-category), links share their scheme://host/section/ prefix, and
+# prices are integer cents that the page formats itself. Discount % and the
+# sort price are derived in the browser from the cents, and so are the sort
+# orders (a permutation per column costs more on the wire, gzipped, than
+# sorting once in the query worker). l30 is left null where it equals lo.
+PAYLOAD_FORMAT = 2
+LINK_PREFIX_RE = re.compile(r"^[a-z][a-z0-9+.-]*://[^/]+/(?:[^/]+/)?", re.I)
+
+def _label_cents(label):
+    if not label: return None
+    return _value_cents(float(label.replace("$", "").replace(",", "")))
+
+def _value_cents(value):
+    # inf/nan prices have no cents: left blank rather than aborting the build
+    if value is None or not math.isfinite(value): return None
+    return int(round(value * 100))
+
+def _split_title(title):
+    cut = title.rfind(" - (")
+    if cut > 0 and title.endswith(")"):
+        return title[:cut], title[cut:]
+    return title, ""
+
+@timed("encode_columnar")
+def encode_columnar(deals_payload):
+    """
+    Turns the list built by build_deals_payload() into the columnar payload
+    decodePayload() reads in the page.
+    """
+    tables = {"c": {}, "sc": {}, "l": {}, "lpx": {}, "nb": {}, "ns": {"": 0}}
+    def index(table, key):
+        found = tables[table].get(key)
+        if found is None:
+            found = tables[table][key] = len(tables[table])
+        return found
+
+    cents = {}
+    def label_cents(label):
+        if label not in cents: cents[label] = _label_cents(label)
+        return cents[label]
+
+    title_parts = [_split_title(d["n"]) for d in deals_payload]
+    super_of = {}
+    for d in deals_payload:
+        super_of.setdefault(index("sc", d["sc"]), index("c", d["c"]))
+    payload = {
+        "fmt": PAYLOAD_FORMAT,
+        "nb": [index("nb", base) for base, _ in title_parts],
+        "ns": [index("ns", suffix) for _, suffix in title_parts],
+        "p": [d["p"] for d in deals_payload],
+        "sc": [tables["sc"][d["sc"]] for d in deals_payload],
+        "l": [index("l", d["l"]) for d in deals_payload],
+        "o": [label_cents(d["o"]) for d in deals_payload],
+        "d": [label_cents(d["d"]) for d in deals_payload],
+    }
+    if any("lo" in d for d in deals_payload):
+        payload["lo"] = [_value_cents(d.get("lo")) for d in deals_payload]
+        payload["l30"] = [_value_cents(d.get("l30")) if d.get("l30") != d.get("lo") else None for d in deals_payload]
+        payload["ds"] = [d.get("ds") for d in deals_payload]
+    if any("ch" in d for d in deals_payload):
+        payload["ch"] = [d.get("ch", 0) for d in deals_payload]
+        payload["pp"] = [_value_cents(d.get("pp")) for d in deals_payload]
+
+    link_prefixes, link_rest = [], []
+    for link in tables["l"]:
+        m = LINK_PREFIX_RE.match(link)
+        prefix = m.group(0) if m else ""
+        link_prefixes.append(index("lpx", prefix))
+        link_rest.append(link[len(prefix):])
+    payload["tables"] = {"nb": list(tables["nb"]), "ns": list(tables["ns"]),
+                         "c": list(tables["c"]), "sc": list(tables["sc"]), "scc": [super_of[i] for i in range(len(super_of))],
+                         "l": link_rest, "lp": link_prefixes, "lpx": list(tables["lpx"])}
+    payload["s"] = build_search_index(payload["tables"]["nb"])
+    return payload
+
+def _deltas(ids):
+    return [ids[0]] + [b - a for a, b in zip(ids, ids[1:])] if ids else []
+
+# ---- Search Index ----
+# Title bases are split into [a-z0-9]+ tokens with postings of title-base ids
+# (delta-encoded). Any query token must sit inside one token of a matching
+# row, so the page scans the token list (not the rows) for each query token,
+# collects the rows its postings reach plus suffix, subcategory and product-ID
+# hits, intersects those lists smallest first, and runs the exact substring
+# check on what is left: a query costs its matches, not the catalogue.
+SEARCH_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def build_search_index(title_bases):
+    postings, unindexed = {}, []
+    for i, base in enumerate(title_bases):
+        if not base.isascii():
+            # Python and JS may lowercase these differently; the page checks them directly
+            unindexed.append(i)
+            continue
+        for token in set(SEARCH_TOKEN_RE.findall(base.lower())):
+            postings.setdefault(token, []).append(i)
+    tokens = sorted(postings)
+    return {"t": tokens, "r": [_deltas(postings[t]) for t in tokens], "x": unindexed}
+
+JSON_CHUNK_ITEMS = 5000
+
+def iter_json_list(items):
+    """
+    json.dumps(items) a chunk of items at a time, so a large list is never
+    held as a single string.
+    """
+    yield "["
+    for start in range(0, len(items), JSON_CHUNK_ITEMS):
+        yield (", " if start else "") + json.dumps(items[start:start + JSON_CHUNK_ITEMS])[1:-1]
+    yield "]"
+
+def report_payload_size(deals_payload, json_data):
+    # The row form is only measured: stream it through gzip rather than build it
+    row_size, row_gz, gz = 0, 0, zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in iter_json_list(deals_payload):
+        data = chunk.encode("utf-8")
+        row_size += len(data)
+        row_gz += len(gz.compress(data))
+    row_gz += len(gz.flush())
+    col_json = json_data.encode("utf-8")
+    col_gz = len(gzip.compress(col_json, 6))
+    print(f"Payload: {row_size / 1e6:.2f} MB as rows -> {len(col_json) / 1e6:.2f} MB columnar "
+          f"({row_size / len(col_json):.1f}x smaller); gzipped {row_gz / 1e6:.2f} MB -> {col_gz / 1e6:.2f} MB "
+          f"({row_gz / col_gz:.1f}x)")
+
+# ---- Category Shards ----
+# --shard-categories splits the columnar payload into one file per
+# super-category, plus a summary with the first SHARD_SUMMARY_ROWS rows of
+# the default view (discounted deals, biggest discount first) so the page
+# can render before any shard arrives. Each file lists its rows' positions
+# in the full payload ("at", delta-encoded), which the page uses to merge
+# shards back into one order for the "All" view.
+SHARD_SUMMARY_ROWS = 1000
+
+def _slug(name):
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-") or "other"
+
+def plan_category_shards(deals_payload, summary_rows=SHARD_SUMMARY_ROWS):
+    """
+    Returns ({file stem: row positions}, manifest). The manifest names each
+    file by stem; main() swaps in the URLs once they are written.
+    """
+    by_category = {}
+    for i, d in enumerate(deals_payload):
+        by_category.setdefault(d["c"], []).append(i)
+    default_view = sorted((i for i, d in enumerate(deals_payload) if d["v"] > 0), key=lambda i: -deals_payload[i]["v"])
+    summary = sorted(default_view[:summary_rows])
+
+    stem = f"{DATA_PREFIX}-summary"
+    groups = {stem: summary}
+    manifest = {"summary": {"url": stem, "rows": len(summary), "matches": len(default_view)}, "shards": {}}
+    for category, ids in sorted(by_category.items()):
+        stem = f"{DATA_PREFIX}-{_slug(category)}"
+        groups[stem] = ids
+        manifest["shards"][category.lower()] = stem
+    return groups, manifest
+
+@timed("encode_shard")
+def encode_shard(deals_payload, ids):
+    payload = encode_columnar([deals_payload[i] for i in ids])
+    payload["at"] = _deltas(ids)
+    return json.dumps(payload, separators=(",", ":"))
 
 # ---- TIMEZONE FIX ----
-try:
-    nz_tz = pytz.timezone('Pacific/Auckland')
-    scrape_time_str = datetime.now(nz_tz).strftime("%d/%m/%Y @ %I:%M %p")
-except Exception as e:
-    print(f"Timezone Error: {e}. Falling back to UTC.")
-    scrape_time_str = datetime.now().strftime("%d/%m/%Y @ %I:%M %p UTC")
+def get_scrape_time():
+    try:
+        nz_tz = pytz.timezone('Pacific/Auckland')
+        return datetime.now(nz_tz).strftime("%d/%m/%Y @ %I:%M %p")
+    except Exception as e:
+        print(f"Timezone Error: {e}. Falling back to UTC.")
+        return datetime.now().strftime("%d/%m/%Y @ %I:%M %p UTC")
 
 # ---- WHATS NEW FIX (Safe Read) ----
-whats_new_content = "No updates found."
-# Check for both lowercase and capitalized filename to be safe
-possible_files = ["whatsnew.txt", "WhatsNew.txt", "Whatsnew.txt"]
-found_file = None
+def load_whats_new():
+    whats_new_content = "No updates found."
+    # Check for both lowercase and capitalized filename to be safe
+    possible_files = ["whatsnew.txt", "WhatsNew.txt", "Whatsnew.txt"]
+    found_file = None
+
+    for f_name in possible_files:
+        if os.path.exists(f_name):
+            found_file = f_name
+            break
+
+    if found_file:
+        try:
+            with open(found_file, "r", encoding="utf-8") as f:
+                whats_new_content = f.read()
+                # Convert newlines to <br> for HTML display
+                whats_new_content = whats_new_content.replace("\n", "<br>")
+        except Exception as e:
+            print(f"Error reading whatsnew: {e}")
+    else:
+        print("Notice: whatsnew.txt not found. Using default text.")
+    return whats_new_content
+
+
+# ---- Split Data File ----
+@timed("write_data_files")
+def write_data_files(files, data_dir=DATA_DIR, out_html=OUT_HTML, precompress=False):
+    """
+    Writes each {stem: json} payload to <data_dir>/<stem>.<hash>.json (with
+    precompress, plus gzip and brotli twins for hosts that serve
+    precompressed files; GitHub Pages compresses on its own). A name changes
+    only when its data does, so it can be cached forever. Returns {stem: URL
+    relative to the HTML page}.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    if precompress and brotli is None:
+        print("Notice: brotli not installed, skipping the .br variants.")
+    urls, sizes = {}, {}
+    for stem, json_data in files.items():
+        raw = json_data.encode("utf-8")
+        name = f"{stem}.{hashlib.sha256(raw).hexdigest()[:12]}.json"
+        path = os.path.join(data_dir, name)
+        variants = {path: raw}
+        if precompress:
+            variants[path + ".gz"] = gzip.compress(raw, 9, mtime=0)
+        if precompress and brotli is not None:
+            variants[path + ".br"] = brotli.compress(raw, quality=11)
+        for target, blob in variants.items():
+            with open(target + ".tmp", "wb") as f:
+                f.write(blob)
+            os.replace(target + ".tmp", target)
+        sizes[stem] = {os.path.basename(t): len(b) for t, b in variants.items()}
+        urls[stem] = os.path.relpath(path, os.path.dirname(os.path.abspath(out_html))).replace(os.sep, "/")
+
+    for stem, variant_sizes in sizes.items():
+        print("Data file: " + ", ".join(f"{name} {size / 1e6:.2f} MB" for name, size in variant_sizes.items()))
+    return urls
+
+def remove_old_data_files(keep, data_dir=DATA_DIR):
+    """Removes the data files of previous builds: those not in `keep` (paths)."""
+    keep = {os.path.basename(path) for path in keep}
+    for old in os.listdir(data_dir):
+        if old.startswith((DATA_PREFIX + ".", DATA_PREFIX + "-")) and old not in keep:
+            os.remove(os.path.join(data_dir, old))
+
+# ---- Build Cache ----
+# The page is a function of its inputs: the normalized rows (the payload
+# after category mapping), the payload (the rows with price history and
+# change badges added), whatsnew.txt, the template (render_html's source),
+# the payload encoder (the source of PAYLOAD_ENCODERS) and the category
+# mappings. BUILD_CACHE_FILE keeps their digests and, for each generated
+# piece (each data file, the HTML shell), the key it was built from and the
+# files it wrote; a piece whose key matches and whose files are still
+# intact is reused, not rebuilt. Data files are keyed on the payload rows
+# they hold, so with --shard-categories a change rewrites only the shards
+# it touches.
+# The page shows when the rows last changed; days on sale and the badges
+# move without them. The time of each scrape goes to FRESHNESS_FILE.
+BUILD_CACHE_FILE = os.environ.get("SITEGEN_BUILD_CACHE", "sitegen_cache.json")
+BUILD_CACHE_VERSION = 2
+FRESHNESS_FILE = "freshness.json"
+
+PAYLOAD_ENCODERS = (encode_columnar, build_search_index, plan_category_shards, encode_shard)
 
-for f_name in possible_files:
-    if os.path.exists(f_name):
-        found_file = f_name
-        break
+def _digest(data):
+    return hashlib.sha256(data if isinstance(data, bytes) else data.encode("utf-8")).hexdigest()
 
-if found_file:
+def _file_digest(path):
     try:
-        with open(found_file, "r", encoding="utf-8") as f:
-            whats_new_content = f.read()
-            # Convert newlines to <br> for HTML display
-            whats_new_content = whats_new_content.replace("\n", "<br>")
-    except Exception as e:
-        print(f"Error reading whatsnew: {e}")
-else:
-    print("Notice: whatsnew.txt not found. Using default text.")
+        with open(path, "rb") as f:
+            return _digest(f.read())
+    except OSError:
+        return None
+
+class BuildCache:
+    """
+    BUILD_CACHE_FILE as {"version", "inputs": {name: digest}, "updated":
+    {"rows", "at"}, "pieces": {name: {"key", "files": {path: digest}, ...}}}.
+    rebuild=True rebuilds every piece but keeps the record of when the
+    data last changed.
+    """
+    def __init__(self, path=BUILD_CACHE_FILE, rebuild=False):
+        self.path = path
+        self.rebuild = rebuild
+        self.state = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    state = json.load(f)
+                if state.get("version") == BUILD_CACHE_VERSION: self.state = state
+            except (OSError, ValueError) as e:
+                print(f"Notice: ignoring unreadable {path}: {e}")
+        self.state["version"] = BUILD_CACHE_VERSION
+        self.pieces = self.state.setdefault("pieces", {})
+
+    def inputs(self, rows_digest, deals_payload, whats_new_content):
+        digests = {
+            "rows": rows_digest,
+            "payload": _digest(json.dumps(deals_payload)),
+            "whatsnew": _digest(whats_new_content),
+            "template": _digest(inspect.getsource(render_html)),
+            "encoder": _digest("".join(inspect.getsource(fn) for fn in PAYLOAD_ENCODERS)),
+            "mappings": CATEGORY_CLASSIFIER.fingerprint(),
+        }
+        previous = self.state.get("inputs", {})
+        changed = [name for name, digest in digests.items() if previous.get(name) != digest]
+        print("Build inputs changed: " + ", ".join(changed) if changed else "Build inputs unchanged")
+        self.state["inputs"] = digests
+        return digests
+
+    def updated(self, rows_digest, now):
+        """When rows_digest first appeared (now, if this build is the first)."""
+        record = self.state.get("updated") or {}
+        if record.get("rows") != rows_digest:
+            record = self.state["updated"] = {"rows": rows_digest, "at": now}
+        return record["at"]
+
+    @staticmethod
+    def key(*parts):
+        return _digest(json.dumps(parts, sort_keys=True))
+
+    def reuse(self, name, key):
+        """The piece's record if it can be reused as is, else None."""
+        piece = self.pieces.get(name)
+        if self.rebuild or piece is None or piece["key"] != key: return None
+        if any(_file_digest(path) != digest for path, digest in piece["files"].items()): return None
+        return piece
+
+    def store(self, name, key, paths, **outputs):
+        piece = self.pieces[name] = {"key": key, "files": {path: _file_digest(path) for path in paths}, **outputs}
+        return piece
+
+    def forget(self, prefix, keep):
+        """Drops the pieces named prefix + anything not in `keep`."""
+        for name in [name for name in self.pieces if name.startswith(prefix) and name[len(prefix):] not in keep]:
+            del self.pieces[name]
+
+    def save(self):
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=1, sort_keys=True)
+        os.replace(self.path + ".tmp", self.path)
+
+def data_file_paths(urls, out_html=OUT_HTML, precompress=False):
+    """The files write_data_files() wrote for `urls`, twins included."""
+    suffixes = ("",)
+    if precompress: suffixes += (".gz", ".br") if brotli is not None else (".gz",)
+    base = os.path.dirname(out_html)
+    return [os.path.join(base, url) + suffix for url in urls for suffix in suffixes]
 
+def write_freshness(scraped, updated, out_html=OUT_HTML):
+    path = os.path.join(os.path.dirname(out_html), FRESHNESS_FILE)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"scraped": scraped, "updated": updated}, f)
 
 # ---- HTML Output ----
-html_content = f"""<!doctype html>
+@timed("render_html")
+def render_html(json_data, category_filters_html, scrape_time_str, whats_new_content, data_url=None, shards=None):
+    """
+    Inlines json_data into the page, or with data_url leaves it out and
+    fetches that file after the shell has rendered. With a shards manifest
+    (see plan_category_shards) the page starts from the summary file and
+    fetches category shards as they are needed. Either payload shape
+    (columnar or a list of rows) goes through decodePayload(), on the main
+    thread for rendering and in the query worker for filtering and sorting.
+    scrape_time_str should be when the data last changed; the page shows
+    the latest scrape time from FRESHNESS_FILE instead when it can fetch it.
+    """
+    preload, payload_block = "", ""
+    if shards is not None:
+        data_url = shards["summary"]["url"]
+        load = "loadShard('summary')"
+    elif data_url is None:
+        # JSON in a data block ('<' escaped so no string can close it), so the
+        # same text can be handed to the query worker
+        payload_block = '<script type="application/json" id="dealsPayload">' + json_data.replace("<", "\\u003c") + "</script>\n"
+        load = "Promise.resolve(document.getElementById('dealsPayload').textContent).then(text => loadDataset('all', text))"
+    else:
+        load = f"fetchText({json.dumps(data_url)}).then(text => loadDataset('all', text))"
+    if data_url is not None:
+        preload = f'\n<link rel="preload" href="{html.escape(data_url)}" as="fetch" crossorigin="anonymous"/>'
+    shards_json = json.dumps(shards).replace("<", "\\u003c") if shards is not None else "null"
+    boot_script = (
+        "showMessage('Loading deals...');\nstartEngine();\nshowFreshness();\n"
+        f"{load}.then(init).catch(e => {{ console.error(e); showMessage('Could not load deals. Please refresh the page.'); }});"
+    )
+    return f"""<!doctype html>
 <html lang="en">
 <head>
 <meta charset="utf-8"/>
 <title>Briscoes Deal Finder</title>
-<meta name="viewport" content="width=device-width, initial-scale=1, maximum-scale=1, user-scalable=0"/>
+<meta name="viewport" content="width=device-width, initial-scale=1, maximum-scale=1, user-scalable=0"/>{preload}
+<link rel="alternate" type="application/rss+xml" title="New deals and price drops" href="feed.xml"/>
+<link rel="alternate" type="application/feed+json" title="New deals and price drops" href="feed.json"/>
 <script>
   (function() {{
     const theme = localStorage.getItem('theme');
@@ -268,7 +1083,17 @@ html_content = f"""<!doctype html>
   thead th {{ text-align: left; padding: 14px 16px; background: var(--header-bg); border-bottom: 1px solid var(--border); cursor: pointer; font-weight: 600; font-size: 13px; text-transform: uppercase; color: var(--muted); user-select: none; }}
   thead th:hover {{ color: var(--text); }}
   tbody td {{ padding: 14px 16px; border-top: 1px solid var(--border); font-size: 14px; vertical-align: middle; }}
-  tbody tr:nth-child(even) {{ background: var(--row-even); }}
+  tbody tr.even {{ background: var(--row-even); }}
+  tbody tr.spacer td {{ padding: 0; border: 0; }}
+  tbody tr.message td {{ text-align: center; padding: 20px; }}
+  td.cell-id {{ font-family: monospace; color: var(--muted); font-size: 12px; }}
+  td.price.orig {{ text-decoration: line-through; color: var(--muted); }}
+  td.price.sale {{ font-weight: bold; }}
+  .low-badge {{ font-size: 11px; color: var(--accent); margin-left: 4px; }}
+  .change-badge {{ display: inline-block; margin-top: 3px; padding: 1px 6px; border-radius: 4px; font-size: 11px; font-weight: 700; background: #E8F5E9; color: #2E7D32; }}
+  :root.dark .change-badge {{ background: #1B3A1E; color: #81C784; }}
+  .cat-tag {{ background: var(--row-hover); padding: 2px 8px; border-radius: 4px; font-size: 12px; white-space: nowrap; }}
+  td.g-cell {{ text-align: center; }}
   tbody tr:hover {{ background: var(--row-hover); }}
   .price {{ font-family: monospace; font-size: 14px; color: var(--text); white-space: nowrap; }}
   .discount {{ color: #D32F2F; font-weight: 700; white-space: nowrap; }}
@@ -276,7 +1101,7 @@ html_content = f"""<!doctype html>
   .google-icon {{ width: 20px; height: 20px; fill: var(--muted); vertical-align: middle; transition: fill 0.2s; }}
   tr:hover .google-icon {{ fill: var(--accent); }}
   a.product-link {{ color: var(--text); text-decoration: none; font-weight: 600; display: block; transition: color 0.15s; }}
-  a.product-link:hover {{ color: var(--accent); text-decoration: underline; }}
+  a.product-link[href]:hover {{ color: var(--accent); text-decoration: underline; }}
   .pagination-bar {{ display: flex; justify-content: space-between; align-items: center; padding: 12px; background: var(--header-bg); border: 1px solid var(--border); border-radius: 8px; color: var(--muted); font-size: 14px; }}
   .modal-overlay {{ position: fixed; top: 0; left: 0; right: 0; bottom: 0; background: rgba(0,0,0,0.7); display: none; align-items: center; justify-content: center; z-index: 1000; backdrop-filter: blur(2px); }}
   .modal-content {{ background: var(--card); padding: 25px; border-radius: 12px; width: 90%; max-width: 600px; max-height: 80vh; display: flex; flex-direction: column; box-shadow: 0 10px 25px rgba(0,0,0,0.5); border: 1px solid var(--border); }}
@@ -289,19 +1114,20 @@ html_content = f"""<!doctype html>
     input[type="search"] {{ width: 100%; }}
     .pct-inputs {{ justify-content: space-between; }}
     .pct-inputs input {{ width: 45%; }}
-    thead th:nth-child(1), tbody td:nth-child(1) {{ display: none; }}
-    thead th:nth-child(3), tbody td:nth-child(3) {{ display: none; }}
+    thead th:nth-child(1), tbody tr.row td:nth-child(1) {{ display: none; }}
+    thead th:nth-child(3), tbody tr.row td:nth-child(3) {{ display: none; }}
     .pagination-bar {{ flex-direction: column; gap: 10px; text-align: center; }}
   }}
 </style>
 </head>
 <body>
+<svg width="0" height="0" style="position:absolute" aria-hidden="true"><symbol id="googleIcon" viewBox="0 0 24 24"><path d="M12.48 10.92v3.28h7.84c-.24 1.84-.853 3.187-1.787 4.133-1.147 1.147-2.933 2.4-6.053 2.4-4.827 0-8.6-3.893-8.6-8.72s3.773-8.72 8.6-8.72c2.6 0 4.507 1.027 5.907 2.347l2.307-2.307C18.747 1.44 16.133 0 12.48 0 5.867 0 .533 5.333.533 12S5.867 24 12.48 24c3.44 0 6.04-1.133 8.147-3.333 2.147-2.147 2.813-5.013 2.813-7.387 0-.747-.053-1.44-.16-2.107H12.48z"/></symbol></svg>
 <div class="container">
   <header>
     <div class="header-top">
       <div class="header-titles">
         <h1>Briscoes Deal Finder</h1>
-        <div class="scrape-time">Last updated: {scrape_time_str}</div>
+        <div class="scrape-time" id="scrapeTime">Last updated: {scrape_time_str}</div>
       </div>
       <div class="header-actions">
         <button class="btn secondary" id="whatsNewBtn">What's New</button>
@@ -348,7 +1174,7 @@ html_content = f"""<!doctype html>
             <option value="50">50</option>
             <option value="100" selected>100</option>
             <option value="200">200</option>
-            <option value="1000">All</option>
+            <option value="all">All</option>
         </select>
     </div>
     <div id="pageInfo">Page 1</div>
@@ -367,70 +1193,440 @@ html_content = f"""<!doctype html>
     <div class="modal-body">{whats_new_content}</div>
   </div>
 </div>
-<script>
-const allData = {json_data};
-const googleIconSvg = '<svg class="google-icon" viewBox="0 0 24 24"><path d="M12.48 10.92v3.28h7.84c-.24 1.84-.853 3.187-1.787 4.133-1.147 1.147-2.933 2.4-6.053 2.4-4.827 0-8.6-3.893-8.6-8.72s3.773-8.72 8.6-8.72c2.6 0 4.507 1.027 5.907 2.347l2.307-2.307C18.747 1.44 16.133 0 12.48 0 5.867 0 .533 5.333.533 12S5.867 24 12.48 24c3.44 0 6.04-1.133 8.147-3.333 2.147-2.147 2.813-5.013 2.813-7.387 0-.747-.053-1.44-.16-2.107H12.48z"/></svg>';
-let state = {{ filtered: [], currentPage: 1, rowsPerPage: 100, sortCol: 'v', sortDir: 'desc', search: '', minPct: 0, maxPct: 100, activeCategory: 'all', hideZero: true }};
-const tbody = document.getElementById('tableBody');
-const countEl = document.getElementById('visibleCount');
-function init() {{ state.filtered = [...allData]; applyFilters(); setupListeners(); renderPage(); }}
-function escapeHtml(text) {{ if (!text) return ''; return text.replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;").replace(/"/g, "&quot;").replace(/'/g, "&#039;"); }}
-function renderPage() {{
-    const start = (state.currentPage - 1) * state.rowsPerPage;
-    const end = start + state.rowsPerPage;
-    const slice = state.filtered.slice(start, end);
-    let html = '';
-    slice.forEach(d => {{
-        const googleLink = `https://www.google.com/search?q=${{encodeURIComponent(d.n)}}`;
-        let linkHtml = `<span class="product-link">${{escapeHtml(d.n)}}</span>`;
-        if (d.l && d.l !== '#') {{ linkHtml = `<a class="product-link" href="${{d.l}}" target="_blank">${{escapeHtml(d.n)}}</a>`; }}
-        let pctDisplay = '';
-        if (d.v > 0) {{ pctDisplay = `${{Math.round(d.v)}}%`; }}
-        html += `<tr><td style="font-family:monospace; color:var(--muted); font-size:12px;">${{escapeHtml(d.p)}}</td><td>${{linkHtml}}</td><td class="price" style="text-decoration:line-through; color:var(--muted);">${{d.o}}</td><td class="price" style="font-weight:bold;">${{d.d}}</td><td class="discount">${{pctDisplay}}</td><td><span style="background:var(--row-hover); padding:2px 8px; border-radius:4px; font-size:12px; white-space:nowrap;">${{escapeHtml(d.sc)}}</span></td><td style="text-align:center;"><a href="${{googleLink}}" target="_blank">${{googleIconSvg}}</a></td></tr>`;
-    }});
-    if (slice.length === 0) {{ html = '<tr><td colspan="7" style="text-align:center; padding:20px;">No deals found matching filters.</td></tr>'; }}
-    tbody.innerHTML = html;
-    const total = state.filtered.length;
-    const maxPage = Math.ceil(total / state.rowsPerPage) || 1;
-    document.getElementById('pageInfo').innerText = `Page ${{state.currentPage}} of ${{maxPage}}`;
-    document.getElementById('btnPrev').disabled = state.currentPage === 1;
-    document.getElementById('btnNext').disabled = state.currentPage >= maxPage;
-    countEl.innerText = total;
+{payload_block}<script id="queryEngine">
+// ---- Query engine ----
+// Filtering and sorting over the loaded datasets (the whole payload, or one
+// per category shard). Runs inside a Web Worker when the browser allows one
+// (startEngine() builds it from this script plus #queryWorker), otherwise on
+// the main thread; either way the page only gets back row numbers for the
+// page it asked for.
+const priceFormat = new Intl.NumberFormat('en-US', {{ minimumFractionDigits: 2, maximumFractionDigits: 2 }});
+function fmtCents(c) {{ return c == null ? '' : '$' + priceFormat.format(c / 100); }}
+function decodePayload(P) {{
+    // d.i is the row's number in the full payload, d.j its index in this file
+    if (Array.isArray(P)) {{ P.forEach((d, i) => {{ d.i = d.j = i; }}); return P; }}
+    // Columnar payload: filter/sort fields are set up front, display-only
+    // fields (formatted prices, links, history) are decoded when rendered
+    const T = P.tables, fromCents = c => c == null ? null : c / 100;
+    const proto = {{
+        get o() {{ return fmtCents(P.o[this.j]); }},
+        get d() {{ return fmtCents(P.d[this.j]); }},
+        get l() {{ const j = P.l[this.j]; return T.lpx[T.lp[j]] + T.l[j]; }},
+        get lo() {{ return P.lo ? fromCents(P.lo[this.j]) : undefined; }},
+        get l30() {{ return P.l30 ? fromCents(P.l30[this.j]) : undefined; }},
+        get ds() {{ return P.ds ? P.ds[this.j] : undefined; }},
+        get ch() {{ return P.ch ? P.ch[this.j] : 0; }},
+        get pp() {{ return P.pp ? fromCents(P.pp[this.j]) : undefined; }},
+    }};
+    const rows = new Array(P.p.length);
+    let at = 0;
+    for (let i = 0; i < rows.length; i++) {{
+        const o = P.o[i], d = P.d[i], sc = P.sc[i];
+        const r = Object.create(proto);
+        at = P.at ? at + P.at[i] : i;
+        r.i = at; r.j = i; r.n = T.nb[P.nb[i]] + T.ns[P.ns[i]]; r.p = P.p[i]; r.c = T.c[T.scc[sc]]; r.sc = T.sc[sc];
+        // Dollars, not cents, so v comes out bit-identical to SiteGen's pct
+        const od = fromCents(o), dd = fromCents(d);
+        r.v = (od && dd && od > 0) ? ((od - dd) / od) * 100 : 0;
+        r.vp = dd != null ? dd : (od != null ? od : 0);
+        rows[i] = r;
+    }}
+    if (P.s) rows.search = {{ ...P.s, P, T, cache: new Map() }};
+    rows.sorts = {{ cache: {{}} }};
+    return rows;
+}}
+const datasets = {{}};
+function addDataset(name, rows) {{
+    datasets[name] = rows;
+    if (datasets.all && datasets.all.parts) delete datasets.all;
 }}
-function applyFilters() {{
-    const term = state.search.toLowerCase();
-    state.filtered = allData.filter(d => {{
-        if (state.activeCategory !== 'all' && (!d.c || d.c.toLowerCase() !== state.activeCategory)) return false;
-        if (state.hideZero && d.v <= 0) return false;
-        if (d.v < state.minPct || d.v > state.maxPct) return false;
-        if (term && !(d.n + ' ' + d.sc + ' ' + d.p).toLowerCase().includes(term)) return false;
+function dataset(name) {{
+    if (datasets[name]) return datasets[name];
+    // 'all' over category shards: every shard's rows back at their row numbers
+    const parts = Object.keys(datasets).filter(k => k !== 'summary').map(k => datasets[k]);
+    const rows = [];
+    for (const part of parts) for (const d of part) rows[d.i] = d;
+    rows.parts = parts; rows.sortCache = {{}};
+    return (datasets.all = rows);
+}}
+function searchCandidates(rows, term) {{
+    // Rows that could contain term, from the prebuilt index; null means scan everything
+    if (rows.parts) {{
+        const hits = [];
+        for (const part of rows.parts) for (const d of searchCandidates(part, term) || part) hits.push(d);
+        return hits.sort((a, b) => a.i - b.i);
+    }}
+    const S = rows.search, qs = term.match(/[a-z0-9]+/g);
+    if (!S || !qs) return null;
+    // Intersect the query tokens' row lists, smallest first, by binary search
+    const lists = [...new Set(qs)].map(q => tokenRows(S, q)).sort((a, b) => a.length - b.length);
+    let js = lists[0];
+    for (const list of lists.slice(1)) {{
+        if (!js.length) break;
+        js = js.filter(j => {{
+            let lo = 0, hi = list.length;
+            while (lo < hi) {{ const mid = (lo + hi) >> 1; if (list[mid] < j) lo = mid + 1; else hi = mid; }}
+            return list[lo] === j;
+        }});
+    }}
+    return Array.from(js, j => rows[j]);
+}}
+function tokenRows(S, q) {{
+    // Row numbers, ascending, whose title, suffix, subcategory or product ID contains q
+    let js = S.cache.get(q);
+    if (js) return js;
+    if (!S.by) {{
+        // Built once: row numbers per title base, suffix, subcategory and product-ID token
+        const group = keys => {{
+            const by = new Map();
+            for (let j = 0; j < S.P.p.length; j++) for (const k of keys(j)) {{
+                const g = by.get(k);
+                if (g) g.push(j); else by.set(k, [j]);
+            }}
+            return by;
+        }};
+        S.by = {{
+            nb: group(j => [S.P.nb[j]]), ns: group(j => [S.P.ns[j]]), sc: group(j => [S.P.sc[j]]),
+            p: group(j => new Set(S.P.p[j].toLowerCase().match(/[a-z0-9]+/g))),
+        }};
+        S.tw = tokenText(S.t); S.pw = tokenText([...S.by.p.keys()]); S.pr = [...S.by.p.values()];
+        S.seen = new Uint8Array(S.P.p.length);
+    }}
+    const hit = [], add = g => {{ if (g) for (const j of g) if (!S.seen[j]) {{ S.seen[j] = 1; hit.push(j); }} }};
+    for (const k of tokensContaining(S.tw, q)) {{ let id = 0; for (const gap of S.r[k]) {{ id += gap; add(S.by.nb.get(id)); }} }}
+    for (const id of S.x) if (S.T.nb[id].toLowerCase().includes(q)) add(S.by.nb.get(id));
+    S.T.ns.forEach((x, id) => {{ if (x.toLowerCase().includes(q)) add(S.by.ns.get(id)); }});
+    S.T.sc.forEach((x, id) => {{ if (x.toLowerCase().includes(q)) add(S.by.sc.get(id)); }});
+    for (const k of tokensContaining(S.pw, q)) add(S.pr[k]);
+    for (const j of hit) S.seen[j] = 0;
+    js = Int32Array.from(hit).sort();
+    if (S.cache.size > 64) S.cache.clear();
+    S.cache.set(q, js);
+    return js;
+}}
+function tokenText(tokens) {{
+    // Tokens joined by newlines, so one indexOf pass finds every token holding q
+    const starts = [];
+    let at = 0;
+    for (const t of tokens) {{ starts.push(at); at += t.length + 1; }}
+    return {{ text: tokens.join('\\n'), starts }};
+}}
+function tokensContaining(W, q) {{
+    const found = [];
+    for (let at = W.text.indexOf(q); at >= 0; ) {{
+        let lo = 0, hi = W.starts.length - 1;
+        while (lo < hi) {{ const mid = (lo + hi + 1) >> 1; if (W.starts[mid] <= at) lo = mid; else hi = mid - 1; }}
+        found.push(lo);
+        at = lo + 1 < W.starts.length ? W.text.indexOf(q, W.starts[lo + 1]) : -1;
+    }}
+    return found;
+}}
+function haystack(d) {{ return d.h || (d.h = (d.n + ' ' + d.sc + ' ' + d.p).toLowerCase()); }}
+function filterRows(rows, q) {{
+    const term = q.search.toLowerCase();
+    const source = (term && searchCandidates(rows, term)) || rows;
+    return source.filter(d => {{
+        if (q.activeCategory !== 'all' && (!d.c || d.c.toLowerCase() !== q.activeCategory)) return false;
+        if (q.hideZero && d.v <= 0) return false;
+        if (d.v < q.minPct || d.v > q.maxPct) return false;
+        if (term && !haystack(d).includes(term)) return false;
         return true;
     }});
-    state.currentPage = 1; sortData();
 }}
-function sortData() {{
-    const col = state.sortCol; const dir = state.sortDir === 'asc' ? 1 : -1;
-    state.filtered.sort((a, b) => {{
+const valueKey = col => d => typeof d[col] === 'string' ? d[col].toLowerCase() : d[col];
+function ascending(rows, col) {{
+    // rows in ascending col order, ties by row number; null for a rows payload.
+    // Sorted once per column: sortOrder() keeps the result as ranks
+    if (!rows.sorts) return null;
+    const keys = rows.map(valueKey(col)), order = rows.map((d, j) => j);
+    order.sort((a, b) => keys[a] < keys[b] ? -1 : keys[b] < keys[a] ? 1 : a - b);
+    return order.map(j => rows[j]);
+}}
+function mergeRuns(a, b, key) {{
+    const out = new Array(a.length + b.length);
+    let x = 0, y = 0, k = 0;
+    while (x < a.length && y < b.length) {{
+        const ka = key(a[x]), kb = key(b[y]);
+        out[k++] = ka < kb || (!(kb < ka) && a[x].i < b[y].i) ? a[x++] : b[y++];
+    }}
+    while (x < a.length) out[k++] = a[x++];
+    while (y < b.length) out[k++] = b[y++];
+    return out;
+}}
+function sortOrder(rows, col) {{
+    // Dense rank of every row for col (equal values share a rank), indexed
+    // by d.j (by d.i for merged shards); null for a rows payload
+    const cache = rows.parts ? rows.sortCache : rows.sorts && rows.sorts.cache;
+    if (!cache) return null;
+    if (cache[col]) return cache[col];
+    const key = valueKey(col);
+    let order;
+    if (rows.parts) {{
+        // Shards are sorted on their own; merging them gives the full order
+        const runs = rows.parts.map(part => ascending(part, col));
+        if (runs.some(run => !run)) return null;
+        while (runs.length > 1) runs.push(mergeRuns(runs.shift(), runs.shift(), key));
+        order = runs[0] || [];
+    }} else {{
+        order = ascending(rows, col);
+        if (!order) return null;
+    }}
+    const field = rows.parts ? 'i' : 'j', rank = new Int32Array(rows.length);
+    let groups = 0, prev;
+    order.forEach((d, k) => {{
+        const cur = key(d);
+        if (k === 0 || cur !== prev) groups++;
+        rank[d[field]] = groups - 1; prev = cur;
+    }});
+    return (cache[col] = {{ rank, groups, field }});
+}}
+function sortRows(rows, list, col, sortDir) {{
+    const dir = sortDir === 'asc' ? 1 : -1;
+    const order = sortOrder(rows, col);
+    if (order) {{
+        // Stable counting sort on the rank: the same order the comparator
+        // below gives, in one integer-keyed pass
+        const {{ rank, groups, field }} = order, key = d => dir === 1 ? rank[d[field]] : groups - 1 - rank[d[field]];
+        const start = new Int32Array(groups + 1), out = new Array(list.length);
+        for (const d of list) start[key(d) + 1]++;
+        for (let g = 1; g <= groups; g++) start[g] += start[g - 1];
+        for (const d of list) out[start[key(d)]++] = d;
+        return out;
+    }}
+    return list.sort((a, b) => {{
         let valA = a[col]; let valB = b[col];
         if (typeof valA === 'string') valA = valA.toLowerCase(); if (typeof valB === 'string') valB = valB.toLowerCase();
-        if (col === 'vp') {{ valA = a.vp; valB = b.vp; }}
         if (valA < valB) return -1 * dir; if (valA > valB) return 1 * dir; return 0;
     }});
+}}
+const engine = {{ rows: null, filterKey: null, sortKey: null, current: [], order: new Int32Array(0) }};
+function runQuery(q, page, size) {{
+    // A filter change re-sorts the matches from data order; a sort change
+    // re-sorts the current order, so ties keep the previous sort (as the
+    // old in-place Array.sort did)
+    const rows = dataset(q.dataset);
+    const filterKey = JSON.stringify([q.dataset, q.search, q.minPct, q.maxPct, q.activeCategory, q.hideZero]);
+    if (filterKey !== engine.filterKey || rows !== engine.rows) {{
+        engine.current = filterRows(rows, q); engine.rows = rows; engine.filterKey = filterKey; engine.sortKey = null;
+    }}
+    const sortKey = q.sortCol + ' ' + q.sortDir;
+    if (sortKey !== engine.sortKey) {{
+        engine.current = sortRows(rows, engine.current, q.sortCol, q.sortDir);
+        engine.order = Int32Array.from(engine.current, d => d.i);
+        engine.sortKey = sortKey;
+    }}
+    const total = engine.order.length;
+    const start = isFinite(size) ? Math.min(total, (page - 1) * size) : 0;
+    return {{ total, start, indices: engine.order.slice(start, Math.min(total, start + size)) }};
+}}
+</script>
+<script type="text/plain" id="queryWorker">
+let pending = null;
+self.onmessage = e => {{
+    if (e.data.payload !== undefined) {{ addDataset(e.data.name, decodePayload(JSON.parse(e.data.payload))); return; }}
+    // Only the newest query queued behind a busy run gets answered
+    const idle = pending === null;
+    pending = e.data;
+    if (idle) setTimeout(() => {{
+        const m = pending; pending = null;
+        const r = runQuery(m.query, m.page, m.size);
+        self.postMessage({{ id: m.id, ...r }}, [r.indices.buffer]);
+    }}, 0);
+}};
+</script>
+<script>
+// Rows by row number, for rendering; with shards, only the loaded ones
+const allData = [];
+// Category shard files (null: one payload); see plan_category_shards()
+const SHARDS = {shards_json};
+let state = {{ page: new Int32Array(0), total: 0, start: 0, currentPage: 1, rowsPerPage: 100, sortCol: 'v', sortDir: 'desc', search: '', minPct: 0, maxPct: 100, activeCategory: 'all', hideZero: true }};
+const tbody = document.getElementById('tableBody');
+const countEl = document.getElementById('visibleCount');
+const queries = {{ worker: null, sent: 0, dataset: null }};
+const loaded = {{}}, loading = {{}};
+function fetchText(url) {{ return fetch(url).then(r => {{ if (!r.ok) throw new Error(r.status); return r.text(); }}); }}
+function startEngine() {{
+    if (!window.Worker) return;
+    try {{
+        const source = document.getElementById('queryEngine').textContent + document.getElementById('queryWorker').textContent;
+        const worker = new Worker(URL.createObjectURL(new Blob([source], {{ type: 'text/javascript' }})));
+        worker.onmessage = e => showResult(e.data);
+        // Anything going wrong in the worker: answer on the main thread from now on
+        worker.onerror = () => {{
+            worker.terminate(); queries.worker = null;
+            for (const name in loaded) addDataset(name, loaded[name]);
+            refresh();
+        }};
+        queries.worker = worker;
+    }} catch (e) {{
+        queries.worker = null;
+    }}
+}}
+function loadDataset(name, text) {{
+    const rows = decodePayload(JSON.parse(text));
+    for (const d of rows) allData[d.i] = d;
+    loaded[name] = rows;
+    if (queries.worker) queries.worker.postMessage({{ name, payload: text }});
+    else addDataset(name, rows);
+}}
+function loadShard(name) {{
+    const url = name === 'summary' ? SHARDS.summary.url : SHARDS.shards[name];
+    if (!loading[name]) loading[name] = fetchText(url).then(text => loadDataset(name, text)).catch(e => {{ delete loading[name]; throw e; }});
+    return loading[name];
+}}
+function prefetchShards() {{
+    // Fetch the shards nobody asked for yet, one at a time, while the page is idle
+    const next = Object.keys(SHARDS.shards).find(name => !loading[name]);
+    if (!next) return;
+    const idle = window.requestIdleCallback || (fn => setTimeout(fn, 200));
+    idle(() => loadShard(next).then(prefetchShards, e => console.error(e)));
+}}
+function datasetFor(q, page, size) {{
+    // The dataset that can answer q, or null when it needs every shard
+    if (!SHARDS) return 'all';
+    if (q.activeCategory !== 'all') return q.activeCategory;
+    if (Object.keys(SHARDS.shards).every(name => loaded[name])) return 'all';
+    const defaultView = !q.search && q.minPct === 0 && q.maxPct === 100 && q.hideZero && q.sortCol === 'v' && q.sortDir === 'desc';
+    return defaultView && Math.min(page * size, SHARDS.summary.matches) <= SHARDS.summary.rows ? 'summary' : null;
+}}
+function refresh() {{
+    const msg = {{
+        id: ++queries.sent, page: state.currentPage, size: state.rowsPerPage,
+        query: {{ search: state.search, minPct: state.minPct, maxPct: state.maxPct, activeCategory: state.activeCategory, hideZero: state.hideZero, sortCol: state.sortCol, sortDir: state.sortDir }},
+    }};
+    const name = datasetFor(msg.query, msg.page, msg.size);
+    if (name === null || (name !== 'all' && !loaded[name])) {{
+        const id = msg.id;
+        showMessage('Loading deals...');
+        Promise.all(name ? [loadShard(name)] : Object.keys(SHARDS.shards).map(loadShard))
+            .then(() => {{ if (id === queries.sent) refresh(); }})
+            .catch(e => {{ console.error(e); if (id === queries.sent) showMessage('Could not load deals. Please refresh the page.'); }});
+        return;
+    }}
+    msg.query.dataset = queries.dataset = name;
+    if (queries.worker) {{ queries.worker.postMessage(msg); return; }}
+    showResult({{ id: msg.id, ...runQuery(msg.query, msg.page, msg.size) }});
+}}
+function showResult(r) {{
+    if (r.id !== queries.sent) return;  // stale: a newer query is already on its way
+    state.page = r.indices; state.start = r.start;
+    // The summary holds the first rows of the default view; the count is the full one
+    state.total = queries.dataset === 'summary' ? SHARDS.summary.matches : r.total;
     renderPage();
 }}
+function showMessage(text) {{
+    state.page = new Int32Array(0); state.start = 0; state.total = 0;
+    renderPage(text);
+}}
+function init() {{ setupListeners(); refresh(); if (SHARDS) prefetchShards(); }}
+function showFreshness() {{
+    // The page says when the data last changed; freshness.json when it was last scraped
+    fetch({json.dumps(FRESHNESS_FILE)}, {{ cache: 'no-cache' }}).then(r => r.ok ? r.json() : null)
+        .then(f => {{ if (f && f.scraped) document.getElementById('scrapeTime').textContent = 'Last updated: ' + f.scraped; }})
+        .catch(() => {{}});
+}}
+// ---- Windowed table ----
+// The current page (every match when Rows is "All") is laid out between two
+// spacer rows; only the rows near the viewport exist in the DOM, and those
+// <tr>s are reused as the page scrolls.
+const OVERSCAN_ROWS = 8;
+const view = {{ start: 0, end: 0, rowHeight: 0, rows: [], frame: 0, message: '' }};
+function spacerRow() {{ const tr = document.createElement('tr'); tr.className = 'spacer'; tr.appendChild(document.createElement('td')).colSpan = 7; return tr; }}
+const topSpacer = spacerRow(), bottomSpacer = spacerRow();
+const messageRow = document.createElement('tr');
+messageRow.className = 'message';
+messageRow.appendChild(document.createElement('td')).colSpan = 7;
+const rowTemplate = document.createElement('template');
+const CHANGE_LABELS = {{ 1: 'New', 2: 'New deal', 3: 'Price drop' }};
+rowTemplate.innerHTML = '<tr class="row"><td class="cell-id"></td><td><a class="product-link" target="_blank"></a><span class="change-badge" hidden></span></td><td class="price orig"></td>'
+    + '<td class="price sale"><span></span><span class="low-badge" title="Lowest price we have seen" hidden>lowest</span></td><td class="discount"></td>'
+    + '<td><span class="cat-tag"></span></td><td class="g-cell"><a target="_blank"><svg class="google-icon"><use href="#googleIcon"/></svg></a></td></tr>';
+function fillRow(tr, d, index) {{
+    if (tr._d === d && tr._index === index) return;
+    tr._d = d; tr._index = index;
+    const c = tr.cells;
+    tr.className = index % 2 ? 'row even' : 'row';
+    c[0].textContent = d.p;
+    const link = c[1].firstChild;
+    link.textContent = d.n;
+    if (d.l && d.l !== '#') link.href = d.l; else link.removeAttribute('href');
+    // Changes since the last scrape (add_changes)
+    const badge = c[1].lastChild;
+    badge.hidden = !d.ch;
+    if (d.ch) {{
+        badge.textContent = CHANGE_LABELS[d.ch];
+        badge.title = d.pp != null ? `Was $${{d.pp.toFixed(2)}} at the last scrape` : 'Since the last scrape';
+    }}
+    c[2].textContent = d.o;
+    c[3].firstChild.textContent = d.d;
+    c[3].lastChild.hidden = !(d.lo != null && d.v > 0 && d.vp <= d.lo);
+    if (d.lo != null) c[3].title = `All-time low $${{d.lo.toFixed(2)}}, 30-day low $${{(d.l30 ?? d.lo).toFixed(2)}}, on sale ${{d.ds}} day(s)`;
+    else c[3].removeAttribute('title');
+    c[4].textContent = d.v > 0 ? `${{Math.round(d.v)}}%` : '';
+    c[5].firstChild.textContent = d.sc;
+    c[6].firstChild.href = `https://www.google.com/search?q=${{encodeURIComponent(d.n)}}`;
+}}
+function renderWindow() {{
+    view.frame = 0;
+    if (topSpacer.parentNode !== tbody) {{ tbody.replaceChildren(topSpacer, bottomSpacer); }}
+    const count = view.end - view.start;
+    if (count === 0) {{
+        view.rows.forEach(tr => tr.remove());
+        topSpacer.firstChild.style.height = bottomSpacer.firstChild.style.height = '0px';
+        messageRow.firstChild.textContent = view.message || 'No deals found matching filters.';
+        tbody.insertBefore(messageRow, bottomSpacer);
+        return;
+    }}
+    messageRow.remove();
+    const h = view.rowHeight || 48;
+    const top = tbody.getBoundingClientRect().top;
+    const from = Math.min(Math.max(0, Math.floor(-top / h) - OVERSCAN_ROWS), count - 1);
+    const to = Math.min(count, from + Math.ceil(window.innerHeight / h) + 2 * OVERSCAN_ROWS);
+    while (view.rows.length < to - from) view.rows.push(rowTemplate.content.firstChild.cloneNode(true));
+    view.rows.forEach((tr, k) => {{
+        if (k >= to - from) {{ tr.remove(); return; }}
+        fillRow(tr, allData[state.page[from + k]], view.start + from + k);
+        if (tr.parentNode !== tbody) tbody.insertBefore(tr, bottomSpacer);
+    }});
+    if (!view.rowHeight) {{
+        // Spacers assume every row is as tall as the average of the first window
+        let total = 0;
+        for (let k = 0; k < to - from; k++) total += view.rows[k].offsetHeight;
+        view.rowHeight = Math.max(1, total / (to - from));
+        if (Math.abs(view.rowHeight - h) > 1) return renderWindow();
+    }}
+    topSpacer.firstChild.style.height = `${{from * h}}px`;
+    bottomSpacer.firstChild.style.height = `${{(count - to) * h}}px`;
+}}
+function scheduleWindow() {{ if (!view.frame) view.frame = requestAnimationFrame(renderWindow); }}
+function renderPage(message) {{
+    const total = state.total, size = state.rowsPerPage;
+    const maxPage = Math.ceil(total / size) || 1;
+    view.start = state.start;
+    view.end = state.start + state.page.length;
+    view.rowHeight = 0;
+    view.message = message;
+    renderWindow();
+    document.getElementById('pageInfo').innerText = `Page ${{state.currentPage}} of ${{maxPage}}`;
+    document.getElementById('btnPrev').disabled = state.currentPage === 1;
+    document.getElementById('btnNext').disabled = state.currentPage >= maxPage;
+    countEl.innerText = total;
+}}
 function setupListeners() {{
     const debounce = (fn, delay) => {{ let t; return (...args) => {{ clearTimeout(t); t = setTimeout(()=>fn(...args), delay); }}; }};
-    const runFilter = debounce(() => {{ applyFilters(); renderPage(); }}, 200);
+    const runFilter = debounce(() => {{ state.currentPage = 1; refresh(); }}, 200);
     document.getElementById('searchInput').addEventListener('input', e => {{ state.search = e.target.value; runFilter(); }});
     document.getElementById('minPct').addEventListener('input', e => {{ state.minPct = parseFloat(e.target.value) || 0; runFilter(); }});
     document.getElementById('maxPct').addEventListener('input', e => {{ state.maxPct = parseFloat(e.target.value) || 100; runFilter(); }});
-    document.getElementById('hideZero').addEventListener('change', e => {{ state.hideZero = e.target.checked; applyFilters(); renderPage(); }});
-    document.querySelectorAll('.cat-filter-btn, [data-cat="all"]').forEach(btn => {{ btn.addEventListener('click', (e) => {{ document.querySelectorAll('.cat-filter-btn, [data-cat="all"]').forEach(b => b.classList.remove('active')); e.currentTarget.classList.add('active'); state.activeCategory = e.currentTarget.getAttribute('data-cat'); applyFilters(); renderPage(); }}); }});
-    document.getElementById('resetBtn').addEventListener('click', () => {{ state.search = ''; state.minPct = 0; state.maxPct = 100; state.activeCategory = 'all'; state.hideZero = true; document.getElementById('searchInput').value = ''; document.getElementById('minPct').value = 0; document.getElementById('maxPct').value = 100; document.getElementById('hideZero').checked = true; document.querySelectorAll('.cat-filter-btn').forEach(b => b.classList.remove('active')); document.querySelector('[data-cat="all"]').classList.add('active'); applyFilters(); renderPage(); }});
-    document.querySelectorAll('th[data-sort]').forEach(th => {{ th.addEventListener('click', () => {{ const col = th.dataset.sort; if (state.sortCol === col) {{ state.sortDir = state.sortDir === 'asc' ? 'desc' : 'asc'; }} else {{ state.sortCol = col; state.sortDir = 'desc'; }} sortData(); }}); }});
-    document.getElementById('rowsPerPage').addEventListener('change', e => {{ state.rowsPerPage = parseInt(e.target.value); state.currentPage = 1; renderPage(); }});
-    document.getElementById('btnPrev').addEventListener('click', () => {{ if(state.currentPage > 1) {{ state.currentPage--; renderPage(); }} }});
-    document.getElementById('btnNext').addEventListener('click', () => {{ const max = Math.ceil(state.filtered.length / state.rowsPerPage); if(state.currentPage < max) {{ state.currentPage++; renderPage(); }} }});
+    document.getElementById('hideZero').addEventListener('change', e => {{ state.hideZero = e.target.checked; state.currentPage = 1; refresh(); }});
+    document.querySelectorAll('.cat-filter-btn, [data-cat="all"]').forEach(btn => {{ btn.addEventListener('click', (e) => {{ document.querySelectorAll('.cat-filter-btn, [data-cat="all"]').forEach(b => b.classList.remove('active')); e.currentTarget.classList.add('active'); state.activeCategory = e.currentTarget.getAttribute('data-cat'); state.currentPage = 1; refresh(); }}); }});
+    document.getElementById('resetBtn').addEventListener('click', () => {{ state.search = ''; state.minPct = 0; state.maxPct = 100; state.activeCategory = 'all'; state.hideZero = true; document.getElementById('searchInput').value = ''; document.getElementById('minPct').value = 0; document.getElementById('maxPct').value = 100; document.getElementById('hideZero').checked = true; document.querySelectorAll('.cat-filter-btn').forEach(b => b.classList.remove('active')); document.querySelector('[data-cat="all"]').classList.add('active'); state.currentPage = 1; refresh(); }});
+    document.querySelectorAll('th[data-sort]').forEach(th => {{ th.addEventListener('click', () => {{ const col = th.dataset.sort; if (state.sortCol === col) {{ state.sortDir = state.sortDir === 'asc' ? 'desc' : 'asc'; }} else {{ state.sortCol = col; state.sortDir = 'desc'; }} refresh(); }}); }});
+    document.getElementById('rowsPerPage').addEventListener('change', e => {{ state.rowsPerPage = e.target.value === 'all' ? Infinity : parseInt(e.target.value); state.currentPage = 1; refresh(); }});
+    window.addEventListener('scroll', scheduleWindow, {{ passive: true }});
+    window.addEventListener('resize', scheduleWindow);
+    document.getElementById('btnPrev').addEventListener('click', () => {{ if(state.currentPage > 1) {{ state.currentPage--; refresh(); }} }});
+    document.getElementById('btnNext').addEventListener('click', () => {{ const max = Math.ceil(state.total / state.rowsPerPage); if(state.currentPage < max) {{ state.currentPage++; refresh(); }} }});
     const toggleTheme = document.getElementById('toggleThemeBtn');
     function updateThemeIcon(isDark) {{ toggleTheme.textContent = isDark ? '🌙' : '☀️'; }}
     toggleTheme.addEventListener('click', () => {{ const isDark = document.documentElement.classList.toggle('dark'); localStorage.setItem('theme', isDark ? 'dark' : 'light'); updateThemeIcon(isDark); }});
@@ -440,13 +1636,113 @@ function setupListeners() {{
     document.getElementById('closeWhatsNewBtn').addEventListener('click', () => modal.style.display = 'none');
     modal.addEventListener('click', (e) => {{ if (e.target === modal) modal.style.display = 'none'; }});
 }}
-init();
+{boot_script}
 </script>
 </body>
 </html>
 """
 
-with open(OUT_HTML, "w", encoding="utf-8") as f:
-    f.write(html_content)
+@timed("encode_payload")
+def encode_payload(deals_payload, row_payload=False):
+    if row_payload: return json.dumps(deals_payload)
+    json_data = json.dumps(encode_columnar(deals_payload), separators=(",", ":"))
+    report_payload_size(deals_payload, json_data)
+    return json_data
+
+def main(rowwise=False, split_data=False, row_payload=False, shard_categories=False, records=None, stdlib=False,
+         rebuild=False, precompress=False):
+    """
+    Builds the page from IN_CSV (or its snapshot), or from `records`, the
+    rows SiteScraper.main(collect=True) returned, without reading them back.
+    stdlib=True (--no-pandas) builds the same payload without pandas.
+    Pieces whose inputs haven't changed are reused (see BuildCache);
+    rebuild=True (--rebuild) writes them all again. precompress=True
+    (--precompress) adds .gz/.br twins of the data files.
+    """
+    if shard_categories and row_payload:
+        sys.exit("--shard-categories needs the columnar payload; drop --row-payload")
+    if stdlib and rowwise:
+        sys.exit("--rowwise is the pandas reference builder; drop it or --no-pandas")
+    with REPORT.stage("generate.load"):
+        if stdlib:
+            rows = rows_from_records(records) if records is not None else load_rows_stdlib()
+        else:
+            df = frame_from_records(records) if records is not None else load_products()
+    with REPORT.stage("generate.payload"):
+        if stdlib:
+            deals_payload, unique_categories = build_deals_payload_stdlib(rows)
+            del rows
+        else:
+            builder = build_deals_payload_rowwise if rowwise else build_deals_payload
+            deals_payload, unique_categories = builder(df)
+            del df
+        # The rows as scraped date the page; history and badges change daily
+        rows_digest = _digest(json.dumps(deals_payload))
+    REPORT.counters["generate.rows"] = len(deals_payload)
+    REPORT.counters["generate.categories"] = len(unique_categories)
+    with REPORT.stage("generate.price_history"):
+        add_price_history(deals_payload)
+        add_changes(deals_payload)
+
+    with REPORT.stage("generate.inputs"):
+        scrape_time, whats_new_content = get_scrape_time(), load_whats_new()
+        cache = BuildCache(rebuild=rebuild)
+        inputs = cache.inputs(rows_digest, deals_payload, whats_new_content)
+        updated = cache.updated(inputs["rows"], scrape_time)
+    json_data = data_url = shards = None
+    if shard_categories or split_data:
+        with REPORT.stage("generate.data_files"):
+            # One piece per data file, keyed on the payload rows it holds
+            if shard_categories:
+                groups, shards = plan_category_shards(deals_payload)
+            else:
+                groups = {DATA_PREFIX: None}
+            settings = (inputs["encoder"], inputs["mappings"], row_payload, PAYLOAD_FORMAT,
+                        precompress and brotli is not None, precompress)
+            urls, files, rebuilt = {}, [], 0
+            for stem, ids in groups.items():
+                rows = inputs["payload"] if ids is None else _digest(json.dumps([ids, [deals_payload[i] for i in ids]]))
+                key = cache.key(*settings, rows)
+                piece = cache.reuse("data:" + stem, key)
+                if piece is None:
+                    json_data = encode_payload(deals_payload, row_payload) if ids is None else encode_shard(deals_payload, ids)
+                    url = write_data_files({stem: json_data}, precompress=precompress)[stem]
+                    piece = cache.store("data:" + stem, key, data_file_paths([url], precompress=precompress), url=url)
+                    rebuilt += 1
+                urls[stem] = piece["url"]
+                files.extend(piece["files"])
+            cache.forget("data:", groups)
+            remove_old_data_files(files)
+            print(f"Data files: {rebuilt} written, {len(groups) - rebuilt} unchanged and kept.")
+            if shard_categories:
+                shards["summary"]["url"] = urls[shards["summary"]["url"]]
+                shards["shards"] = {category: urls[stem] for category, stem in shards["shards"].items()}
+            else:
+                data_url = urls[DATA_PREFIX]
+            REPORT.output(*files)
+
+    with REPORT.stage("generate.shell"):
+        category_filters_html = generate_category_filters_html(list(unique_categories))
+        inline_rows = inputs["payload"] if data_url is None and shards is None else None
+        key = cache.key(inputs["template"], inputs["whatsnew"], inputs["mappings"], inline_rows, row_payload,
+                        category_filters_html, data_url, shards, updated)
+        if cache.reuse("shell", key) is None:
+            if inline_rows is not None:
+                json_data = encode_payload(deals_payload, row_payload)
+            html_content = render_html(json_data, category_filters_html, updated, whats_new_content, data_url, shards)
+            with open(OUT_HTML, "w", encoding="utf-8") as f:
+                f.write(html_content)
+            cache.store("shell", key, [OUT_HTML])
+            print(f"✅ Generated {OUT_HTML} successfully.")
+        else:
+            print(f"✅ {OUT_HTML} is up to date.")
+        write_freshness(scrape_time, updated)
+        cache.save()
+    REPORT.output(OUT_HTML, os.path.join(os.path.dirname(OUT_HTML), FRESHNESS_FILE), BUILD_CACHE_FILE)
 
-print(f"✅ Generated {OUT_HTML} successfully.")
+if __name__ == "__main__":
+    run(lambda: main(rowwise="--rowwise" in sys.argv[1:], split_data="--split-data" in sys.argv[1:],
+                     row_payload="--row-payload" in sys.argv[1:], shard_categories="--shard-categories" in sys.argv[1:],
+                     stdlib="--no-pandas" in sys.argv[1:], rebuild="--rebuild" in sys.argv[1:],
+                     precompress="--precompress" in sys.argv[1:]),
+        report="--report" in sys.argv[1:], profile="--profile" in sys.argv[1:])
@@ -1,16 +1,79 @@
 import requests
-import pandas as pd
 import time
 import json
 import ast
-from bs4 import BeautifulSoup
+import csv
+import io
+import os
+import re
+import html
+import hashlib
+import sys
+import random
+import threading
+from bisect import bisect_right
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from email.utils import parsedate_to_datetime
+from html.entities import html5 as html5_entities
+from requests.adapters import HTTPAdapter
+from snapshot import SNAPSHOT_FILE, SnapshotWriter, snapshot_from_csv, available as snapshot_available
+from price_history import HISTORY_DB, RETENTION_DAYS, PriceHistory
+from run_report import REPORT, run, timed
+from snapshot_diff import DELTA_FILE, FEED_JSON, FEED_RSS, keep_previous, run_diff
 
 # --- CONFIGURATION ---
-API_URL = "https://aucs34.ksearchnet.com/cs/v2/search" 
-TOTAL_PRODUCTS_TO_FETCH = 20000
+# Environment overrides let the benchmark point the scraper at klevu_mock.py
+API_URL = os.environ.get("SCRAPER_API_URL", "https://aucs34.ksearchnet.com/cs/v2/search")
+TOTAL_PRODUCTS_TO_FETCH = int(os.environ.get("SCRAPER_TOTAL_PRODUCTS", 20000))
 BATCH_SIZE = 2000 
 API_KEY = "klevu-173190000117617559"
-OUT_CSV = "briscoes_products_clean.csv"
+OUT_CSV = os.environ.get("SCRAPER_OUT_CSV", "briscoes_products_clean.csv")
+
+# Fetch tuning: CONCURRENCY = 1 is the old one-page-at-a-time behaviour.
+CONCURRENCY = int(os.environ.get("SCRAPER_CONCURRENCY", 4))  # Max Klevu requests in flight at once
+REQUESTS_PER_SECOND = float(os.environ.get("SCRAPER_REQUESTS_PER_SECOND", 2.0))  # Token-bucket rate shared by all workers
+RATE_BURST = 4             # Requests allowed back-to-back before the rate kicks in
+REQUEST_TIMEOUT = 60       # Seconds
+
+# Retry / adaptive sizing (AIMD): shrink on throttling, grow back when healthy.
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0         # Seconds; doubled per attempt, full jitter
+BACKOFF_CAP = 60.0
+MIN_BATCH_SIZE = 250       # Pages never shrink below this
+BATCH_STEP = 250           # Additive growth per healthy window
+SLOW_RESPONSE_SECS = 20    # A page slower than this counts as congestion
+DECREASE_COOLDOWN = 2.0    # Seconds between successive multiplicative decreases
+FAILED_OFFSETS_FILE = "scrape_failed_offsets.json"
+CHECKPOINT_FILE = OUT_CSV + ".checkpoint.json"  # Resume point while a scrape is running
+
+# Sharding: the catalogue is split into filtered queries (top-level categories,
+# or price bands when the category counts overlap or miss products), each sized
+# from Klevu's reported totals to stay under SHARD_MAX_PRODUCTS, so no query
+# pages deep and nothing is cut off. SCRAPER_SHARD_BY=off is the old single "*"
+# query capped at TOTAL_PRODUCTS_TO_FETCH.
+SHARD_BY = os.environ.get("SCRAPER_SHARD_BY", "category")   # category | price | off
+SHARD_MAX_PRODUCTS = int(os.environ.get("SCRAPER_SHARD_MAX", 10000))  # Deepest offset any shard pages to
+SHARD_HEADROOM = 0.02          # Spare offsets per shard for products added after it was sized
+SHARD_OVERLAP_TOLERANCE = 0.05 # Category counts may add up to this much over the total
+PRICE_CEILING_CENTS = 10_000_000  # Top of the price range when Klevu reports no max
+SHARD_PLAN_FILE = "scrape_shards.json"  # Plan of the last scrape, for --resume and --retry-failed
+
+# Ordering: RELEVANCE can reshuffle between requests, so offset pages overlap
+# and skip products. --stable-sort pages in STABLE_SORT instead; the dedup
+# stage drops whatever still repeats, and the report counts what went missing.
+SORT_ORDER = os.environ.get("SCRAPER_SORT", "RELEVANCE")
+STABLE_SORT = "NAME_ASC"
+
+# Field profile (see FIELD_PROFILES): "full" is every field and column, "site"
+# only what SiteGen, the price history and the diff read.
+FIELD_PROFILE = os.environ.get("SCRAPER_FIELDS", "full")
+
+# Descriptions: SCRAPER_SKIP_DESCRIPTIONS=1 drops them (and stops requesting "desc");
+# SCRAPER_DESC_CACHE=desc_cache.json keeps cleaned text between runs.
+SKIP_DESCRIPTIONS = os.environ.get("SCRAPER_SKIP_DESCRIPTIONS", "") == "1"
+DESC_CACHE_FILE = os.environ.get("SCRAPER_DESC_CACHE") or None
+RICH_DATA_CACHE_SIZE = 50000  # Decoded additionalDataToReturn payloads kept per run
 
 headers = {
     "Content-Type": "application/json",
@@ -18,19 +81,20 @@ headers = {
 }
 
 # --- 1. ROBUST PARSER ---
+@timed("parse_rich_data")
 def parse_rich_data(raw_data):
     """
     Aggressively tries to turn the string data into a Python list/dict.
     """
     if not raw_data: return []
-    
+
     # Clean up common string issues before parsing
     if isinstance(raw_data, str):
         # Remove escape characters that might confuse the parser if double encoded
         clean_str = raw_data.replace('\\"', '"').replace('\\/', '/')
         if clean_str.startswith('"') and clean_str.endswith('"'):
             clean_str = clean_str[1:-1]
-            
+
         try:
             return json.loads(clean_str)
         except:
@@ -40,15 +104,198 @@ def parse_rich_data(raw_data):
                 return []
     return raw_data
 
+# Python-repr tokens that differ from JSON: quoted strings and the three constants
+PY_LITERAL_RE = re.compile(r"'[^']*'|\b(?:True|False|None)\b")
+PY_TO_JSON = {"True": "true", "False": "false", "None": "null"}
+
+def _py_token_to_json(m):
+    token = m.group(0)
+    return f'"{token[1:-1]}"' if token[0] == "'" else PY_TO_JSON[token]
+
+def literal_to_json(text):
+    """
+    Rewrites a Python repr as JSON when that is exact: with no '"' or '\\'
+    present, every string is a plain '...' run, so swapping the quotes and
+    constants cannot change a value. Returns None otherwise.
+    """
+    if '"' in text or "\\" in text: return None
+    return PY_LITERAL_RE.sub(_py_token_to_json, text)
+
+class RichDataDecoder:
+    r"""
+    Single-pass decoder for additionalDataToReturn.
+
+    Works out which of the forms Klevu sends we have from the first few
+    characters, then decodes it once:
+      json     [{"sku": ...}]              -> json.loads
+      double   "[{\"sku\": ...}]"          -> json.loads twice
+      escaped  [{\"sku\": ...}]            -> unescape as a JSON string, then json.loads
+      python   [{'sku': ...}]              -> quote swap + json.loads, else ast.literal_eval
+    Anything that doesn't decode cleanly goes through parse_rich_data() so
+    nothing the old parser accepted is lost. Results are cached by the raw
+    string (callers must not mutate them) and every outcome is counted.
+    """
+    FORMS = ("json", "double", "escaped", "python")
+
+    def __init__(self, cache_size=RICH_DATA_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.cache = {}
+        self.stats = {form: 0 for form in self.FORMS + ("cached", "fallback", "empty")}
+
+    @staticmethod
+    def detect(text):
+        text = text.lstrip()
+        if text.startswith('"'): return "double"
+        dq, sq = text.find('"'), text.find("'")
+        if dq == -1 and sq == -1:
+            return "python" if PY_LITERAL_RE.search(text) else "json"
+        if sq != -1 and (dq == -1 or sq < dq): return "python"
+        if dq > 0 and text[dq - 1] == "\\": return "escaped"
+        return "json"
+
+    @timed("RichDataDecoder.decode")
+    def decode(self, raw_data):
+        if not raw_data:
+            self.stats["empty"] += 1
+            return []
+        if not isinstance(raw_data, str): return raw_data
+
+        result = self.cache.get(raw_data)
+        if result is not None:
+            self.stats["cached"] += 1
+            return result
+
+        form = self.detect(raw_data)
+        try:
+            if form == "json":
+                result = json.loads(raw_data)
+            elif form == "double":
+                result = json.loads(raw_data)
+                if isinstance(result, str): result = json.loads(result)
+            elif form == "escaped":
+                result = json.loads(json.loads(f'"{raw_data}"'))
+            else:
+                as_json = literal_to_json(raw_data)
+                try:
+                    result = json.loads(as_json) if as_json is not None else ast.literal_eval(raw_data.strip())
+                except ValueError:
+                    # e.g. tuples or non-string keys; literal_eval is the authority
+                    result = ast.literal_eval(raw_data.strip())
+            self.stats[form] += 1
+        except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+            result = parse_rich_data(raw_data)
+            self.stats["fallback"] += 1
+
+        if self.cache_size:
+            if len(self.cache) >= self.cache_size:
+                # Drop the oldest entry; dicts keep insertion order
+                del self.cache[next(iter(self.cache))]
+            self.cache[raw_data] = result
+        return result
+
+    def summary(self):
+        return "Rich data: " + ", ".join(f"{k} {v}" for k, v in self.stats.items())
+
 # --- 2. HTML CLEANER ---
+@timed("clean_html")
 def clean_html(html_text):
     if not html_text or not isinstance(html_text, str): return ""
+    from bs4 import BeautifulSoup  # Imported on first use; most descriptions never need it
     try:
         return BeautifulSoup(html_text, "html.parser").get_text(separator=" ", strip=True)
     except:
         return html_text
 
+# A plain start/end tag whose attributes (quoted or not) can't hide a stray '<'
+SIMPLE_TAG_RE = re.compile(
+    r"""</?[A-Za-z][A-Za-z0-9:-]*(?:\s+[^\s"'<>/=]+(?:\s*=\s*(?:"[^"]*"|'[^']*'|[^\s"'<>=`]+))?)*\s*/?>""")
+# Anything html.parser treats specially: raw-text elements, comments, doctypes, PIs
+COMPLEX_MARKUP_RE = re.compile(r"<(?:script|style|textarea|title|xmp|plaintext|!|\?)", re.IGNORECASE)
+ENTITY_RE = re.compile(r"&(#[0-9]+;|#[xX][0-9a-fA-F]+;|[A-Za-z][A-Za-z0-9]*;)?")
+# BeautifulSoup swallows the end tag of an already closed void element
+# without splitting the text around it ("<br>a</br>b" -> "ab")
+VOID_END_TAG_RE = re.compile(r"</(?:area|base|br|col|embed|hr|img|input|link|meta|param|source|track|wbr)\b",
+                             re.IGNORECASE)
+# Text the two paths have been seen to strip differently
+UNSAFE_TEXT_RE = re.compile("[\t\u200b]")
+
+def fast_strip_html(html_text):
+    """
+    Regex tag stripper that matches clean_html() exactly for simple markup
+    (bench_descriptions.py checks this). Returns None when the markup needs
+    a real parser.
+    """
+    if COMPLEX_MARKUP_RE.search(html_text) or VOID_END_TAG_RE.search(html_text): return None
+    if "&" in html_text:
+        # html.parser guesses differently from unescape() at bare '&' and unknown names
+        for m in ENTITY_RE.finditer(html_text):
+            ref = m.group(1)
+            if not ref or (ref[0] != "#" and ref not in html5_entities): return None
+    parts = SIMPLE_TAG_RE.split(html_text)
+    if any("<" in part for part in parts): return None
+    texts = [html.unescape(part) for part in parts]
+    if any(UNSAFE_TEXT_RE.search(t) for t in texts): return None
+    return " ".join(t for t in map(str.strip, texts) if t)
+
+class DescriptionCleaner:
+    """
+    Turns product 'desc' HTML into plain text, parsing each distinct
+    description once. Configurable products repeat the same desc for every
+    variant, so most calls are cache hits.
+
+    - Results are keyed by a content hash, so raw HTML is not kept around.
+    - Simple markup goes through fast_strip_html(); BeautifulSoup is only
+      used when that declines.
+    - With a cache_file the cache is loaded at start and saved at the end
+      (trimmed to the descriptions seen this run).
+    - skip=True turns every description into "".
+    """
+    def __init__(self, cache_file=None, skip=False):
+        self.skip = skip
+        self.cache_file = cache_file
+        self.cache = {}
+        self.used = set()
+        self.stats = {"hits": 0, "fast": 0, "parsed": 0}
+        if cache_file and os.path.exists(cache_file):
+            try:
+                with open(cache_file, "r", encoding="utf-8") as f:
+                    self.cache = {bytes.fromhex(k): v for k, v in json.load(f).items()}
+            except (ValueError, OSError) as e:
+                print(f"Ignoring unreadable description cache {cache_file}: {e}")
+
+    @timed("DescriptionCleaner.clean")
+    def clean(self, html_text):
+        if self.skip or not html_text or not isinstance(html_text, str): return ""
+        key = hashlib.blake2b(html_text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        self.used.add(key)
+        text = self.cache.get(key)
+        if text is not None:
+            self.stats["hits"] += 1
+            return text
+        text = fast_strip_html(html_text)
+        if text is None:
+            text = clean_html(html_text)
+            self.stats["parsed"] += 1
+        else:
+            self.stats["fast"] += 1
+        self.cache[key] = text
+        return text
+
+    def save(self):
+        if not self.cache_file or self.skip: return
+        tmp = self.cache_file + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({k.hex(): v for k, v in self.cache.items() if k in self.used}, f)
+        os.replace(tmp, self.cache_file)
+
+    def summary(self):
+        s = self.stats
+        if self.skip: return "Descriptions skipped"
+        return (f"Descriptions: {s['hits'] + s['fast'] + s['parsed']} cleaned, {s['hits']} cache hits, "
+                f"{s['fast']} fast-path, {s['parsed']} parsed with BeautifulSoup")
+
 # --- 3. THE "FORCE FIX" PRICE EXTRACTOR ---
+@timed("extract_true_prices")
 def extract_true_prices(item, rich_data_list):
     """
     Prioritizes the hidden 'additionalData' for pricing.
@@ -56,29 +303,29 @@ def extract_true_prices(item, rich_data_list):
     # Default to top-level (The "Bad" Data)
     orig = item.get("price")
     sale = item.get("salePrice")
-    
+
     # Try to find the "Good" Data in the rich list
     if rich_data_list and isinstance(rich_data_list, list):
         # Usually the first item in this list corresponds to the main product
         rich_item = rich_data_list[0]
-        
+
         if isinstance(rich_item, dict):
             # Klevu often stores the REAL original price in 'price' inside this hidden block
             hidden_price = rich_item.get("price")
             hidden_special = rich_item.get("special_price")
-            
+
             # If we found a hidden price that is higher than the sale price, use it!
             if hidden_price:
                 # Convert to float to compare safely
                 try:
                     hp = float(hidden_price)
                     hs = float(hidden_special) if hidden_special else 0
-                    
+
                     if hp > 0:
                         orig = hidden_price # Found the $199.99!
                     if hs > 0:
                         sale = hidden_special # Found the $49.00!
-                        
+
                 except (ValueError, TypeError):
                     pass # Keep defaults if conversion fails
 
@@ -86,113 +333,869 @@ def extract_true_prices(item, rich_data_list):
     # it might not be on sale, or data is missing.
     return orig, sale
 
-# --- MAIN SCRIPT ---
-base_payload = {
-    "context": {"apiKeys": [API_KEY]},
-    "recordQueries": [{
-        "id": "productList",
-        "typeOfRequest": "SEARCH",
-        "settings": {
-            "query": {"term": "*"},
-            "limit": BATCH_SIZE,
-            "typeOfRecords": ["KLEVU_PRODUCT"],
-            "offset": 0,
-            "searchPrefs": ["searchCompoundsAsAndQuery", "hideOutOfStockProducts"],
-            "sort": "RELEVANCE",
-            "fields": [
-                "displayTitle", "name", "price", "salePrice", "url", "category", 
-                "productplu", "sku", "type_id", "additionalDataToReturn", "stock_status", "desc"
-            ]
-        }
-    }]
-}
+# --- 4. RATE LIMITER ---
+class TokenBucket:
+    """
+    Thread-safe token bucket. Each request takes one token; tokens refill at
+    `rate` per second up to `capacity`. Replaces the old fixed 0.5s sleep.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
 
-clean_data = []
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
 
-print(f"Starting scrape...")
+# --- 5. FETCHING ---
+PageResult = namedtuple("PageResult", "offset limit records status retry_after elapsed error")
 
-for offset in range(0, TOTAL_PRODUCTS_TO_FETCH, BATCH_SIZE):
-    print(f"Fetching records {offset} to {offset + BATCH_SIZE}...")
-    base_payload["recordQueries"][0]["settings"]["offset"] = offset
-    
+def make_session():
+    """
+    One keep-alive session for the whole run, with a connection pool big
+    enough for every worker so nothing re-handshakes TLS per page.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, CONCURRENCY))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(headers)
+    return session
+
+def build_payload(offset, limit, filters=None, facets=False, sort=SORT_ORDER, fields=None):
+    # Built fresh per request so worker threads never share a mutable payload
+    payload = {
+        "context": {"apiKeys": [API_KEY]},
+        "recordQueries": [{
+            "id": "productList",
+            "typeOfRequest": "SEARCH",
+            "settings": {
+                "query": {"term": "*"},
+                "limit": limit,
+                "typeOfRecords": ["KLEVU_PRODUCT"],
+                "offset": offset,
+                "searchPrefs": ["searchCompoundsAsAndQuery", "hideOutOfStockProducts"],
+                "sort": sort,
+                "fields": request_fields(fields or FIELD_PROFILE)
+            }
+        }]
+    }
+    settings = payload["recordQueries"][0]["settings"]
+    if filters or facets:
+        settings["filters"] = {}
+    if filters:
+        settings["filters"]["applyFilters"] = {"filters": filters}
+    if facets:
+        settings["filters"]["filtersToReturn"] = {
+            "enabled": True, "options": {"limit": 500},
+            "rangeFilterSettings": [{"key": "klevu_price", "minMax": "true"}],
+        }
+    return payload
+
+def parse_retry_after(value):
+    """
+    Retry-After is either a number of seconds or an HTTP date.
+    """
+    if not value: return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+        return max(0.0, when.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def fetch_batch(session, bucket, offset, limit, filters=None, query_offset=None, sort=SORT_ORDER, fields=None):
+    """
+    Fetches one page. Never raises: failures come back as a PageResult with
+    records = None so the scheduler can decide whether to retry. Every
+    attempt is logged to the run report. A shard's page is `limit` records
+    from `query_offset` of its filtered query; `offset` is where that sits
+    in the plan.
+    """
+    bucket.acquire()
+    started = time.monotonic()
     try:
-        response = requests.post(API_URL, json=base_payload, headers=headers)
-        if response.status_code != 200: break
+        payload = build_payload(offset if query_offset is None else query_offset, limit, filters, sort=sort, fields=fields)
+        response = session.post(API_URL, json=payload, timeout=REQUEST_TIMEOUT)
+    except Exception as e:
+        REPORT.request(offset, limit, None, time.monotonic() - started, None, None, str(e))
+        return PageResult(offset, limit, None, None, None, time.monotonic() - started, str(e))
 
+    elapsed = time.monotonic() - started
+    size = len(response.content)
+    if response.status_code != 200:
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        REPORT.request(offset, limit, response.status_code, elapsed, size, None, f"HTTP {response.status_code}")
+        return PageResult(offset, limit, None, response.status_code, retry_after, elapsed, f"HTTP {response.status_code}")
+    try:
         data = response.json()
         records = data.get("queryResults", [{}])[0].get("records", [])
-        
-        if not records: break
-        
-        for item in records:
-            try:
-                # 1. Aggressively parse the hidden data
-                raw_rich = item.get("additionalDataToReturn")
-                rich_data_list = parse_rich_data(raw_rich)
-                
-                # 2. Get the TRUE prices
-                orig_price, sale_price = extract_true_prices(item, rich_data_list)
-
-                # DEBUG PRINT for the specific Air Fryer to prove it works
-                if "1116839" in str(item.get("sku")):
-                    print(f"!!! DEBUG ZIP AIR FRYER !!! Found Orig: {orig_price}, Sale: {sale_price}")
-
-                # 3. Handle Variants vs Simple
-                is_configurable = item.get("type_id") == "configurable"
-                
-                if is_configurable and rich_data_list:
-                    # Explode variants
-                    for variant in rich_data_list:
-                        if not isinstance(variant, dict): continue
-                        
-                        # Variant specific prices
-                        v_orig = variant.get("price", orig_price)
-                        v_sale = variant.get("special_price", sale_price)
-
-                        # Variant Title
-                        opts = []
-                        if variant.get("color"): opts.append(variant.get("color").strip())
-                        if variant.get("size"): opts.append(variant.get("size").strip())
-                        suffix = f" - ({', '.join(opts)})" if opts else ""
-
-                        clean_data.append({
-                            "Title": item.get("name") + suffix,
-                            "Original Price": v_orig,
-                            "Sale Price": v_sale,
-                            "Category": item.get("category"),
-                            "Product ID": variant.get("sku"),
-                            "Link": item.get("url"),
-                            "Description": clean_html(item.get("desc")),
-                            "Stock Status": "In Stock"
-                        })
-                else:
-                    # Simple Product
-                    clean_data.append({
-                        "Title": item.get("name"),
-                        "Original Price": orig_price,
-                        "Sale Price": sale_price,
-                        "Category": item.get("category"),
-                        "Product ID": item.get("sku"),
-                        "Link": item.get("url"),
-                        "Description": clean_html(item.get("desc")),
-                        "Stock Status": item.get("stock_status")
-                    })
+    except Exception as e:
+        REPORT.request(offset, limit, 200, elapsed, size, None, f"Bad JSON: {e}")
+        return PageResult(offset, limit, None, 200, None, elapsed, f"Bad JSON: {e}")
+    REPORT.request(offset, limit, 200, elapsed, size, len(records))
+    return PageResult(offset, limit, records, 200, None, elapsed, None)
+
+class FetchScheduler:
+    """
+    Hands out (offset, limit) ranges and adapts to how Klevu is coping.
+
+    - Failed ranges are retried with jittered exponential backoff, waiting at
+      least as long as any Retry-After header asks.
+    - Page size and parallelism follow AIMD: halve on 429/5xx, timeouts or
+      slow pages, creep back up by one step per healthy window.
+    - Ranges that are still failing after MAX_RETRIES land in `failed`.
+    - `ends` are the shard boundaries: no range crosses one, and an empty
+      page only ends its own shard.
+    """
+    def __init__(self, total=TOTAL_PRODUCTS_TO_FETCH, ranges=None, start=0, ends=None):
+        self.batch_size = BATCH_SIZE
+        self.concurrency = max(1, CONCURRENCY)
+        self.pending = []   # [offset, limit, attempt, not_before]
+        self.failed = []
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.healthy_streak = 0
+        if ranges is None:
+            self.frontier, self.end = start, total
+        else:
+            self.pending = [[o, l, 0, 0.0] for o, l in sorted(ranges)]
+            self.frontier = self.end = max((o + l for o, l in ranges), default=0)
+        self.ends = sorted(set(ends or []))
+
+    def region_end(self, offset):
+        """End of the shard holding `offset` (the catalogue end if unsharded)."""
+        i = bisect_right(self.ends, offset)
+        return min(self.ends[i], self.end) if i < len(self.ends) else self.end
+
+    # -- Planning --
+    def has_work(self):
+        return bool(self.pending) or self.frontier < self.end
+
+    def low_water_mark(self, in_flight_offsets):
+        """
+        Lowest offset that is still unsettled (queued, in flight or unplanned).
+        """
+        marks = [p[0] for p in self.pending] + list(in_flight_offsets)
+        if self.frontier < self.end: marks.append(self.frontier)
+        return min(marks, default=self.end)
+
+    def next_range(self, now):
+        """
+        Returns the lowest ready (offset, limit, attempt), or None with the
+        number of seconds until something becomes ready.
+        """
+        if now < self.paused_until:
+            return None, self.paused_until - now
+        ready = [p for p in self.pending if p[3] <= now]
+        if ready:
+            item = min(ready, key=lambda p: p[0])
+            self.pending.remove(item)
+            return (item[0], item[1], item[2]), 0.0
+        if self.frontier < self.end:
+            offset = self.frontier
+            limit = min(self.batch_size, self.region_end(offset) - offset)
+            self.frontier += limit
+            return (offset, limit, 0), 0.0
+        if self.pending:
+            return None, min(p[3] for p in self.pending) - now
+        return None, None
+
+    # -- Feedback --
+    def on_success(self, result):
+        if not result.records:
+            # Empty page: the shard (or, unsharded, the catalogue) ends here
+            cut = self.region_end(result.offset)
+            self.pending = [p for p in self.pending if not result.offset <= p[0] < cut]
+            if result.offset <= self.frontier < cut:
+                self.frontier = cut
+            if cut >= self.end:
+                self.end = min(self.end, result.offset)
+                self.frontier = min(self.frontier, self.end)
+
+        if result.elapsed > SLOW_RESPONSE_SECS:
+            self.decrease(f"slow page ({result.elapsed:.1f}s)")
+            return
+        self.healthy_streak += 1
+        if self.healthy_streak >= self.concurrency:
+            self.healthy_streak = 0
+            self.concurrency = min(max(1, CONCURRENCY), self.concurrency + 1)
+            self.batch_size = min(BATCH_SIZE, self.batch_size + BATCH_STEP)
+
+    def on_failure(self, result, attempt):
+        now = time.monotonic()
+        throttled = result.status is None or result.status == 429 or result.status >= 500
+        if throttled:
+            self.decrease(result.error)
+        if result.retry_after is not None:
+            self.paused_until = max(self.paused_until, now + result.retry_after)
+
+        if attempt >= MAX_RETRIES:
+            print(f"Giving up on records {result.offset} to {result.offset + result.limit}: {result.error}")
+            self.failed.append((result.offset, result.limit))
+            return
+
+        delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)))
+        if result.retry_after is not None:
+            delay = max(delay, result.retry_after)
+        print(f"Retrying records {result.offset} to {result.offset + result.limit} in {delay:.1f}s ({result.error})")
+
+        # Re-queue in pieces no bigger than the (possibly shrunk) page size
+        for offset in range(result.offset, result.offset + result.limit, self.batch_size):
+            limit = min(self.batch_size, result.offset + result.limit - offset)
+            self.pending.append([offset, limit, attempt + 1, now + delay])
+
+    def decrease(self, reason):
+        self.healthy_streak = 0
+        now = time.monotonic()
+        # Pages already in flight fail together; only back off once per burst
+        if now - self.last_decrease < DECREASE_COOLDOWN: return
+        self.last_decrease = now
+        self.concurrency = max(1, self.concurrency // 2)
+        self.batch_size = max(MIN_BATCH_SIZE, self.batch_size // 2)
+        print(f"Backing off ({reason}): concurrency {self.concurrency}, batch size {self.batch_size}")
+
+def fetch_pages(session, scheduler, plan=None, bucket=None):
+    """
+    Yields non-empty PageResults in offset order while the scheduler keeps a
+    bounded, adaptive number of requests in flight. Pages that complete early
+    wait in a reorder buffer until every lower offset has settled, so row
+    ordering matches a serial scrape. Ranges that finally fail are skipped
+    and left in scheduler.failed. Offsets are the plan's: workers pull pages
+    from every shard at once.
+    """
+    plan = plan or ShardPlan.single()
+    bucket = bucket or TokenBucket(REQUESTS_PER_SECOND, RATE_BURST)
+    in_flight = {}   # future -> (offset, attempt)
+    done = {}        # offset -> PageResult
+    with ThreadPoolExecutor(max_workers=max(1, CONCURRENCY)) as pool:
+        while scheduler.has_work() or in_flight:
+            wait_for = None
+            while len(in_flight) < scheduler.concurrency:
+                item, delay = scheduler.next_range(time.monotonic())
+                if item is None:
+                    wait_for = delay
+                    break
+                offset, limit, attempt = item
+                shard, query_offset = plan.locate(offset)
+                of_shard = f" of {shard['label']}" if plan.sharded else ""
+                print(f"Fetching records {query_offset} to {query_offset + limit}{of_shard}...")
+                future = pool.submit(fetch_batch, session, bucket, offset, limit, shard["filters"], query_offset,
+                                     plan.sort, plan.fields)
+                in_flight[future] = (offset, attempt)
+
+            if in_flight:
+                finished, _ = wait(in_flight, timeout=wait_for, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    offset, attempt = in_flight.pop(future)
+                    result = future.result()
+                    if result.records is None:
+                        scheduler.on_failure(result, attempt)
+                    else:
+                        scheduler.on_success(result)
+                        done[offset] = result
+            elif wait_for:
+                time.sleep(wait_for)
+
+            settled = scheduler.low_water_mark(o for o, _ in in_flight.values())
+            for offset in sorted(o for o in done if o < settled):
+                page = done.pop(offset)
+                if page.records: yield page
+
+        for offset in sorted(done):
+            if done[offset].records: yield done[offset]
 
+def save_failed_ranges(failed):
+    """
+    Writes the ranges that never succeeded so a follow-up run with
+    --retry-failed re-fetches only those. Clears the file on a clean run.
+    """
+    if failed:
+        with open(FAILED_OFFSETS_FILE, "w", encoding="utf-8") as f:
+            json.dump([{"offset": o, "limit": l} for o, l in sorted(failed)], f, indent=2)
+        print(f"⚠️ {len(failed)} range(s) failed, offsets: {', '.join(str(o) for o, _ in sorted(failed))}")
+        print(f"   Saved to {FAILED_OFFSETS_FILE}; re-run with --retry-failed to fetch just those.")
+    elif os.path.exists(FAILED_OFFSETS_FILE):
+        os.remove(FAILED_OFFSETS_FILE)
+
+def load_failed_ranges():
+    with open(FAILED_OFFSETS_FILE, "r", encoding="utf-8") as f:
+        return [(r["offset"], r["limit"]) for r in json.load(f)]
+
+# --- 5b. SHARD PLANNING ---
+class ShardPlan:
+    """
+    The shards of one scrape laid end to end in a single offset space: shard
+    i owns offsets [base, base + size). The scheduler, reorder buffer,
+    checkpoint and failed-range file all work in these offsets, so a sharded
+    scrape runs, resumes and retries like one long query; locate() maps an
+    offset back to its shard and the offset within that shard's query.
+    Every shard is paged in the same `sort` order with the same `fields`
+    profile, so a resumed run matches the rows already written.
+    """
+    def __init__(self, shards, total=None, sort=SORT_ORDER, fields=FIELD_PROFILE):
+        self.total = total   # Products Klevu reported for the whole catalogue
+        self.sort = sort
+        self.fields = fields
+        self.shards = []
+        base = 0
+        for shard in shards:
+            self.shards.append(dict(shard, base=base))
+            base += shard["size"]
+        self.starts = [s["base"] for s in self.shards]
+        self.end = base
+
+    @classmethod
+    def single(cls, size=TOTAL_PRODUCTS_TO_FETCH, total=None, sort=SORT_ORDER, fields=FIELD_PROFILE):
+        """The unsharded scrape: one "*" query read to `size`."""
+        return cls([{"label": "all products", "filters": None, "count": total, "size": size}], total, sort, fields)
+
+    @property
+    def sharded(self):
+        return any(s["filters"] for s in self.shards)
+
+    def ends(self):
+        return [s["base"] + s["size"] for s in self.shards]
+
+    def locate(self, offset):
+        shard = self.shards[max(0, bisect_right(self.starts, offset) - 1)]
+        return shard, offset - shard["base"]
+
+    def save(self, path=SHARD_PLAN_FILE):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"total": self.total, "sort": self.sort, "fields": self.fields, "shards": self.shards}, f, indent=1)
+
+    @classmethod
+    def load(cls, path=SHARD_PLAN_FILE):
+        """The last scrape's plan; the unsharded one if it left none."""
+        if not os.path.exists(path): return cls.single()
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["shards"], data.get("total"), data.get("sort", "RELEVANCE"), data.get("fields", "full"))
+
+def _filter(key, values):
+    return {"key": key, "values": list(values), "settings": {"singleSelect": "false"}}
+
+def _price_band(lo, hi):
+    """Inclusive Klevu price range, from cents."""
+    return _filter("klevu_price", [f"{lo / 100:.2f} - {hi / 100:.2f}"])
+
+def _shard(label, filters, count):
+    return {"label": label, "filters": filters, "count": count,
+            "size": count + max(1, int(count * SHARD_HEADROOM))}
+
+def query_totals(session, bucket, filters=None):
+    """
+    Probes a query with a one-record page: (totalResultsFound, facets), where
+    facets holds "category" {value: count} and "price" (min, max) in cents
+    when Klevu returns them. Retries like a page; (None, {}) if it never
+    gets an answer with a total.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        bucket.acquire()
+        started = time.monotonic()
+        try:
+            response = session.post(API_URL, json=build_payload(0, 1, filters, facets=True), timeout=REQUEST_TIMEOUT)
+        except Exception as e:
+            response, error = None, str(e)
+        else:
+            error = None if response.status_code == 200 else f"HTTP {response.status_code}"
+        status = response.status_code if response is not None else None
+        size = len(response.content) if response is not None else None
+        REPORT.count("scrape.probes")
+        if error is None:
+            try:
+                result = response.json()["queryResults"][0]
+                total = int(result["meta"]["totalResultsFound"])
             except Exception as e:
+                # Answered, just not with a total: asking again won't help
+                REPORT.request(0, 1, status, time.monotonic() - started, size, None, f"Probe: {e}")
+                return None, {}
+            REPORT.request(0, 1, status, time.monotonic() - started, size, len(result.get("records") or []))
+            break
+        REPORT.request(0, 1, status, time.monotonic() - started, size, None, error)
+        if status is not None and status < 500 and status != 429:
+            return None, {}
+        delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)))
+        retry_after = parse_retry_after(response.headers.get("Retry-After")) if response is not None else None
+        time.sleep(max(delay, retry_after or 0))
+    else:
+        return None, {}
+
+    facets = {}
+    for facet in result.get("filters") or []:
+        try:
+            if facet.get("key") == "category":
+                facets["category"] = {o["value"]: int(o["count"]) for o in facet.get("options") or []}
+            elif facet.get("key") == "klevu_price" and facet.get("max") not in (None, ""):
+                facets["price"] = (int(float(facet.get("min") or 0) * 100), int(round(float(facet["max"]) * 100)))
+        except (KeyError, TypeError, ValueError):
+            continue
+    return total, facets
+
+def price_shards(session, bucket, filters, label, price_range, limit):
+    """
+    Splits a query into price bands of at most `limit` products by bisecting
+    its price range (cents, inclusive), one probe per split: the upper half
+    holds whatever of its parent the lower half doesn't. Neighbouring bands
+    that fit together are then merged back into one.
+    """
+    filters = filters or []
+    if price_range is None:
+        _, facets = query_totals(session, bucket, filters or None)
+        price_range = facets.get("price") or (0, PRICE_CEILING_CENTS)
+    count, _ = query_totals(session, bucket, filters + [_price_band(*price_range)])
+    if count is None:
+        raise RuntimeError(f"no product count for {label}")
+    bands, stack = [], [(price_range[0], price_range[1], count)]
+    while stack:
+        lo, hi, n = stack.pop()
+        if n <= limit or lo >= hi:
+            if n > limit:
+                print(f"Notice: {n} products in {label} cost ${lo / 100:.2f}; paging them past {limit}.")
+            if bands and bands[-1][2] + n <= limit:
+                bands[-1] = (bands[-1][0], hi, bands[-1][2] + n)
+            elif n:
+                bands.append((lo, hi, n))
+            continue
+        mid = (lo + hi) // 2
+        lower, _ = query_totals(session, bucket, filters + [_price_band(lo, mid)])
+        if lower is None:
+            raise RuntimeError(f"no product count for {label} up to ${mid / 100:.2f}")
+        stack.append((mid + 1, hi, max(0, n - lower)))
+        stack.append((lo, mid, lower))
+    return [_shard(f"{label} ${lo / 100:.2f}-${hi / 100:.2f}", filters + [_price_band(lo, hi)], n) for lo, hi, n in bands]
+
+def category_shards(session, bucket, categories, limit):
+    """
+    Categories packed first-fit-decreasing into shards of at most `limit`
+    products (several category values OR'ed in one filter); a category too
+    big for one shard is split into price bands.
+    """
+    shards, bins = [], []   # bins: [count, [values]]
+    for value, count in sorted(categories.items(), key=lambda kv: -kv[1]):
+        if count == 0: continue
+        if count > limit:
+            shards += price_shards(session, bucket, [_filter("category", [value])], value, None, limit)
+            continue
+        for b in bins:
+            if b[0] + count <= limit:
+                b[0] += count
+                b[1].append(value)
+                break
+        else:
+            bins.append([count, [value]])
+    for count, values in bins:
+        label = values[0] if len(values) == 1 else f"{values[0]} +{len(values) - 1} more"
+        shards.append(_shard(label, [_filter("category", values)], count))
+    return shards
+
+def plan_shards(session, bucket, shard_by=SHARD_BY, max_products=SHARD_MAX_PRODUCTS, sort=SORT_ORDER,
+                fields=FIELD_PROFILE):
+    """
+    Sizes the scrape from Klevu's reported totals. A catalogue that fits one
+    shard is one "*" query of exactly that size; a bigger one is split by
+    top-level category when the category counts partition it (within
+    SHARD_OVERLAP_TOLERANCE), else by price band. Falls back to the
+    unsharded scrape if Klevu won't report totals.
+    """
+    if shard_by == "off":
+        return ShardPlan.single(sort=sort, fields=fields)
+    total, facets = query_totals(session, bucket)
+    if total is None:
+        print(f"Notice: Klevu reported no product total; fetching up to {TOTAL_PRODUCTS_TO_FETCH} in one query.")
+        return ShardPlan.single(sort=sort, fields=fields)
+    limit = max(1, int(max_products / (1 + SHARD_HEADROOM)))
+    if total <= limit:
+        return ShardPlan([_shard("all products", None, total)], total, sort, fields)
+
+    try:
+        shards = None
+        categories = facets.get("category") or {}
+        if shard_by == "category" and categories:
+            listed = sum(categories.values())
+            if total <= listed <= total * (1 + SHARD_OVERLAP_TOLERANCE):
+                shards = category_shards(session, bucket, categories, limit)
+            else:
+                print(f"Notice: category counts add up to {listed} of {total} products; sharding by price instead.")
+        if shards is None:
+            shards = price_shards(session, bucket, None, "all products", facets.get("price"), limit)
+    except RuntimeError as e:
+        print(f"Notice: could not plan shards ({e}); fetching up to {TOTAL_PRODUCTS_TO_FETCH} in one query.")
+        return ShardPlan.single(total=total, sort=sort, fields=fields)
+
+    planned = sum(s["count"] for s in shards)
+    if planned < total:
+        print(f"⚠️ Shards cover {planned} of the {total} products Klevu reports; the rest have no category or price.")
+    print(f"Planned {len(shards)} shards for {total} products, the largest {max(s['count'] for s in shards)}.")
+    return ShardPlan(shards, total, sort, fields)
+
+# --- 6. RECORD PIPELINE ---
+# fetch -> parse -> explode -> clean, one generator per stage, so only the
+# page currently being written is ever held in memory.
+CSV_COLUMNS = ["Title", "Original Price", "Sale Price", "Category", "Product ID", "Link", "Description", "Stock Status"]
+SITE_COLUMNS = ["Title", "Original Price", "Sale Price", "Category", "Product ID", "Link"]  # SiteGen.PAYLOAD_COLUMNS
+
+# fields: what Klevu is asked for; variants: explode configurable products into
+# one row per variant (else one row per product); columns: what the CSV gets
+FIELD_PROFILES = {
+    "full": {"fields": ["displayTitle", "name", "price", "salePrice", "url", "category", "productplu", "sku",
+                        "type_id", "additionalDataToReturn", "stock_status", "desc"],
+             "variants": True, "columns": CSV_COLUMNS},
+    "site": {"fields": ["name", "price", "salePrice", "url", "category", "sku", "type_id", "additionalDataToReturn"],
+             "variants": True, "columns": SITE_COLUMNS},
+    # A product-level catalogue: first-variant prices, no variant rows
+    "products": {"fields": ["name", "price", "salePrice", "url", "category", "sku", "additionalDataToReturn"],
+                 "variants": False, "columns": SITE_COLUMNS},
+}
+
+def field_profile(name):
+    if name not in FIELD_PROFILES:
+        raise ValueError(f"Unknown field profile {name!r} (expected one of {', '.join(FIELD_PROFILES)})")
+    return FIELD_PROFILES[name]
+
+def request_fields(name):
+    fields = field_profile(name)["fields"]
+    return [f for f in fields if f != "desc"] if SKIP_DESCRIPTIONS else list(fields)
+
+def parse_items(records, decoder):
+    for item in records:
+        try:
+            # 1. Aggressively parse the hidden data
+            yield item, decoder.decode(item.get("additionalDataToReturn"))
+        except Exception as e:
+            continue
+
+def explode_item(item, rich_data_list, variants=True):
+    # 2. Get the TRUE prices
+    orig_price, sale_price = extract_true_prices(item, rich_data_list)
+
+    # DEBUG PRINT for the specific Air Fryer to prove it works
+    if "1116839" in str(item.get("sku")):
+        print(f"!!! DEBUG ZIP AIR FRYER !!! Found Orig: {orig_price}, Sale: {sale_price}")
+
+    # 3. Handle Variants vs Simple
+    is_configurable = item.get("type_id") == "configurable"
+
+    if is_configurable and rich_data_list and variants:
+        # Explode variants
+        for variant in rich_data_list:
+            if not isinstance(variant, dict): continue
+
+            # Variant specific prices
+            v_orig = variant.get("price", orig_price)
+            v_sale = variant.get("special_price", sale_price)
+
+            # Variant Title
+            opts = []
+            if variant.get("color"): opts.append(variant.get("color").strip())
+            if variant.get("size"): opts.append(variant.get("size").strip())
+            suffix = f" - ({', '.join(opts)})" if opts else ""
+
+            yield {
+                "Title": item.get("name") + suffix,
+                "Original Price": v_orig,
+                "Sale Price": v_sale,
+                "Category": item.get("category"),
+                "Product ID": variant.get("sku"),
+                "Link": item.get("url"),
+                "Description": item.get("desc"),
+                "Stock Status": "In Stock"
+            }
+    else:
+        # Simple Product
+        yield {
+            "Title": item.get("name"),
+            "Original Price": orig_price,
+            "Sale Price": sale_price,
+            "Category": item.get("category"),
+            "Product ID": item.get("sku"),
+            "Link": item.get("url"),
+            "Description": item.get("desc"),
+            "Stock Status": item.get("stock_status")
+        }
+
+def explode_items(parsed, variants=True):
+    for item, rich_data_list in parsed:
+        try:
+            yield from explode_item(item, rich_data_list, variants)
+        except Exception as e:
+            # A bad record only loses the rows it had not produced yet
+            continue
+
+def clean_rows(rows, cleaner):
+    for row in rows:
+        row["Description"] = cleaner.clean(row["Description"])
+        yield row
+
+class Deduper:
+    """
+    Streaming de-duplication; the first copy wins. A record whose Klevu id
+    came up before (overlapping pages or shards) is dropped before it is
+    parsed. A row is then keyed on Product ID, or on Link plus Title (the
+    product's URL and variant options) when it has none. Only 64-bit hashes
+    of the keys are kept, so the seen-sets stay small whatever the rows
+    hold; a collision is ~1e-9 likely at 200k rows.
+    """
+    def __init__(self):
+        self.record_keys = set()
+        self.row_keys = set()
+        self.stats = {"records": 0, "duplicate_records": 0, "rows": 0, "duplicate_rows": 0, "fallback_keys": 0}
+
+    @staticmethod
+    def row_key(product_id, link, title):
+        if product_id is None or product_id == "": return hash((link, title))
+        return hash(str(product_id))
+
+    def unique_records(self, records):
+        for record in records:
+            self.stats["records"] += 1
+            key = record.get("id")
+            if key is not None:
+                key = hash(str(key))
+                if key in self.record_keys:
+                    self.stats["duplicate_records"] += 1
+                    continue
+                self.record_keys.add(key)
+            yield record
+
+    def unique_rows(self, rows):
+        for row in rows:
+            self.stats["rows"] += 1
+            if row["Product ID"] is None or row["Product ID"] == "": self.stats["fallback_keys"] += 1
+            key = self.row_key(row["Product ID"], row["Link"], row["Title"])
+            if key in self.row_keys:
+                self.stats["duplicate_rows"] += 1
                 continue
+            self.row_keys.add(key)
+            yield row
 
-    except Exception as e:
-        print(f"Error: {e}")
-        break
-        
-    time.sleep(0.5)
-
-# --- SAVE ---
-if clean_data:
-    df = pd.DataFrame(clean_data)
-    # Convert prices to numeric to force proper formatting (optional)
-    # df['Original Price'] = pd.to_numeric(df['Original Price'], errors='coerce')
-    # df['Sale Price'] = pd.to_numeric(df['Sale Price'], errors='coerce')
-    
-    df.to_csv(OUT_CSV, index=False)
-    print(f"Saved {len(clean_data)} products to {OUT_CSV}")
+    def seed_csv(self, path):
+        """Marks the rows already in a CSV as seen, so appending runs don't repeat them."""
+        if not os.path.exists(path): return
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                self.row_keys.add(self.row_key(row.get("Product ID"), row.get("Link"), row.get("Title")))
+
+    @property
+    def unique(self):
+        return self.stats["records"] - self.stats["duplicate_records"]
+
+    def summary(self):
+        s = self.stats
+        def pct(n, of): return f"{n / of:.2%}" if of else "0%"
+        return (f"Dedup: {s['duplicate_records']} repeated records ({pct(s['duplicate_records'], s['records'])}), "
+                f"{s['duplicate_rows']} repeated rows ({pct(s['duplicate_rows'], s['rows'])}) dropped; "
+                f"{s['fallback_keys']} rows keyed on Link + Title")
+
+def iter_rows(records, decoder, cleaner, deduper=None, variants=True):
+    """
+    The record pipeline for one page. cleaner=None leaves descriptions alone
+    (for profiles that don't write them).
+    """
+    if deduper is not None: records = deduper.unique_records(records)
+    rows = explode_items(parse_items(records, decoder), variants)
+    if deduper is not None: rows = deduper.unique_rows(rows)
+    return rows if cleaner is None else clean_rows(rows, cleaner)
+
+# --- 7. OUTPUT ---
+class CsvSink:
+    """
+    Appends rows to OUT_CSV one page at a time with a fixed column order
+    (`columns`, or the existing file's header when appending to it). After
+    every page the file is flushed and a checkpoint records the byte length
+    of the valid data and the offset to resume from, so a crash leaves a
+    readable partial CSV and --resume can carry on from there.
+    """
+    def __init__(self, path, checkpoint_path, resume_from=None, append=False, columns=CSV_COLUMNS):
+        self.path = path
+        self.checkpoint_path = checkpoint_path
+        self.columns = columns
+        self.rows = 0
+        if resume_from or (append and os.path.exists(path)):
+            with open(path, newline="", encoding="utf-8") as f:
+                self.columns = next(csv.reader(f), None) or columns
+        if resume_from:
+            self.rows = resume_from["rows"]
+            self.file = open(path, "r+", newline="", encoding="utf-8")
+            # Drop anything written after the last checkpoint (e.g. half a page)
+            self.file.truncate(resume_from["csv_bytes"])
+            self.file.seek(0, os.SEEK_END)
+        elif append and os.path.exists(path):
+            self.file = open(path, "a", newline="", encoding="utf-8")
+        else:
+            self.file = open(path, "w", newline="", encoding="utf-8")
+            csv.writer(self.file, lineterminator="\n").writerow(self.columns)
+        self.file.flush()
+
+    def write_page(self, rows):
+        chunk = io.StringIO()
+        writer = csv.writer(chunk, lineterminator="\n")
+        count = 0
+        for row in rows:
+            writer.writerow([row.get(col) for col in self.columns])
+            count += 1
+        self.file.write(chunk.getvalue())
+        self.file.flush()
+        self.rows += count
+        return count
+
+    def checkpoint(self, next_offset, failed):
+        state = {"next_offset": next_offset, "rows": self.rows, "csv_bytes": self.file.tell(),
+                 "failed": [{"offset": o, "limit": l} for o, l in failed]}
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.checkpoint_path)
+
+    def close(self, completed):
+        self.file.close()
+        if completed and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+def load_checkpoint():
+    if not os.path.exists(CHECKPOINT_FILE): return None
+    with open(CHECKPOINT_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+# --- MAIN SCRIPT ---
+def main(retry_failed=False, resume=False, collect=False, stable_sort=False, fields=None):
+    """
+    Runs the scrape. With collect=True returns the scraped rows (CSV column
+    dicts) for the next stage, or None after --resume/--retry-failed, where
+    only the CSV holds every row. stable_sort pages in STABLE_SORT order;
+    fields names a FIELD_PROFILES entry (default FIELD_PROFILE). Resumed and
+    retried runs keep the sort and profile of the run they finish.
+    """
+    field_profile(fields or FIELD_PROFILE)
+    checkpoint = load_checkpoint() if resume else None
+    session = make_session()
+    bucket = TokenBucket(REQUESTS_PER_SECOND, RATE_BURST)
+
+    if retry_failed:
+        ranges = load_failed_ranges()
+        print(f"Re-fetching {len(ranges)} failed range(s)...")
+        plan = ShardPlan.load()
+        scheduler = FetchScheduler(ranges=ranges, ends=plan.ends())
+    elif checkpoint and os.path.exists(OUT_CSV):
+        print(f"Resuming scrape at offset {checkpoint['next_offset']} ({checkpoint['rows']} rows already saved)...")
+        plan = ShardPlan.load()
+        scheduler = FetchScheduler(total=plan.end, start=checkpoint["next_offset"], ends=plan.ends())
+        scheduler.failed = [(r["offset"], r["limit"]) for r in checkpoint["failed"]]
+    else:
+        if resume: print("No checkpoint found, starting from scratch.")
+        print(f"Starting scrape...")
+        # The last complete scrape becomes the baseline for the diff below
+        if not os.path.exists(CHECKPOINT_FILE): keep_previous()
+        checkpoint = None
+        with REPORT.stage("scrape.plan"):
+            plan = plan_shards(session, bucket, sort=STABLE_SORT if stable_sort else SORT_ORDER,
+                               fields=fields or FIELD_PROFILE)
+        plan.save()
+        scheduler = FetchScheduler(total=plan.end, ends=plan.ends())
+
+    profile = field_profile(plan.fields)
+    decoder = RichDataDecoder()
+    cleaner = DescriptionCleaner(DESC_CACHE_FILE, skip=SKIP_DESCRIPTIONS or "desc" not in profile["fields"])
+    # Re-fetched ranges top up the existing file rather than replacing the good pages
+    sink = CsvSink(OUT_CSV, CHECKPOINT_FILE, resume_from=checkpoint, append=retry_failed, columns=profile["columns"])
+    clean_with = cleaner if "Description" in sink.columns else None
+    # The typed snapshot is streamed alongside a fresh scrape; appending runs
+    # rebuild it from the finished CSV instead
+    appending = retry_failed or checkpoint is not None
+    snapshot = SnapshotWriter(SNAPSHOT_FILE) if snapshot_available() and not appending else None
+    history = PriceHistory(HISTORY_DB)
+    collected = [] if collect and not appending else None
+    deduper = Deduper()
+    if appending: deduper.seed_csv(OUT_CSV)
+    completed = False
+    try:
+        with REPORT.stage("scrape.pages"):
+            for page in fetch_pages(session, scheduler, plan, bucket):
+                started = time.perf_counter()
+                shard, query_offset = plan.locate(page.offset)
+                if query_offset + page.limit >= shard["size"] and len(page.records) == page.limit:
+                    # The shard's last page came back full: it may have grown past its size
+                    print(f"⚠️ {shard['label']} may hold more than the {shard['size']} products planned for it.")
+                    REPORT.count("scrape.shard_overflows")
+                rows = list(iter_rows(page.records, decoder, clean_with, deduper, profile["variants"]))
+                sink.write_page(rows)
+                if collected is not None: collected.extend(rows)
+                if snapshot: snapshot.write_rows(rows)
+                if not appending: history.add_rows(rows)
+                if not retry_failed:
+                    next_offset = page.offset + page.limit
+                    sink.checkpoint(next_offset, [f for f in scheduler.failed if f[0] < next_offset])
+                REPORT.page(page.offset, len(page.records), len(rows))
+                REPORT.add_time("page processing", time.perf_counter() - started)
+        completed = True
+    finally:
+        sink.close(completed)
+        if snapshot: snapshot.close(completed)
+
+    if appending and snapshot_available():
+        with REPORT.stage("scrape.snapshot"):
+            snapshot_from_csv(OUT_CSV, SNAPSHOT_FILE)
+    if snapshot_available():
+        print(f"Saved typed snapshot to {SNAPSHOT_FILE}")
+    else:
+        print("Notice: pyarrow not installed, skipping the typed snapshot.")
+
+    with REPORT.stage("scrape.history"):
+        # Same-day upserts are idempotent, so appending runs re-record the whole CSV
+        if appending: history.add_csv(OUT_CSV)
+        print(f"Recorded {history.record()} prices in {HISTORY_DB}")
+        pruned = history.prune()
+        if pruned: print(f"Folded {pruned} price intervals older than {RETENTION_DAYS} days into the rollup")
+        history.close()
+
+    with REPORT.stage("scrape.diff"):
+        delta = run_diff()
+    if delta is not None:
+        REPORT.counters.update({f"diff.{kind}": n for kind, n in delta["counts"].items()})
+        REPORT.output(DELTA_FILE, FEED_RSS, FEED_JSON)
+
+    cleaner.save()
+    save_failed_ranges(scheduler.failed)
+    print(decoder.summary())
+    print(cleaner.summary())
+    print(deduper.summary())
+    print(f"Saved {sink.rows} products to {OUT_CSV}")
+    if plan.total is not None and not appending:
+        missing = max(0, plan.total - deduper.unique)
+        print(f"Fetched {deduper.unique} of the {plan.total} products Klevu reports ({missing} missing), "
+              f"in {len(plan.shards)} shard(s).")
+        REPORT.counters.update({"scrape.reported_total": plan.total, "scrape.missing": missing,
+                                "scrape.shards": len(plan.shards)})
+    REPORT.counters.update({f"dedupe.{k}": v for k, v in deduper.stats.items()})
+    transferred = sum(r["bytes"] or 0 for r in REPORT.requests)
+    print(f"Fields: {plan.fields} profile, {len(request_fields(plan.fields))} fields requested, "
+          f"{len(sink.columns)} of {len(CSV_COLUMNS)} columns written, "
+          f"{transferred / max(1, deduper.stats['records']) / 1024:.2f} KB per record transferred")
+    REPORT.settings.update({"fields": plan.fields, "sort": plan.sort})
+    REPORT.counters.update({f"rich_data.{k}": v for k, v in decoder.stats.items()})
+    REPORT.counters.update({f"descriptions.{k}": v for k, v in cleaner.stats.items()})
+    REPORT.counters["scrape.failed_ranges"] = len(scheduler.failed)
+    REPORT.output(OUT_CSV, SNAPSHOT_FILE, HISTORY_DB, FAILED_OFFSETS_FILE, SHARD_PLAN_FILE)
+    if DESC_CACHE_FILE: REPORT.output(DESC_CACHE_FILE)
+    return collected
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    run(lambda: main(retry_failed="--retry-failed" in args, resume="--resume" in args, stable_sort="--stable-sort" in args,
+                     fields=args[args.index("--fields") + 1] if "--fields" in args[:-1] else None),
+        report="--report" in args, profile="--profile" in args)
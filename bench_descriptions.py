@@ -0,0 +1,89 @@
+"""
+Description cleaning benchmark and equivalence check: fast_strip_html()
+against clean_html() (BeautifulSoup).
+
+    python bench_descriptions.py                          # mock + fuzzed descriptions
+    python bench_descriptions.py --samples response.json  # a saved Klevu search response
+                                                          # or a JSON list of raw strings
+    python bench_descriptions.py --fuzz 200000 --seed 7
+
+The corpus is the mock catalogue's descriptions (or the saved ones) plus
+fuzzed markup assembled from fragments that real descriptions use: void
+tags and their stray end tags, entities, odd whitespace. Wherever the fast
+path accepts a description it must give exactly what BeautifulSoup gives,
+or the run fails.
+"""
+import argparse
+import json
+import random
+import time
+
+from SiteScraper import clean_html, fast_strip_html
+from klevu_mock import Catalogue
+
+FRAGMENTS = [
+    "<p>", "</p>", "<br>", "<br/>", "</br>", "<BR>", "<strong>", "</strong>", "<b>", "</b>", "<ul>", "</ul>",
+    "<li>", "</li>", "<span style=\"color: red\">", "</span>", "<div class=x>", "</div>", "<img src=a.jpg>",
+    "</img>", "<hr>", "<table>", "<td>", "</td>", "Cotton", "Queen size", "x", "2 x 3m", "100%",
+    " ", "  ", "\n", "\r\n", "\t", "\xa0", "\u200b", "\u3000", "\ufeff", "\x0b", "\x85",
+    "&amp;", "&nbsp;", "&lt;", "&gt;", "&quot;", "&#39;", "&#9;", "&#8203;", "&#x200b;", "&Tab;", "&trade;",
+    "&reg;", "&deg;", "&", "&foo;", "a < b", "<!-- note -->",
+]
+
+def load_samples(path):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = [rec.get("desc")
+                for result in data.get("queryResults", [])
+                for rec in result.get("records", [])]
+    return [s for s in data if isinstance(s, str) and s]
+
+def fuzz_samples(count, seed):
+    rng = random.Random(seed)
+    return ["".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(1, 12))) for _ in range(count)]
+
+def best_of(fn, samples, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for s in samples: fn(s)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and benchmark the description fast path.")
+    parser.add_argument("--samples", help="Klevu response JSON or a JSON list of raw strings")
+    parser.add_argument("--count", type=int, default=5000, help="Mock descriptions to generate")
+    parser.add_argument("--fuzz", type=int, default=50000, help="Fuzzed descriptions to add")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.samples:
+        samples = load_samples(args.samples)
+    else:
+        catalogue = Catalogue(args.count)
+        samples = [catalogue.record(i)["desc"] for i in range(args.count)]
+    samples += fuzz_samples(args.fuzz, args.seed)
+
+    accepted, mismatches = [], []
+    for s in samples:
+        fast = fast_strip_html(s)
+        if fast is None: continue
+        accepted.append(s)
+        if fast != clean_html(s): mismatches.append((s, fast))
+    print(f"{len(samples)} descriptions; fast path accepts {len(accepted)} ({len(accepted) / len(samples):.1%}); "
+          f"mismatches: {len(mismatches)}")
+    for s, fast in mismatches[:10]:
+        print(f"  {s!r}: fast {fast!r}, BeautifulSoup {clean_html(s)!r}")
+    if mismatches:
+        raise SystemExit("fast_strip_html() differs from clean_html()")
+
+    parsed = best_of(clean_html, accepted, args.repeat)
+    fast = best_of(fast_strip_html, accepted, args.repeat)
+    print(f"On the accepted descriptions: BeautifulSoup {parsed / len(accepted) * 1e6:.1f} us, "
+          f"fast path {fast / len(accepted) * 1e6:.1f} us per description ({parsed / fast:.0f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Micro-benchmark: RichDataDecoder vs the original parse_rich_data().
+
+Samples are additionalDataToReturn strings, either captured from Klevu or
+synthesised by klevu_mock.py:
+
+    python bench_rich_data.py                          # mock samples, all forms
+    python bench_rich_data.py --samples response.json  # a saved Klevu search response
+                                                       # or a JSON list of raw strings
+
+Capture a live response with e.g.
+    curl -s -X POST -H 'Content-Type: application/json' -d @payload.json \
+        https://aucs34.ksearchnet.com/cs/v2/search > response.json
+"""
+import argparse
+import json
+import time
+from collections import Counter
+
+from SiteScraper import RichDataDecoder, parse_rich_data
+from klevu_mock import Catalogue
+
+def load_samples(path):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = [rec.get("additionalDataToReturn")
+                for result in data.get("queryResults", [])
+                for rec in result.get("records", [])]
+    return [s for s in data if isinstance(s, str) and s]
+
+def mock_samples(count, configurable):
+    catalogue = Catalogue(count, configurable)
+    return [catalogue.record(i)["additionalDataToReturn"] for i in range(count)]
+
+def timed(fn, samples, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for s in samples: fn(s)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark additionalDataToReturn decoding.")
+    parser.add_argument("--samples", help="Klevu response JSON or a JSON list of raw strings")
+    parser.add_argument("--count", type=int, default=5000, help="Mock samples to generate")
+    parser.add_argument("--configurable", type=float, default=0.5)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    samples = load_samples(args.samples) if args.samples else mock_samples(args.count, args.configurable)
+    forms = Counter(RichDataDecoder.detect(s) for s in samples)
+    print(f"{len(samples)} samples, {sum(len(s) for s in samples) / 1e6:.1f} MB; forms: "
+          + ", ".join(f"{f} {forms[f]}" for f in RichDataDecoder.FORMS))
+
+    # Same answer, or the old parser gave up where the new one didn't
+    mismatches = recovered = 0
+    decoder = RichDataDecoder(cache_size=0)
+    for s in samples:
+        old, new = parse_rich_data(s), decoder.decode(s)
+        if old != new:
+            if old == []: recovered += 1
+            else: mismatches += 1
+    print(f"Mismatches: {mismatches}; payloads only the new decoder could read: {recovered}")
+
+    legacy = timed(parse_rich_data, samples, args.repeat)
+    cold = timed(RichDataDecoder(cache_size=0).decode, samples, args.repeat)
+    warm_decoder = RichDataDecoder()
+    for s in samples: warm_decoder.decode(s)
+    warm = timed(warm_decoder.decode, samples, args.repeat)
+
+    print(f"{'':<22}{'total ms':>10}{'us/call':>10}{'speed-up':>10}")
+    for name, t in [("parse_rich_data", legacy), ("decoder (no cache)", cold), ("decoder (cached)", warm)]:
+        print(f"{name:<22}{t * 1000:>10.1f}{t / len(samples) * 1e6:>10.1f}{legacy / t:>9.1f}x")
+
+    print("Per form (no cache):")
+    by_form = {}
+    for s in samples: by_form.setdefault(RichDataDecoder.detect(s), []).append(s)
+    for form in RichDataDecoder.FORMS:
+        group = by_form.get(form)
+        if not group: continue
+        old = timed(parse_rich_data, group, args.repeat)
+        new = timed(RichDataDecoder(cache_size=0).decode, group, args.repeat)
+        print(f"  {form:<10}{len(group):>7} samples  {old / len(group) * 1e6:>8.1f} -> {new / len(group) * 1e6:>6.1f} us/call")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Scrape throughput benchmark against the offline Klevu mock.
+
+Runs SiteScraper.py as a subprocess (so its peak RSS is measured on its own)
+against klevu_mock.py at each catalogue size and reports records/s, wall time
+and peak RSS:
+
+    python bench_scraper.py                       # 20k, 100k, 500k
+    python bench_scraper.py --sizes 20000 --latency-ms 50 --json bench.json
+    python bench_scraper.py --sizes 100000 --offset-cost-ms 20 --shard-by off   # one deep query
+"""
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from klevu_mock import Catalogue, start_server
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def count_rows(path):
+    if not os.path.exists(path): return 0
+    with open(path, newline="", encoding="utf-8") as f:
+        return max(0, sum(1 for _ in csv.reader(f)) - 1)
+
+def run_once(size, args):
+    catalogue = Catalogue(size, args.configurable, args.max_variants)
+    server = start_server(catalogue, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                          offset_cost_ms=args.offset_cost_ms)
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            out_csv = os.path.join(workdir, "products.csv")
+            env = dict(os.environ,
+                       SCRAPER_API_URL=server.url,
+                       SCRAPER_TOTAL_PRODUCTS=str(size + args.batch_headroom),
+                       SCRAPER_OUT_CSV=out_csv,
+                       SCRAPER_CONCURRENCY=str(args.concurrency),
+                       SCRAPER_REQUESTS_PER_SECOND=str(args.rps),
+                       SCRAPER_SHARD_BY=args.shard_by,
+                       SCRAPER_SHARD_MAX=str(args.shard_max),
+                       SCRAPER_FIELDS=args.fields)
+            started = time.perf_counter()
+            proc = subprocess.Popen([sys.executable, os.path.join(HERE, "SiteScraper.py")], cwd=workdir, env=env,
+                                    stdout=subprocess.DEVNULL if not args.verbose else None)
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            wall = time.perf_counter() - started
+            rows = count_rows(out_csv)
+            csv_bytes = os.path.getsize(out_csv) if os.path.exists(out_csv) else 0
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    return {
+        "products": size,
+        "rows": rows,
+        "wall_s": round(wall, 3),
+        "products_per_s": round(size / wall, 1) if wall else 0,
+        "rows_per_s": round(rows / wall, 1) if wall else 0,
+        # ru_maxrss is KiB on Linux
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),
+        "csv_mb": round(csv_bytes / 1e6, 2),
+        "requests": server.stats["requests"],
+        "exit_code": proc.returncode,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SiteScraper.py against the Klevu mock.")
+    parser.add_argument("--sizes", default="20000,100000,500000", help="Comma-separated catalogue sizes")
+    parser.add_argument("--configurable", type=float, default=0.3)
+    parser.add_argument("--max-variants", type=int, default=6)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--offset-cost-ms", type=float, default=0, help="Mock latency per 1000 of page offset")
+    parser.add_argument("--shard-by", default="category", choices=["category", "price", "off"])
+    parser.add_argument("--shard-max", type=int, default=10000, help="Most products per shard")
+    parser.add_argument("--fields", default="full", help="Field profile (SiteScraper.FIELD_PROFILES)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rps", type=float, default=1000.0, help="Scraper rate limit; high by default so it measures the scraper")
+    parser.add_argument("--batch-headroom", type=int, default=2000,
+                        help="Unsharded runs fetch this many offsets past the catalogue so they end on an empty page")
+    parser.add_argument("--json", help="Also write results to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show scraper output")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'products':>10} {'rows':>10} {'wall s':>9} {'products/s':>11} {'rows/s':>10} {'peak MB':>9} {'csv MB':>8}")
+    for size in [int(s) for s in args.sizes.split(",") if s]:
+        r = run_once(size, args)
+        results.append(r)
+        flag = "" if r["exit_code"] == 0 else f"  (exit {r['exit_code']})"
+        print(f"{r['products']:>10} {r['rows']:>10} {r['wall_s']:>9.2f} {r['products_per_s']:>11.0f} "
+              f"{r['rows_per_s']:>10.0f} {r['peak_rss_mb']:>9.1f} {r['csv_mb']:>8.2f}{flag}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.json}")
+
+if __name__ == "__main__":
+    main()
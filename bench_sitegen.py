@@ -0,0 +1,135 @@
+"""
+SiteGen payload benchmark: columnar build_deals_payload() vs the original
+iterrows loop, on synthetic scraped CSVs of each size.
+
+    python bench_sitegen.py                 # 20k and 200k rows
+    python bench_sitegen.py --rows 50000 --repeat 3
+    python bench_sitegen.py --engines       # whole runs: pandas vs --no-pandas
+
+Rows come from klevu_mock.py records pushed through the scraper's own
+row pipeline, so prices, categories and variant fan-out look like a real
+scrape. Both builders must produce identical JSON or the run fails. The
+payload columns give the page's data as rows and columnar, raw and
+gzipped: the gzipped figure is what a browser downloads.
+
+--engines runs SiteGen.main() in a fresh process per engine and reports
+startup (importing SiteGen, plus pandas for the pandas path), total run
+time and peak RSS; the two pages must match apart from the timestamp.
+"""
+import argparse
+import csv
+import gzip
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+import SiteGen
+import snapshot
+from SiteScraper import CSV_COLUMNS, DescriptionCleaner, RichDataDecoder, iter_rows
+from klevu_mock import Catalogue
+
+def write_scraped_csv(path, rows_wanted):
+    catalogue = Catalogue(rows_wanted)  # Over-provisioned; stops once enough rows exist
+    decoder, cleaner = RichDataDecoder(), DescriptionCleaner()
+    written = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(CSV_COLUMNS)
+        for i in range(rows_wanted):
+            for row in iter_rows([catalogue.record(i)], decoder, cleaner):
+                writer.writerow([row[col] for col in CSV_COLUMNS])
+                written += 1
+                if written >= rows_wanted: return
+
+def best_of(fn, repeat):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+ENGINE_RUN = """
+import json, resource, time
+started = time.perf_counter()
+import SiteGen
+if not STDLIB: SiteGen._load_pandas()
+ready = time.perf_counter()
+SiteGen.main(stdlib=STDLIB, rebuild=True)
+print(json.dumps({"startup": ready - started, "total": time.perf_counter() - started,
+                  "peak_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+"""
+
+def run_engine(workdir, stdlib):
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, "-c", f"STDLIB = {stdlib}" + ENGINE_RUN], cwd=workdir, env=env,
+                         check=True, capture_output=True, text=True).stdout
+    with open(os.path.join(workdir, SiteGen.OUT_HTML), encoding="utf-8") as f:
+        page = re.sub(r'<div class="scrape-time"[^>]*>.*?</div>', "", f.read())
+    return json.loads(out.strip().splitlines()[-1]), page
+
+def compare_engines(row_counts, repeat):
+    print(f"{'rows':>8} {'engine':>8} {'startup s':>10} {'total s':>8} {'peak MB':>8}  identical")
+    with tempfile.TemporaryDirectory() as workdir:
+        for rows in row_counts:
+            write_scraped_csv(os.path.join(workdir, SiteGen.IN_CSV), rows)
+            pages = {}
+            for name, stdlib in [("pandas", False), ("stdlib", True)]:
+                runs = [run_engine(workdir, stdlib) for _ in range(repeat)]
+                best = {key: min(r[0][key] for r in runs) for key in ("startup", "total", "peak_mb")}
+                pages[name] = runs[-1][1]
+                same = "" if name == "pandas" else ("yes" if pages["stdlib"] == pages["pandas"] else "NO")
+                print(f"{rows:>8} {name:>8} {best['startup']:>10.3f} {best['total']:>8.3f} {best['peak_mb']:>8.1f}  {same}")
+            if pages["stdlib"] != pages["pandas"]:
+                raise SystemExit("--no-pandas page differs from the pandas page")
+
+def payload_sizes(deals_payload):
+    """(rows MB, rows gz MB, columnar MB, columnar gz MB) of the page's data."""
+    rows = json.dumps(deals_payload).encode("utf-8")
+    columnar = json.dumps(SiteGen.encode_columnar(deals_payload), separators=(",", ":")).encode("utf-8")
+    return tuple(n / 1e6 for n in (len(rows), len(gzip.compress(rows, 6)), len(columnar), len(gzip.compress(columnar, 6))))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SiteGen payload building.")
+    parser.add_argument("--rows", default="20000,200000", help="Comma-separated row counts")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--engines", action="store_true", help="Compare whole pandas and --no-pandas runs")
+    args = parser.parse_args()
+    if args.engines:
+        return compare_engines([int(r) for r in args.rows.split(",") if r], args.repeat)
+
+    print(f"{'rows':>8} {'iterrows s':>11} {'columnar s':>11} {'speed-up':>9}  identical"
+          + f" {'payload MB rows/gz':>19} {'columnar/gz':>12}"
+          + (f" {'csv load+build s':>17} {'snapshot load+build s':>22}" if snapshot.available() else ""))
+    with tempfile.TemporaryDirectory() as workdir:
+        for rows in [int(r) for r in args.rows.split(",") if r]:
+            path = os.path.join(workdir, f"rows_{rows}.csv")
+            write_scraped_csv(path, rows)
+            df = pd.read_csv(path)
+
+            old_t, (old_payload, old_cats) = best_of(lambda: SiteGen.build_deals_payload_rowwise(df), args.repeat)
+            new_t, (new_payload, new_cats) = best_of(lambda: SiteGen.build_deals_payload(df), args.repeat)
+            same = json.dumps(old_payload) == json.dumps(new_payload) and old_cats == new_cats
+            line = f"{len(df):>8} {old_t:>11.3f} {new_t:>11.3f} {old_t / new_t:>8.1f}x  {'yes' if same else 'NO ':<9}"
+            if not same:
+                raise SystemExit("Columnar payload differs from the iterrows payload")
+            rows_mb, rows_gz, col_mb, col_gz = payload_sizes(new_payload)
+            line += f" {f'{rows_mb:.2f}/{rows_gz:.2f}':>19} {f'{col_mb:.2f}/{col_gz:.2f}':>12}"
+
+            if snapshot.available():
+                snap_path = os.path.join(workdir, f"rows_{rows}.parquet")
+                snapshot.snapshot_from_csv(path, snap_path)
+                csv_t, _ = best_of(lambda: SiteGen.build_deals_payload(pd.read_csv(path)), args.repeat)
+                snap_t, (snap_payload, _) = best_of(
+                    lambda: SiteGen.build_deals_payload(snapshot.read_snapshot(snap_path, SiteGen.PAYLOAD_COLUMNS)), args.repeat)
+                line += f" {csv_t:>17.3f} {snap_t:>22.3f}"
+            print(line)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""
+Offline stand-in for the Klevu /cs/v2/search endpoint.
+
+Serves a synthetic, deterministic Briscoes-like catalogue so SiteScraper.py
+can be exercised and benchmarked without touching aucs34.ksearchnet.com:
+
+    python klevu_mock.py --products 100000 --configurable 0.3 --latency-ms 40
+    SCRAPER_API_URL=http://127.0.0.1:8765/cs/v2/search python SiteScraper.py
+
+Records are generated on demand from their index, so even a 500k catalogue
+costs no memory up front. Filtered queries (the scraper's shards) follow
+Klevu's applyFilters: values of one key are OR'ed, keys are AND'ed, and
+"klevu_price" takes inclusive "min - max" ranges. filtersToReturn adds the
+top-level category facet with counts and the price min/max. NAME_* and
+PRICE_* sorts are stable; --unstable-relevance N makes RELEVANCE paging
+shuffle within blocks of N records per request, so pages overlap and skip
+like the real endpoint's. The first filtered or sorted query builds a
+(category, price, name) index of the whole catalogue. --offset-cost-ms makes
+deep pages slower, as they are on the real endpoint.
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# ---- Catalogue vocabulary ----
+CATEGORIES = [
+    "Kitchen;;Cookware;;Frypans", "Kitchen;;Small Appliances;;Air Fryers", "Kitchen;;Coffee Machines",
+    "Dining;;Dinnerware;;Plates", "Dining;;Glassware", "Bedroom;;Sheets;;Sheet Sets",
+    "Bedroom;;Pillows", "Bedroom;;Duvet Inners", "Bathroom;;Towels;;Bath Towels",
+    "Laundry;;Ironing", "Home Decor;;Cushions", "Home Decor;;Rugs", "Living;;Lamps",
+    "Electrical;;Vacuums", "Personal Care;;Hair Dryers", "Travel;;Luggage;;Suitcases",
+    "Outdoor;;BBQ", "Outdoor;;Coolers", "Brands;;Kenwood", "Brands;;Sheridan",
+]
+BRANDS = ["Zip", "Sheridan", "Kenwood", "Breville", "Samsonite", "Baksana", "Essentials", "Philips", "Tefal", "Wiltshire"]
+NOUNS = ["Air Fryer", "Frypan", "Sheet Set", "Pillow", "Bath Towel", "Cushion", "Rug", "Lamp", "Vacuum",
+         "Hair Dryer", "Suitcase", "Cooler", "Kettle", "Dinner Set", "Duvet Inner", "Toaster"]
+COLOURS = ["White", "Black", "Navy", "Grey", "Sage", "Blush", "Charcoal", "Natural"]
+SIZES = ["Single", "King Single", "Double", "Queen", "King", "Super King"]
+
+# Forms Klevu has been seen to use for additionalDataToReturn
+ENCODINGS = ["json", "double", "escaped", "python"]
+
+# sort -> (index field, descending); anything else is served in RELEVANCE order
+SORTS = {"NAME_ASC": (2, False), "NAME_DESC": (2, True), "PRICE_ASC": (1, False), "PRICE_DESC": (1, True)}
+
+def _money(value):
+    return f"{value:.2f}"
+
+# ---- Catalogue ----
+class Catalogue:
+    """
+    Deterministic synthetic catalogue. `record(i)` always returns the same
+    product for the same settings.
+    """
+    def __init__(self, size=20000, configurable_ratio=0.3, max_variants=6, encodings=None, seed=1, unstable_window=0):
+        self.size = size
+        self.configurable_ratio = configurable_ratio
+        self.max_variants = max_variants
+        self.encodings = list(encodings or ENCODINGS)
+        self.seed = seed
+        self.unstable_window = unstable_window
+        self.facets = None    # [(top-level category, sale price, name)] per record, built on first use
+        self.matches = {}     # applyFilters JSON + sort -> matching record indexes, in order
+        self.lock = threading.Lock()
+
+    def record(self, i):
+        rng = random.Random(self.seed * 1_000_003 + i)
+        sku = str(1000000 + i)
+        name = f"{rng.choice(BRANDS)} {rng.choice(NOUNS)} {i}"
+        orig = round(rng.uniform(5, 800), 2) - 0.01
+        sale = orig if rng.random() < 0.3 else round(orig * rng.choice([0.3, 0.4, 0.5, 0.6, 0.75]), 2)
+        configurable = rng.random() < self.configurable_ratio
+
+        if configurable:
+            rich = []
+            for v in range(rng.randint(1, self.max_variants)):
+                v_orig = round(orig + v * 10, 2)
+                rich.append({
+                    "sku": f"{sku}-{v}",
+                    "price": _money(v_orig),
+                    "special_price": _money(round(v_orig * sale / orig, 2)),
+                    "color": f" {rng.choice(COLOURS)} ",
+                    "size": rng.choice(SIZES),
+                })
+        else:
+            rich = [{"sku": sku, "price": _money(orig), "special_price": _money(sale) if sale < orig else ""}]
+
+        return {
+            "id": sku,
+            "displayTitle": name,
+            "name": name,
+            # Top-level prices are deliberately the "bad" data the scraper has to override
+            "price": _money(sale),
+            "salePrice": _money(sale),
+            "url": f"https://www.briscoes.co.nz/product/{sku}/mock-{i}/",
+            "category": rng.choice(CATEGORIES),
+            "productplu": sku,
+            "sku": sku,
+            "type_id": "configurable" if configurable else "simple",
+            "additionalDataToReturn": self.encode_rich(rich, self.encodings[i % len(self.encodings)]),
+            "stock_status": "In Stock" if rng.random() < 0.95 else "Out of Stock",
+            "desc": f"<p>The <strong>{name}</strong> is a mock product.</p><ul><li>Item {i}</li><li>Ships &amp; returns free</li></ul>",
+        }
+
+    @staticmethod
+    def encode_rich(rich, form):
+        """
+        json: plain JSON; double: a JSON string holding JSON; escaped: JSON with
+        backslash-escaped quotes but no outer quotes; python: a Python repr.
+        """
+        if form == "json":
+            return json.dumps(rich)
+        if form == "double":
+            return json.dumps(json.dumps(rich))
+        if form == "escaped":
+            return json.dumps(rich).replace('"', '\\"')
+        if form == "python":
+            return repr(rich)
+        raise ValueError(f"Unknown encoding {form!r}")
+
+    # ---- Filters ----
+    def facet_index(self):
+        with self.lock:
+            if self.facets is None:
+                self.facets = [(rec["category"].split(";;")[0], float(rec["salePrice"]), rec["name"])
+                               for rec in map(self.record, range(self.size))]
+            return self.facets
+
+    def matching(self, filters, sort="RELEVANCE"):
+        """Indexes of the records that pass every applyFilters entry, in `sort` order."""
+        key = json.dumps([filters, sort], sort_keys=True)
+        with self.lock:
+            if key in self.matches: return self.matches[key]
+        tests = []
+        for f in filters:
+            values = f.get("values") or []
+            if f.get("key") == "klevu_price":
+                bands = [tuple(float(v) for v in value.split(" - ")) for value in values]
+                tests.append(lambda cat, price, bands=bands: any(lo <= price <= hi for lo, hi in bands))
+            elif f.get("key") == "category":
+                tests.append(lambda cat, price, values=set(values): cat in values)
+            else:
+                raise ValueError(f"Unknown filter key {f.get('key')!r}")
+        facets = self.facet_index()
+        found = [i for i, (cat, price, _) in enumerate(facets) if all(test(cat, price) for test in tests)]
+        if sort in SORTS:
+            field, descending = SORTS[sort]
+            found.sort(key=lambda i: (facets[i][field], i), reverse=descending)
+        with self.lock:
+            if len(self.matches) > 256: self.matches.clear()
+            self.matches[key] = found
+        return found
+
+    def facet_results(self, indexes):
+        counts, prices = {}, []
+        facets = self.facet_index()
+        for i in indexes:
+            cat, price, _ = facets[i]
+            counts[cat] = counts.get(cat, 0) + 1
+            prices.append(price)
+        return [
+            {"key": "category", "label": "Category", "type": "OPTIONS",
+             "options": [{"name": cat, "value": cat, "count": n, "selected": False} for cat, n in sorted(counts.items())]},
+            {"key": "klevu_price", "label": "Price", "type": "SLIDER",
+             "min": _money(min(prices, default=0)), "max": _money(max(prices, default=0))},
+        ]
+
+    def page(self, indexes, offset, limit, rng):
+        """
+        indexes[offset:offset + limit], except that with unstable_window each
+        call rotates every full block of that many records by its own random
+        amount.
+        """
+        window = self.unstable_window
+        if window < 2 or rng is None:
+            return indexes[offset:offset + limit]
+        shift, full = rng.randrange(window), len(indexes) - len(indexes) % window
+        return [indexes[pos - pos % window + (pos % window + shift) % window if pos < full else pos]
+                for pos in range(offset, min(len(indexes), offset + limit))]
+
+    def search(self, settings, rng=None):
+        offset = max(0, int(settings.get("offset", 0)))
+        limit = max(0, int(settings.get("limit", 0)))
+        fields = settings.get("fields")
+        filters = settings.get("filters") or {}
+        applied = (filters.get("applyFilters") or {}).get("filters") or []
+        sort = settings.get("sort") or "RELEVANCE"
+        indexes = self.matching(applied, sort) if applied or sort in SORTS else range(self.size)
+        records = []
+        for i in self.page(indexes, offset, limit, rng if sort not in SORTS else None):
+            rec = self.record(i)
+            if fields:
+                rec = {k: v for k, v in rec.items() if k in fields or k == "id"}
+            records.append(rec)
+        result = {
+            "meta": {"totalResultsFound": len(indexes), "offset": offset, "noOfResults": limit},
+            "records": records,
+        }
+        if (filters.get("filtersToReturn") or {}).get("enabled"):
+            result["filters"] = self.facet_results(indexes)
+        return result
+
+# ---- HTTP server ----
+class KlevuHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real endpoint
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status, body, extra_headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (extra_headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not self.path.rstrip("/").endswith("/cs/v2/search"):
+            return self.send_json(404, {"error": "not found"})
+
+        with server.stats_lock:
+            server.stats["requests"] += 1
+            rng = random.Random(server.stats["requests"])
+
+        delay = server.latency + rng.uniform(0, server.jitter)
+        if server.offset_cost:
+            try:
+                deepest = max(int(q.get("settings", {}).get("offset", 0)) for q in json.loads(body)["recordQueries"])
+            except (ValueError, TypeError, KeyError, AttributeError):
+                deepest = 0
+            delay += server.offset_cost * deepest / 1000
+        if delay: time.sleep(delay)
+
+        if rng.random() < server.error_rate:
+            with server.stats_lock:
+                server.stats["errors"] += 1
+            if rng.random() < 0.5:
+                return self.send_json(429, {"error": "throttled"}, {"Retry-After": str(server.retry_after)})
+            return self.send_json(503, {"error": "unavailable"})
+
+        try:
+            query = json.loads(body)
+            results = [dict(self.server.catalogue.search(q.get("settings", {}), rng), id=q.get("id"))
+                       for q in query.get("recordQueries", [])]
+        except (ValueError, TypeError, AttributeError) as e:
+            return self.send_json(400, {"error": str(e)})
+        self.send_json(200, {"meta": {"apiKey": (query.get("context") or {}).get("apiKeys")}, "queryResults": results})
+
+class KlevuMockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, catalogue, latency_ms=0, jitter_ms=0, error_rate=0.0, retry_after=1, offset_cost_ms=0):
+        super().__init__(address, KlevuHandler)
+        self.catalogue = catalogue
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.offset_cost = offset_cost_ms / 1000.0  # Extra seconds per 1000 of offset
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.stats = {"requests": 0, "errors": 0}
+        self.stats_lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        # A scraper killed mid-request is expected (resume tests); stay quiet
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/cs/v2/search"
+
+def start_server(catalogue, host="127.0.0.1", port=0, **options):
+    """
+    Starts the mock on a daemon thread and returns the server; `server.url`
+    is what to put in SCRAPER_API_URL. Call `server.shutdown()` when done.
+    """
+    server = KlevuMockServer((host, port), catalogue, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic Klevu search endpoint.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--products", type=int, default=20000, help="Catalogue size")
+    parser.add_argument("--configurable", type=float, default=0.3, help="Share of configurable products (0-1)")
+    parser.add_argument("--max-variants", type=int, default=6)
+    parser.add_argument("--encodings", default=",".join(ENCODINGS),
+                        help=f"additionalDataToReturn forms to rotate through ({', '.join(ENCODINGS)})")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--offset-cost-ms", type=float, default=0, help="Extra latency per 1000 of page offset")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered 429/503")
+    parser.add_argument("--retry-after", type=float, default=1, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--unstable-relevance", type=int, default=0, metavar="N",
+                        help="Shuffle RELEVANCE pages within blocks of N records per request")
+    args = parser.parse_args()
+
+    catalogue = Catalogue(args.products, args.configurable, args.max_variants, args.encodings.split(","), args.seed,
+                          args.unstable_relevance)
+    server = KlevuMockServer((args.host, args.port), catalogue, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                             error_rate=args.error_rate, retry_after=args.retry_after, offset_cost_ms=args.offset_cost_ms)
+    print(f"Mock Klevu serving {args.products} products at {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Served {server.stats['requests']} requests ({server.stats['errors']} injected errors)")
+
+if __name__ == "__main__":
+    main()
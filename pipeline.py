@@ -0,0 +1,74 @@
+"""
+Scrape and build the deals page in one process.
+
+    python pipeline.py                      # scrape, then generate
+    python pipeline.py --split-data         # SiteGen options pass straight through
+    python pipeline.py --generate-only      # rebuild the page from the last scrape on disk
+    python pipeline.py --resume             # or --retry-failed, as with SiteScraper.py
+
+Scraped rows are handed to SiteGen in memory; the CSV, typed snapshot and
+price history are still written as side outputs, just never read back.
+(--resume and --retry-failed only hold part of the data in memory, so
+SiteGen reads the finished CSV after those.) Each stage imports its module,
+and with it requests/bs4/pyarrow or pandas, only when it runs; with
+--no-pandas the generate stage never imports pandas at all. A timing
+summary closes the run: cold-start import and run time per stage, and the
+end-to-end total.
+
+--report writes every stage's timings, per-request stats and output sizes
+to run_report.json (see run_report.py); --profile adds a cProfile dump.
+"""
+import argparse
+import importlib
+import time
+
+STARTED = time.perf_counter()
+
+from run_report import REPORT, run
+
+def timed_import(name):
+    with REPORT.stage(f"import {name}"):
+        return importlib.import_module(name)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape Briscoes and build the deals page in one process.")
+    stages = parser.add_mutually_exclusive_group()
+    stages.add_argument("--scrape-only", action="store_true")
+    stages.add_argument("--generate-only", action="store_true")
+    parser.add_argument("--resume", action="store_true", help="Carry on from the last checkpoint")
+    parser.add_argument("--retry-failed", action="store_true", help="Re-fetch the ranges the last run gave up on")
+    parser.add_argument("--stable-sort", action="store_true", help="Page the catalogue in a stable sort order")
+    parser.add_argument("--fields", help="Scrape field profile: site, full or products (see SiteScraper.FIELD_PROFILES)")
+    parser.add_argument("--split-data", action="store_true")
+    parser.add_argument("--shard-categories", action="store_true")
+    parser.add_argument("--row-payload", action="store_true")
+    parser.add_argument("--rowwise", action="store_true")
+    parser.add_argument("--no-pandas", action="store_true", help="Build the page with the stdlib path")
+    parser.add_argument("--rebuild", action="store_true", help="Regenerate every artifact, even unchanged ones")
+    parser.add_argument("--precompress", action="store_true", help="Also write .gz/.br twins of the data files")
+    parser.add_argument("--report", action="store_true", help="Write a JSON run report")
+    parser.add_argument("--profile", action="store_true", help="Also dump cProfile stats")
+    args = parser.parse_args(argv)
+    run(lambda: run_stages(args), report=args.report, profile=args.profile)
+
+def run_stages(args):
+    REPORT.add_stage("startup", time.perf_counter() - STARTED)
+    records = None
+    if not args.generate_only:
+        scraper = timed_import("SiteScraper")
+        with REPORT.stage("scrape"):
+            records = scraper.main(retry_failed=args.retry_failed, resume=args.resume, collect=not args.scrape_only,
+                                   stable_sort=args.stable_sort, fields=args.fields)
+    if not args.scrape_only:
+        sitegen = timed_import("SiteGen")
+        with REPORT.stage("generate"):
+            sitegen.main(rowwise=args.rowwise, split_data=args.split_data, row_payload=args.row_payload,
+                         shard_categories=args.shard_categories, records=records, stdlib=args.no_pandas,
+                         rebuild=args.rebuild, precompress=args.precompress)
+
+    # Top-level stages only; the scraper's and SiteGen's own are in the report
+    print("Timings: " + ", ".join(f"{s['name']} {s['seconds']:.2f} s" for s in REPORT.stages if "." not in s["name"])
+          + f"; end-to-end {time.perf_counter() - STARTED:.2f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Price history across daily scrapes (SQLite), stored as price changes.
+
+Each SKU's history is a run of intervals: a row is opened when a price is
+first seen and closed (last_date set) when it changes or the SKU drops out
+of a scrape. A scrape that changes nothing writes nothing but its own date,
+so the file grows with price changes, not with days, and a daily commit
+of it differs from the last one in only a few pages:
+
+    scrapes(scrape_date, n)           n numbers the scrapes 1, 2, 3, ...
+    prices(product_id, first_date, last_date, original_price, sale_price, price)
+        clustered on (product_id, first_date); last_date is NULL while the
+        price is current. An interval spans n(last_date) - n(first_date) + 1
+        scrapes.
+    pruned_stats(product_id, days_seen, days_on_sale)
+        the days of intervals prune() folded away (those that closed more
+        than RETENTION_DAYS ago); an SKU's all-time low interval is kept
+
+Scrapes are recorded in date order; re-recording the latest date undoes
+that scrape first (a same-day re-run replaces it). There is deliberately
+no secondary index: the file is committed by the daily workflow and every
+read is per SKU.
+
+    python price_history.py sku 1116839                 # one SKU's history
+    python price_history.py import old.csv --date 2025-12-01
+    python price_history.py prune                       # fold away old intervals
+"""
+import argparse
+import csv
+import os
+import sqlite3
+from datetime import date, datetime, timedelta
+from snapshot import to_price
+
+HISTORY_DB = os.environ.get("SCRAPER_HISTORY_DB", "price_history.sqlite")
+SCHEMA_VERSION = 2
+LOW_WINDOW_DAYS = 30
+# Closed intervals older than this are folded into pruned_stats
+RETENTION_DAYS = int(os.environ.get("SCRAPER_HISTORY_DAYS", "365"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS scrapes (
+    scrape_date TEXT PRIMARY KEY,   -- YYYY-MM-DD, NZ time
+    n           INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS prices (
+    product_id     TEXT NOT NULL,
+    first_date     TEXT NOT NULL,   -- first scrape at this price
+    last_date      TEXT,            -- last scrape at this price, NULL while current
+    original_price REAL,
+    sale_price     REAL,
+    price          REAL,            -- what the shopper pays: sale, else original
+    PRIMARY KEY (product_id, first_date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS pruned_stats (
+    product_id   TEXT PRIMARY KEY,
+    days_seen    INTEGER NOT NULL DEFAULT 0,
+    days_on_sale INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+"""
+
+# Scrapes an interval spans, given the latest scrape date for open ones
+SPAN = ("((SELECT n FROM scrapes WHERE scrape_date = coalesce(p.last_date, :latest)) "
+        "- (SELECT n FROM scrapes WHERE scrape_date = p.first_date) + 1)")
+ON_SALE = "p.sale_price < p.original_price"
+
+# Add the days of the intervals listed in temp.pruning to pruned_stats.
+# prune() never lists an SKU's all-time low interval, so the low needs no
+# rollup of its own.
+FOLD_PRUNED = f"""
+INSERT INTO pruned_stats (product_id, days_seen, days_on_sale)
+SELECT p.product_id, sum({SPAN}), sum(CASE WHEN {ON_SALE} THEN {SPAN} ELSE 0 END)
+FROM prices p WHERE (p.product_id, p.first_date) IN (SELECT * FROM temp.pruning) GROUP BY p.product_id
+ON CONFLICT (product_id) DO UPDATE SET
+    days_seen = days_seen + excluded.days_seen,
+    days_on_sale = days_on_sale + excluded.days_on_sale
+"""
+
+# The interval holding each SKU's all-time low (lowest price, earliest first)
+LOW_INTERVALS = """
+SELECT product_id, first_date FROM (
+    SELECT product_id, first_date, row_number() OVER (PARTITION BY product_id ORDER BY price, first_date) AS k
+    FROM prices WHERE price IS NOT NULL
+) WHERE k = 1
+"""
+
+def nz_today():
+    try:
+        import pytz
+        return datetime.now(pytz.timezone("Pacific/Auckland")).date().isoformat()
+    except Exception:
+        return date.today().isoformat()
+
+class PriceHistory:
+    def __init__(self, path=HISTORY_DB):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID")
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+        if row is not None and row[0] == "1":
+            self._migrate_v1()
+        elif row is not None and row[0] != str(SCHEMA_VERSION):
+            raise ValueError(f"{path} has history schema {row[0]}, expected {SCHEMA_VERSION}")
+        self.db.executescript(SCHEMA)
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),))
+        self.db.commit()
+        self.pending = {}
+
+    def _migrate_v1(self):
+        """Schema 1 kept a row per SKU per scrape day; turn those into intervals."""
+        print(f"Converting {self.path} to price intervals...")
+        with self.db:
+            # One transaction, schema changes included (executescript() would commit)
+            self.db.execute("BEGIN")
+            self.db.execute("ALTER TABLE prices RENAME TO prices_v1")
+            self.db.execute("DROP TABLE product_stats")
+            for statement in SCHEMA.split(";")[:-1]:
+                self.db.execute(statement)
+            days = [d for d, in self.db.execute("SELECT DISTINCT scrape_date FROM prices_v1 ORDER BY scrape_date")]
+            self.db.executemany("INSERT INTO scrapes VALUES (?, ?)", ((d, n) for n, d in enumerate(days, 1)))
+            previous = {d: p for p, d in zip(days, days[1:])}
+            intervals, last = [], None
+            for pid, day, orig, sale in self.db.execute(
+                    "SELECT product_id, scrape_date, original_price, sale_price FROM prices_v1 "
+                    "ORDER BY product_id, scrape_date"):
+                if last and last[0] == pid and last[3:5] == [orig, sale] and previous.get(day) == last[2]:
+                    last[2] = day
+                    continue
+                last = [pid, day, day, orig, sale]
+                intervals.append(last)
+            latest = days[-1] if days else None
+            self.db.executemany(
+                "INSERT INTO prices VALUES (?, ?, ?, ?, ?, ?)",
+                [(pid, first, None if end == latest else end, o, s, s if s is not None else o)
+                 for pid, first, end, o, s in intervals])
+            self.db.execute("DROP TABLE prices_v1")
+        self.db.execute("VACUUM")
+
+    # ---- Writing ----
+    def add_rows(self, rows):
+        """
+        Buffers scraped rows (dicts with the CSV column names). The last row
+        seen for a Product ID wins; record() writes them.
+        """
+        for row in rows:
+            pid = row.get("Product ID")
+            if pid is None or pid == "": continue
+            orig, sale = to_price(row.get("Original Price")), to_price(row.get("Sale Price"))
+            self.pending[str(pid)] = (orig, sale)
+
+    def add_csv(self, csv_path):
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            self.add_rows(csv.DictReader(f))
+
+    def _scrapes(self):
+        return self.db.execute("SELECT scrape_date, n FROM scrapes ORDER BY scrape_date DESC LIMIT 2").fetchall()
+
+    def record(self, scrape_date=None):
+        """
+        Records the buffered rows as the scrape of scrape_date in one
+        transaction: opens an interval for each new price and closes the
+        intervals of prices that changed or SKUs that are missing. Returns
+        the number of SKUs recorded.
+        """
+        day = scrape_date or nz_today()
+        if not self.pending: return 0
+        with self.db:
+            recent = self._scrapes()
+            if recent and day < recent[0][0]:
+                raise ValueError(f"history is recorded in date order; {day} is before {recent[0][0]}")
+            if recent and day == recent[0][0]:
+                # A re-run: undo this day's scrape, then record it again
+                recent.pop(0)
+                self.db.execute("DELETE FROM prices WHERE first_date = ?", (day,))
+                if recent: self.db.execute("UPDATE prices SET last_date = NULL WHERE last_date = ?", (recent[0][0],))
+            else:
+                self.db.execute("INSERT INTO scrapes VALUES (?, ?)", (day, recent[0][1] + 1 if recent else 1))
+            previous = recent[0][0] if recent else None
+
+            current = {pid: (o, s) for pid, o, s in self.db.execute(
+                "SELECT product_id, original_price, sale_price FROM prices WHERE last_date IS NULL")}
+            closed = [pid for pid, prices in current.items() if self.pending.get(pid) != prices]
+            opened = [(pid, day, o, s, s if s is not None else o)
+                      for pid, (o, s) in self.pending.items() if current.get(pid) != (o, s)]
+            self.db.executemany("UPDATE prices SET last_date = ? WHERE product_id = ? AND last_date IS NULL",
+                                ((previous, pid) for pid in closed))
+            self.db.executemany("INSERT INTO prices VALUES (?, ?, NULL, ?, ?, ?)", opened)
+        written = len(self.pending)
+        self.pending = {}
+        return written
+
+    def prune(self, retention_days=RETENTION_DAYS, as_of=None):
+        """
+        Folds intervals that closed more than retention_days ago into
+        pruned_stats, except each SKU's all-time low interval, and drops the
+        scrape dates nothing refers to any more. Returns the number of
+        intervals removed.
+        """
+        cutoff = (date.fromisoformat(as_of or nz_today()) - timedelta(days=retention_days)).isoformat()
+        with self.db:
+            keep = set(self.db.execute(LOW_INTERVALS))
+            old = [key for key in self.db.execute(
+                "SELECT product_id, first_date FROM prices WHERE last_date < ?", (cutoff,)) if key not in keep]
+            if not old: return 0
+            self.db.execute("CREATE TEMP TABLE IF NOT EXISTS pruning (product_id TEXT, first_date TEXT)")
+            self.db.execute("DELETE FROM pruning")
+            self.db.executemany("INSERT INTO pruning VALUES (?, ?)", old)
+            self.db.execute(FOLD_PRUNED, {"latest": None})
+            self.db.execute("DELETE FROM prices WHERE (product_id, first_date) IN (SELECT * FROM temp.pruning)")
+            self.db.execute("DELETE FROM scrapes WHERE scrape_date < (SELECT min(first_date) FROM prices)")
+        # No VACUUM: later intervals reuse the freed pages, and the committed
+        # file keeps its layout
+        return len(old)
+
+    # ---- Reading ----
+    def lows(self, window_days=LOW_WINDOW_DAYS, as_of=None):
+        """
+        {product_id: (all_time_low, window_low, days_on_sale)} for every SKU.
+        One pass over the intervals in primary-key order, plus pruned_stats
+        for the days prune() folded away.
+        """
+        day = date.fromisoformat(as_of or nz_today())
+        since = (day - timedelta(days=window_days - 1)).isoformat()
+        recent = self._scrapes()
+        params = {"since": since, "latest": recent[0][0] if recent else None}
+        pruned = dict(self.db.execute("SELECT product_id, days_on_sale FROM pruned_stats"))
+        return {pid: (low, window_low, on_sale + pruned.get(pid, 0)) for pid, low, window_low, on_sale in self.db.execute(
+            "SELECT p.product_id, min(p.price), "
+            "min(CASE WHEN coalesce(p.last_date, :latest) >= :since THEN p.price END), "
+            f"sum(CASE WHEN {ON_SALE} THEN {SPAN} ELSE 0 END) "
+            "FROM prices p GROUP BY p.product_id", params)}
+
+    def history(self, product_id):
+        return self.db.execute(
+            "SELECT first_date, last_date, original_price, sale_price FROM prices WHERE product_id = ? "
+            "ORDER BY first_date", (str(product_id),)).fetchall()
+
+    def close(self):
+        self.db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or backfill the price history database.")
+    parser.add_argument("--db", default=HISTORY_DB)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sku = sub.add_parser("sku", help="Show one product's price history")
+    sku.add_argument("product_id")
+    imp = sub.add_parser("import", help="Record a scraped CSV for a given date (oldest first)")
+    imp.add_argument("csv_path")
+    imp.add_argument("--date", help="YYYY-MM-DD (default: today, NZ time)")
+    prune = sub.add_parser("prune", help="Fold away intervals that closed before the retention window")
+    prune.add_argument("--days", type=int, default=RETENTION_DAYS)
+    args = parser.parse_args()
+
+    history = PriceHistory(args.db)
+    try:
+        if args.command == "sku":
+            for first, last, orig, sale in history.history(args.product_id):
+                print(f"{first} .. {last or 'now':10}  orig {orig}  sale {sale}")
+            stats = history.lows().get(args.product_id)
+            if stats:
+                print(f"All-time low {stats[0]}, 30-day low {stats[1]}; on sale {stats[2]} scrape day(s)")
+        elif args.command == "prune":
+            print(f"Pruned {history.prune(args.days)} intervals")
+        else:
+            history.add_csv(args.csv_path)
+            print(f"Recorded {history.record(args.date)} products for {args.date or nz_today()}")
+    finally:
+        history.close()
+
+if __name__ == "__main__":
+    main()
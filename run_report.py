@@ -0,0 +1,294 @@
+"""
+Run report: where the time, memory and bytes went in a scrape/generate run.
+
+SiteScraper and SiteGen record into the shared REPORT as they go:
+
+    stages     wall time and peak RSS at the end of each stage, in run order
+    timers     calls and total seconds of the hot functions (@timed)
+    requests   one entry per Klevu request: range, status, latency, bytes
+    pages      records per page and the rows (variants) they exploded into
+    counters   anything else worth a number
+    settings   what the run was asked to do (field profile, sort order)
+    outputs    the size of every file the run wrote
+
+REPORT.write() saves it all as RUN_REPORT_FILE and appends a one-line
+summary to RUN_HISTORY_FILE, which `check` uses to flag regressions
+against the median of recent runs, and `compare` to set the last run
+against the last one with other settings (e.g. --fields site vs full).
+--profile also dumps cProfile stats to PROFILE_FILE (python -m pstats
+run_profile.prof).
+
+    python pipeline.py --report [--profile]    # or SiteScraper.py / SiteGen.py
+    python run_report.py show                  # summary of the last report
+    python run_report.py check                 # exits 1 on a regression
+    python run_report.py compare               # last run vs the last with other settings
+"""
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows: no peak RSS
+    resource = None
+
+RUN_REPORT_FILE = os.environ.get("RUN_REPORT_FILE", "run_report.json")
+RUN_HISTORY_FILE = os.environ.get("RUN_HISTORY_FILE", "run_history.jsonl")
+PROFILE_FILE = "run_profile.prof"
+REPORT_VERSION = 1
+
+# check: a metric regressed when it is this much above the median of the
+# last HISTORY_WINDOW runs, by at least the absolute floor
+HISTORY_WINDOW = 7
+REGRESSION_RATIO = 1.5
+REGRESSION_MIN_SECS = 1.0
+REGRESSION_MIN_MB = 64
+
+def peak_rss_mb():
+    if resource is None: return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def _rate(part, whole):
+    return round(part / whole, 5) if part is not None and whole else None
+
+def _percentile(values, fraction):
+    if not values: return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+class RunReport:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = []
+        self.timers = {}    # name -> [calls, seconds]
+        self.counters = {}
+        self.requests = []
+        self.pages = []
+        self.outputs = []
+        self.settings = {}
+        self.profile = None
+        self.lock = threading.Lock()
+
+    # ---- Recording ----
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def add_stage(self, name, seconds):
+        self.stages.append({"name": name, "seconds": round(seconds, 4), "peak_rss_mb": peak_rss_mb()})
+
+    def add_time(self, name, seconds, calls=1):
+        timer = self.timers.get(name)
+        if timer is None: timer = self.timers[name] = [0, 0.0]
+        timer[0] += calls
+        timer[1] += seconds
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def request(self, offset, limit, status, seconds, size, records, error=None):
+        # Called from the fetch worker threads
+        with self.lock:
+            self.requests.append({"offset": offset, "limit": limit, "status": status, "seconds": round(seconds, 4),
+                                  "bytes": size, "records": records, "error": error})
+
+    def page(self, offset, records, rows):
+        self.pages.append({"offset": offset, "records": records, "rows": rows})
+
+    def output(self, *paths):
+        for path in paths:
+            if path not in self.outputs: self.outputs.append(path)
+
+    # ---- Output ----
+    def summary(self):
+        """The numbers worth comparing run to run (one RUN_HISTORY_FILE line)."""
+        latencies = [r["seconds"] for r in self.requests if r["error"] is None]
+        records = sum(p["records"] for p in self.pages)
+        rows = sum(p["rows"] for p in self.pages)
+        transferred = sum(r["bytes"] or 0 for r in self.requests)
+        processing = self.timers.get("page processing", [0, 0.0])[1]
+        return {
+            "when": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "settings": self.settings,
+            "seconds": round(time.perf_counter() - self.started, 3),
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": {s["name"]: s["seconds"] for s in self.stages},
+            "timers": {name: round(seconds, 4) for name, (_, seconds) in self.timers.items()},
+            "requests": {
+                "count": len(self.requests), "failed": len(self.requests) - len(latencies),
+                "bytes": transferred,
+                "p50": _percentile(latencies, 0.5), "p95": _percentile(latencies, 0.95),
+                "max": max(latencies, default=None),
+            },
+            "records": records,
+            "rows": rows,
+            "variants_per_record": round(rows / records, 3) if records else None,
+            "bytes_per_record": round(transferred / records, 1) if records else None,
+            "processing_us_per_record": round(processing / records * 1e6, 1) if records else None,
+            "duplicate_record_rate": _rate(self.counters.get("dedupe.duplicate_records"), self.counters.get("dedupe.records")),
+            "duplicate_row_rate": _rate(self.counters.get("dedupe.duplicate_rows"), self.counters.get("dedupe.rows")),
+            "missing_rate": _rate(self.counters.get("scrape.missing"), self.counters.get("scrape.reported_total")),
+            "outputs": {path: os.path.getsize(path) for path in self.outputs if os.path.exists(path)},
+        }
+
+    def as_dict(self):
+        return {
+            "version": REPORT_VERSION,
+            "summary": self.summary(),
+            "stages": self.stages,
+            "timers": {name: {"calls": calls, "seconds": round(seconds, 4)} for name, (calls, seconds) in self.timers.items()},
+            "counters": self.counters,
+            "requests": self.requests,
+            "pages": self.pages,
+            "profile": self.profile,
+        }
+
+    def write(self, path=RUN_REPORT_FILE, history_path=RUN_HISTORY_FILE):
+        report = self.as_dict()
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+        os.replace(path + ".tmp", path)
+        if history_path:
+            with open(history_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(report["summary"], separators=(",", ":")) + "\n")
+        print(f"Run report written to {path}")
+        return report
+
+class _Stage:
+    def __init__(self, report, name):
+        self.report = report
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.started
+        self.report.add_stage(self.name, self.seconds)
+
+REPORT = RunReport()
+
+def timed(name):
+    """Decorator: adds each call's wall time to REPORT.timers[name]."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                REPORT.add_time(name, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+def run(fn, report=False, profile=False):
+    """
+    Calls fn(). With report (or profile) set, writes the run report
+    afterwards, even if fn() failed; with profile, under cProfile.
+    """
+    profiler = cProfile.Profile() if profile else None
+    try:
+        if profiler is None: return fn()
+        return profiler.runcall(fn)
+    finally:
+        if profiler is not None:
+            profiler.dump_stats(PROFILE_FILE)
+            REPORT.profile = PROFILE_FILE
+            print(f"Profile written to {PROFILE_FILE}")
+        if report or profile:
+            REPORT.write()
+
+# ---- History ----
+def load_history(path=RUN_HISTORY_FILE):
+    if not os.path.exists(path): return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def _metrics(summary):
+    """{name: (value, unit)} of everything check() compares."""
+    metrics = {"total": (summary["seconds"], "s")}
+    metrics.update({f"stage {k}": (v, "s") for k, v in summary["stages"].items()})
+    metrics.update({f"timer {k}": (v, "s") for k, v in summary["timers"].items()})
+    if summary["requests"]["p95"] is not None: metrics["request p95"] = (summary["requests"]["p95"], "s")
+    if summary["peak_rss_mb"] is not None: metrics["peak RSS"] = (summary["peak_rss_mb"], "MB")
+    return metrics
+
+def check(history, window=HISTORY_WINDOW):
+    """Regressions of the last run against the median of the `window` before it."""
+    if len(history) < 2: return []
+    latest, previous = _metrics(history[-1]), [_metrics(s) for s in history[-1 - window:-1]]
+    regressions = []
+    for name, (value, unit) in latest.items():
+        past = sorted(m[name][0] for m in previous if name in m)
+        if not past: continue
+        median = past[len(past) // 2]
+        floor = REGRESSION_MIN_MB if unit == "MB" else REGRESSION_MIN_SECS
+        if value > median * REGRESSION_RATIO and value - median >= floor:
+            regressions.append(f"{name}: {value:.2f} {unit} vs median {median:.2f} {unit} over {len(past)} run(s)")
+    return regressions
+
+# what compare() prints: (label, path into the summary)
+COMPARED = [
+    ("request bytes", ("requests", "bytes")),
+    ("bytes per record", ("bytes_per_record",)),
+    ("processing us per record", ("processing_us_per_record",)),
+    ("scrape pages s", ("stages", "scrape.pages")),
+    ("total s", ("seconds",)),
+    ("peak RSS MB", ("peak_rss_mb",)),
+]
+
+def _lookup(summary, path):
+    for key in path:
+        if not isinstance(summary, dict): return None
+        summary = summary.get(key)
+    return summary
+
+def compare(history):
+    """
+    Lines setting the last run against the most recent one with different
+    settings (the previous run if they all match), with the % change.
+    """
+    if len(history) < 2: return []
+    latest = history[-1]
+    settings = latest.get("settings") or {}
+    baseline = next((s for s in reversed(history[:-1]) if (s.get("settings") or {}) != settings), history[-2])
+    lines = [f"before: {baseline['when']} {json.dumps(baseline.get('settings') or {})}",
+             f"after:  {latest['when']} {json.dumps(settings)}",
+             f"{'':<32}{'before':>16}{'after':>16}"]
+    outputs = sorted(set(latest.get("outputs", {})) & set(baseline.get("outputs", {})))
+    rows = COMPARED + [(f"{path} bytes", ("outputs", path)) for path in outputs]
+    for label, path in rows:
+        before, after = _lookup(baseline, path), _lookup(latest, path)
+        if before is None or after is None: continue
+        change = f"{(after - before) / before:+.1%}" if before else ""
+        lines.append(f"{label:<32}{before:>16,}{after:>16,}  {change}")
+    return lines
+
+def main():
+    args = sys.argv[1:]
+    if args[:1] == ["show"]:
+        with open(args[1] if len(args) > 1 else RUN_REPORT_FILE, "r", encoding="utf-8") as f:
+            summary = json.load(f)["summary"]
+        print(json.dumps(summary, indent=1))
+    elif args[:1] == ["check"]:
+        history = load_history(args[1] if len(args) > 1 else RUN_HISTORY_FILE)
+        regressions = check(history)
+        for line in regressions:
+            print(f"Regression: {line}")
+        if not regressions:
+            print(f"No regressions in the last of {len(history)} run(s).")
+        sys.exit(1 if regressions else 0)
+    elif args[:1] == ["compare"]:
+        lines = compare(load_history(args[1] if len(args) > 1 else RUN_HISTORY_FILE))
+        print("\n".join(lines) if lines else "Need at least two runs in the history to compare.")
+    else:
+        sys.exit(__doc__)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Typed columnar snapshot of the scraped products.
+
+The scraper writes this Parquet file next to the CSV. Prices are stored as
+float64, and Category, Link and Stock Status are dictionary-encoded, so
+SiteGen can load it without re-parsing any strings. The CSV stays as the
+human-readable, backwards-compatible export.
+
+    python snapshot.py convert briscoes_products_clean.csv   # build a snapshot from a CSV
+    python snapshot.py compare                                # size / load time vs the CSV
+"""
+import importlib.util
+import os
+import sys
+import time
+
+# Snapshot is optional; the CSV export still works without pyarrow. It is
+# imported on first use, so `import snapshot` stays cheap for CSV-only runs.
+pa = pq = None
+
+SNAPSHOT_FILE = os.environ.get("SCRAPER_SNAPSHOT", "briscoes_products.parquet")
+SNAPSHOT_VERSION = 1
+VERSION_KEY = b"briscoes.snapshot.version"
+ROW_GROUP_SIZE = 50000
+
+# (column, arrow type) in CSV column order
+COLUMNS = [
+    ("Title", "string"),
+    ("Original Price", "price"),
+    ("Sale Price", "price"),
+    ("Category", "dictionary"),
+    ("Product ID", "string"),
+    ("Link", "dictionary"),
+    ("Description", "string"),
+    ("Stock Status", "dictionary"),
+]
+
+def available():
+    return importlib.util.find_spec("pyarrow") is not None
+
+def _load_arrow():
+    global pa, pq
+    if pa is None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+def schema():
+    _load_arrow()
+    types = {"string": pa.string(), "price": pa.float64(), "dictionary": pa.dictionary(pa.int32(), pa.string())}
+    return pa.schema([(name, types[kind]) for name, kind in COLUMNS],
+                     metadata={VERSION_KEY: str(SNAPSHOT_VERSION).encode()})
+
+def to_price(value):
+    """
+    Same rules as SiteGen.to_numeric_price(): strips '$' and ',', None when
+    missing, unparseable or NaN (a NaN float or the text "nan").
+    """
+    if value is None or value == "": return None
+    try:
+        v = float(str(value).strip().replace("$", "").replace(",", ""))
+    except (TypeError, ValueError):
+        return None
+    return v if v == v else None
+
+def to_text(value):
+    if value is None: return None
+    if isinstance(value, float) and value != value: return None
+    return str(value)
+
+class SnapshotWriter:
+    """
+    Streams rows (dicts keyed by CSV column) into a Parquet file one row
+    group at a time. Data goes to a temp file that only replaces the real
+    snapshot on close(completed=True), so readers never see a torn file.
+    """
+    def __init__(self, path=SNAPSHOT_FILE):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.schema = schema()
+        self.writer = pq.ParquetWriter(self.tmp_path, self.schema, compression="zstd")
+        self.buffer = {name: [] for name, _ in COLUMNS}
+        self.rows = 0
+
+    def write_rows(self, rows):
+        for row in rows:
+            for name, kind in COLUMNS:
+                value = row.get(name)
+                self.buffer[name].append(to_price(value) if kind == "price" else to_text(value))
+            self.rows += 1
+        if len(self.buffer["Title"]) >= ROW_GROUP_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer["Title"]: return
+        arrays = [pa.array(self.buffer[name], type=pa.string()).dictionary_encode() if kind == "dictionary"
+                  else pa.array(self.buffer[name], type=self.schema.field(name).type)
+                  for name, kind in COLUMNS]
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+        self.buffer = {name: [] for name, _ in COLUMNS}
+
+    def close(self, completed=True):
+        if completed: self.flush()
+        self.writer.close()
+        if completed:
+            os.replace(self.tmp_path, self.path)
+        elif os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+def _check_version(path, schema):
+    version = (schema.metadata or {}).get(VERSION_KEY, b"?").decode()
+    if version != str(SNAPSHOT_VERSION):
+        raise ValueError(f"{path} is snapshot version {version}, expected {SNAPSHOT_VERSION}")
+
+def read_snapshot(path=SNAPSHOT_FILE, columns=None):
+    """
+    Loads a snapshot as a DataFrame: float64 prices and pandas categoricals
+    for the dictionary columns. `columns` limits what is read (Parquet skips
+    the rest on disk). Raises ValueError on a schema version this code
+    doesn't know.
+    """
+    _load_arrow()
+    table = pq.read_table(path, columns=columns)
+    _check_version(path, table.schema)
+    return table.to_pandas()
+
+def iter_snapshot(path=SNAPSHOT_FILE, columns=None):
+    """
+    Streams a snapshot as tuples of `columns` (default: all, in CSV order),
+    one row group at a time, so memory stays flat however big the file is.
+    Prices are floats or None.
+    """
+    _load_arrow()
+    snapshot = pq.ParquetFile(path)
+    _check_version(path, snapshot.schema_arrow)
+    for batch in snapshot.iter_batches(batch_size=ROW_GROUP_SIZE, columns=columns):
+        yield from zip(*(column.to_pylist() for column in batch.columns))
+
+def snapshot_from_csv(csv_path, path=SNAPSHOT_FILE):
+    """
+    Rebuilds the snapshot from a CSV export (used after --resume or
+    --retry-failed, which append to the CSV).
+    """
+    import csv
+    writer = SnapshotWriter(path)
+    try:
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            # Empty CSV cells are missing values, as with pandas.read_csv
+            rows = ({k: (v if v != "" else None) for k, v in row.items()} for row in csv.DictReader(f))
+            writer.write_rows(rows)
+    except BaseException:
+        writer.close(completed=False)
+        raise
+    writer.close()
+    return writer.rows
+
+def compare(csv_path, path=SNAPSHOT_FILE):
+    import pandas as pd
+    started = time.perf_counter()
+    df_csv = pd.read_csv(csv_path)
+    csv_s = time.perf_counter() - started
+    started = time.perf_counter()
+    df_snap = read_snapshot(path)
+    snap_s = time.perf_counter() - started
+    csv_mb, snap_mb = os.path.getsize(csv_path) / 1e6, os.path.getsize(path) / 1e6
+    print(f"{'':<10}{'rows':>9}{'MB on disk':>12}{'load s':>9}{'MB in RAM':>11}")
+    for name, rows, mb, secs, df in [("CSV", len(df_csv), csv_mb, csv_s, df_csv), ("snapshot", len(df_snap), snap_mb, snap_s, df_snap)]:
+        print(f"{name:<10}{rows:>9}{mb:>12.2f}{secs:>9.3f}{df.memory_usage(deep=True).sum() / 1e6:>11.1f}")
+
+def main():
+    if not available():
+        sys.exit("pyarrow is not installed (pip install pyarrow)")
+    args = sys.argv[1:]
+    csv_path = args[1] if len(args) > 1 else "briscoes_products_clean.csv"
+    if args[:1] == ["convert"]:
+        print(f"Wrote {snapshot_from_csv(csv_path)} rows to {SNAPSHOT_FILE}")
+    elif args[:1] == ["compare"]:
+        compare(csv_path)
+    else:
+        sys.exit(__doc__)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+What changed since the previous scrape: new products, price drops and
+rises, new deals, deals that ended and products that went away.
+
+The previous snapshot is hash-joined with the current one on Product ID.
+Only the previous side is indexed, as one dict slot plus two integer
+prices (cents) per product; the current side is streamed row by row (a
+Parquet snapshot one row group at a time), so a diff is one pass over
+each file and memory grows with the product count, not the row width.
+Titles and links are only kept for the changes themselves.
+
+Outputs:
+    deals_delta.json   compact delta: Product IDs and cents per kind of change;
+                       SiteGen highlights these rows from it
+    feed.xml/feed.json RSS 2.0 and JSON Feed of the biggest new deals and
+                       price drops
+
+The scraper keeps the last scrape as briscoes_products.prev.(parquet|csv)
+and runs the diff at the end of every scrape.
+
+    python snapshot_diff.py                          # previous vs current
+    python snapshot_diff.py old.csv new.parquet      # any two snapshots/CSVs
+"""
+import csv
+import json
+import os
+import shutil
+import sys
+from array import array
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from xml.sax.saxutils import escape
+
+from snapshot import SNAPSHOT_FILE, available as snapshot_available, iter_snapshot, to_price
+from price_history import nz_today
+
+CURRENT_CSV = os.environ.get("SCRAPER_OUT_CSV", "briscoes_products_clean.csv")
+PREVIOUS_BASE = "briscoes_products.prev"   # + .parquet or .csv, whichever the last scrape left
+DELTA_FILE = os.environ.get("SCRAPER_DELTA_FILE", "deals_delta.json")
+FEED_RSS = "feed.xml"
+FEED_JSON = "feed.json"
+FEED_ITEMS = 50
+DELTA_VERSION = 1
+SITE_URL = os.environ.get("SITE_URL", "")  # Default: https://<CNAME>/
+SITE_TITLE = "Briscoes Deal Finder"
+
+DIFF_COLUMNS = ["Product ID", "Title", "Original Price", "Sale Price", "Link"]
+MISSING = -1  # cents placeholder for a missing price
+
+def _cents(value):
+    return MISSING if value is None or value != value else int(round(value * 100))
+
+def _price(orig, sale):
+    """(what the shopper pays, on sale?) in cents, like PriceHistory."""
+    paid = sale if sale != MISSING else orig
+    return paid, sale != MISSING and orig != MISSING and sale < orig
+
+# ---- Reading ----
+def iter_products(path):
+    """(Product ID, Title, orig cents, sale cents, Link) per row of a snapshot or CSV."""
+    if path.endswith(".parquet"):
+        rows = iter_snapshot(path, DIFF_COLUMNS)
+    else:
+        rows = _iter_csv(path)
+    for pid, title, orig, sale, link in rows:
+        if pid is None or pid == "": continue
+        yield str(pid), title, _cents(orig), _cents(sale), link
+
+def _iter_csv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        wanted = [header.index(name) if name in header else None for name in DIFF_COLUMNS]
+        for row in reader:
+            cells = [row[i] if i is not None and i < len(row) else "" for i in wanted]
+            yield cells[0], cells[1], to_price(cells[2]), to_price(cells[3]), cells[4]
+
+def current_snapshot():
+    return SNAPSHOT_FILE if snapshot_available() and os.path.exists(SNAPSHOT_FILE) else CURRENT_CSV
+
+def previous_snapshot():
+    for path in (PREVIOUS_BASE + ".parquet", PREVIOUS_BASE + ".csv"):
+        if os.path.exists(path): return path
+    return None
+
+def keep_previous():
+    """
+    Called before a fresh scrape overwrites its outputs: copies the last
+    snapshot (or, without one, the last CSV) to the previous snapshot.
+    """
+    current = current_snapshot()
+    if not os.path.exists(current): return None
+    target = PREVIOUS_BASE + os.path.splitext(current)[1]
+    for path in (PREVIOUS_BASE + ".parquet", PREVIOUS_BASE + ".csv"):
+        if path != target and os.path.exists(path): os.remove(path)
+    shutil.copyfile(current, target)
+    return target
+
+# ---- Diff ----
+def diff_snapshots(previous_path, current_path):
+    """
+    Hash join on Product ID; the last row wins when an ID repeats. Returns
+    the delta dict written to DELTA_FILE, plus "feed": the candidate feed
+    items (new deals and price drops with their titles and links).
+    """
+    slots, orig_cents, sale_cents = {}, array("q"), array("q")
+    for pid, _, orig, sale, _ in iter_products(previous_path):
+        slot = slots.get(pid)
+        if slot is None:
+            slots[pid] = len(orig_cents)
+            orig_cents.append(orig)
+            sale_cents.append(sale)
+        else:
+            orig_cents[slot], sale_cents[slot] = orig, sale
+
+    latest = {}  # pid -> last row, only for IDs that repeat in the current file
+    seen = bytearray(len(orig_cents))
+    new_ids = set()
+    changes = {"new": [], "drops": [], "rises": [], "new_deals": [], "ended": [], "removed": []}
+    feed = []
+    rows = 0
+
+    def classify(pid, title, orig, sale, link):
+        paid, on_sale = _price(orig, sale)
+        slot = slots.get(pid)
+        if slot is None:
+            changes["new"].append([pid, paid])
+            if on_sale:
+                changes["new_deals"].append([pid, orig, sale])
+                feed.append(("deal", pid, title, link, orig, sale))
+            return
+        old_paid, was_on_sale = _price(orig_cents[slot], sale_cents[slot])
+        if paid != MISSING and old_paid != MISSING and paid != old_paid:
+            changes["drops" if paid < old_paid else "rises"].append([pid, old_paid, paid])
+            if paid < old_paid: feed.append(("drop", pid, title, link, old_paid, paid))
+        if on_sale and not was_on_sale:
+            changes["new_deals"].append([pid, orig, sale])
+            if not (paid != MISSING and old_paid != MISSING and paid < old_paid):
+                feed.append(("deal", pid, title, link, orig, sale))
+        elif was_on_sale and not on_sale:
+            changes["ended"].append([pid, old_paid, paid])
+
+    for pid, title, orig, sale, link in iter_products(current_path):
+        rows += 1
+        slot = slots.get(pid)
+        if slot is not None:
+            if seen[slot]:
+                latest[pid] = (pid, title, orig, sale, link)
+                continue
+            seen[slot] = 1
+        elif pid in new_ids:
+            latest[pid] = (pid, title, orig, sale, link)
+            continue
+        else:
+            new_ids.add(pid)
+        classify(pid, title, orig, sale, link)
+
+    if latest:
+        # A repeated ID: redo it with its last row, as the snapshot readers would
+        for kind in ("new", "drops", "rises", "new_deals", "ended"):
+            changes[kind] = [c for c in changes[kind] if c[0] not in latest]
+        feed = [item for item in feed if item[1] not in latest]
+        for row in latest.values(): classify(*row)
+
+    for pid, slot in slots.items():
+        if seen[slot]: continue
+        old_paid, was_on_sale = _price(orig_cents[slot], sale_cents[slot])
+        changes["removed"].append(pid)
+        if was_on_sale: changes["ended"].append([pid, old_paid, MISSING])
+
+    delta = {
+        "version": DELTA_VERSION,
+        "date": nz_today(),
+        "previous": {"path": previous_path, "products": len(slots)},
+        "current": {"path": current_path, "rows": rows},
+        "counts": {kind: len(items) for kind, items in changes.items()},
+        **changes,
+    }
+    return delta, feed
+
+# ---- Output ----
+def site_url():
+    if SITE_URL: return SITE_URL
+    if os.path.exists("CNAME"):
+        with open("CNAME", "r", encoding="utf-8") as f:
+            host = f.read().strip()
+        if host: return f"https://{host}/"
+    return ""
+
+def _dollars(cents):
+    return f"${cents / 100:,.2f}"
+
+def feed_items(feed, limit=FEED_ITEMS):
+    """The `limit` biggest new deals and drops (by % off), as dicts."""
+    def pct(item):
+        _, _, _, _, before, after = item
+        return (before - after) / before * 100 if before > 0 else 0
+    items = []
+    for item in sorted(feed, key=pct, reverse=True)[:limit]:
+        kind, pid, title, link, before, after = item
+        if kind == "drop":
+            headline = f"Price drop: {title} now {_dollars(after)} (was {_dollars(before)}, -{pct(item):.0f}%)"
+        else:
+            headline = f"New deal: {title} {_dollars(after)} (was {_dollars(before)}, {pct(item):.0f}% off)"
+        items.append({"id": f"{pid}-{kind}", "kind": kind, "pid": pid, "title": headline, "url": link or site_url(),
+                      "price": after / 100, "was": before / 100})
+    return items
+
+def write_feeds(items, day, rss_path=FEED_RSS, json_path=FEED_JSON):
+    site = site_url() or "/"
+    published = datetime.now(timezone.utc)
+    entries = "".join(
+        f"<item><title>{escape(item['title'])}</title><link>{escape(item['url'])}</link>"
+        f"<guid isPermaLink=\"false\">{escape(item['id'])}-{day}</guid>"
+        f"<pubDate>{format_datetime(published)}</pubDate></item>\n"
+        for item in items)
+    rss = ('<?xml version="1.0" encoding="UTF-8"?>\n<rss version="2.0"><channel>\n'
+           f"<title>{SITE_TITLE}: new deals and price drops</title><link>{escape(site)}</link>\n"
+           f"<description>Biggest new deals and price drops for {day}</description>"
+           f"<lastBuildDate>{format_datetime(published)}</lastBuildDate>\n{entries}</channel></rss>\n")
+    with open(rss_path, "w", encoding="utf-8") as f:
+        f.write(rss)
+    feed = {
+        "version": "https://jsonfeed.org/version/1.1",
+        "title": f"{SITE_TITLE}: new deals and price drops",
+        "home_page_url": site,
+        "items": [{"id": f"{item['id']}-{day}", "url": item["url"], "title": item["title"],
+                   "content_text": item["title"], "date_published": published.isoformat(timespec="seconds"),
+                   "_deal": {"kind": item["kind"], "product_id": item["pid"], "price": item["price"], "was": item["was"]}}
+                  for item in items],
+    }
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(feed, f, indent=1)
+
+def write_delta(delta, path=DELTA_FILE):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(delta, f, separators=(",", ":"))
+    os.replace(path + ".tmp", path)
+
+def run_diff(previous_path=None, current_path=None):
+    """Diffs and writes the delta and feeds. Returns the delta, or None with no previous snapshot."""
+    previous_path = previous_path or previous_snapshot()
+    current_path = current_path or current_snapshot()
+    if previous_path is None:
+        print("Notice: no previous snapshot yet, skipping the diff.")
+        return None
+    delta, feed = diff_snapshots(previous_path, current_path)
+    write_delta(delta)
+    write_feeds(feed_items(feed), delta["date"])
+    print("Changes since last scrape: " + ", ".join(f"{n} {kind.replace('_', ' ')}" for kind, n in delta["counts"].items()))
+    return delta
+
+def load_delta(path=DELTA_FILE):
+    if not os.path.exists(path): return None
+    with open(path, "r", encoding="utf-8") as f:
+        delta = json.load(f)
+    return delta if delta.get("version") == DELTA_VERSION else None
+
+def main():
+    args = sys.argv[1:]
+    if args[:1] in (["-h"], ["--help"]) or len(args) == 1:
+        sys.exit(__doc__)
+    run_diff(*args[:2])
+
+if __name__ == "__main__":
+    main()